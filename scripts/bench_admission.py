@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+准入控制对比
+模拟突发的 N 个运行请求：每个运行像 /stream_run 一样在独立线程中执行一段 CPU 计算，
+分别在不限制（每个请求立即启动线程）与 AdmissionController（固定执行名额 + 有界队列，超出返回 429）下，
+统计被接受运行的端到端延迟分位数（含排队时间）、被拒绝的请求数与总耗时。
+使用方式: python scripts/bench_admission.py [--requests 500] [--work-ms 20] [--max-in-flight 8] [--max-queue 64]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from utils.helper.admission import AdmissionController, AdmissionRejected
+
+
+def cpu_work(ms: float) -> None:
+    """单线程下约耗时 ms 毫秒的纯 Python 计算（持有 GIL，多个线程之间分时执行）"""
+    deadline = time.thread_time() + ms / 1000
+    x = 0
+    while time.thread_time() < deadline:
+        for i in range(1000):
+            x += i * i
+
+
+async def run_in_thread(ms: float) -> None:
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def target():
+        cpu_work(ms)
+        loop.call_soon_threadsafe(done.set_result, None)
+
+    threading.Thread(target=target, daemon=True).start()
+    await done
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def burst(requests: int, work_ms: float, controller: AdmissionController = None):
+    latencies, rejected, retry_after = [], 0, []
+
+    async def one():
+        nonlocal rejected
+        start = time.monotonic()
+        if controller is None:
+            await run_in_thread(work_ms)
+        else:
+            try:
+                permit = await controller.acquire()
+            except AdmissionRejected as e:
+                rejected += 1
+                retry_after.append(e.retry_after)
+                return
+            try:
+                await run_in_thread(work_ms)
+            finally:
+                permit.release()
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, rejected, retry_after, time.monotonic() - start
+
+
+def report(label, latencies, rejected, retry_after, elapsed):
+    print(f"{label:<28} accepted {len(latencies):4d}  rejected {rejected:4d}  "
+          f"p50 {percentile(latencies, 0.5):6.2f}s  p99 {percentile(latencies, 0.99):6.2f}s  "
+          f"total {elapsed:6.2f}s"
+          + (f"  Retry-After {min(retry_after)}-{max(retry_after)}s" if retry_after else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="准入控制对比")
+    parser.add_argument("--requests", type=int, default=500, help="突发请求数")
+    parser.add_argument("--work-ms", type=float, default=20, help="每个运行的 CPU 计算时间（毫秒）")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="同时执行的运行数")
+    parser.add_argument("--max-queue", type=int, default=64, help="等待队列长度")
+    parser.add_argument("--max-wait", type=float, default=30, help="最长排队时间（秒）")
+    args = parser.parse_args()
+
+    print(f"{args.requests} concurrent runs of {args.work_ms:.0f} ms CPU each, {os.cpu_count()} CPU(s):")
+    report("unbounded", *asyncio.run(burst(args.requests, args.work_ms)))
+    controller = AdmissionController(max_in_flight=args.max_in_flight, max_queue=args.max_queue,
+                                     max_wait_seconds=args.max_wait)
+    report(f"admission {args.max_in_flight}+{args.max_queue}", *asyncio.run(burst(args.requests, args.work_ms, controller)))
+    stats = controller.stats()
+    print(f"queue seconds: {stats['queue_seconds']}")
+    if stats["in_flight"] != 0 or stats["queue_depth"] != 0:
+        print(f"FAIL permits leaked: {stats}")
+        sys.exit(1)
+
+    # 排队期间取消与等待超时都应退出队列、不占用名额
+    async def cancel_and_timeout():
+        ctl = AdmissionController(max_in_flight=1, max_queue=4, max_wait_seconds=0.2)
+        held = await ctl.acquire()
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        try:
+            await ctl.acquire()
+            timed_out = False
+        except AdmissionRejected:
+            timed_out = True
+        held.release()
+        (await ctl.acquire()).release()
+        return timed_out, ctl.stats()
+
+    timed_out, stats = asyncio.run(cancel_and_timeout())
+    ok = timed_out and stats["cancelled"] == 1 and stats["rejected_wait_timeout"] == 1 \
+        and stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    print(f"{'ok  ' if ok else 'FAIL'} cancelled and timed-out waiters leave the queue")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+远程压缩包下载基准测试
+在本地启动一个模拟对象存储的 HTTP 服务（支持 Range、按连接限速、可注入断连故障），
+对比 requests.get(...).content 整体读入内存与 utils.file.downloader 流式/分片下载的耗时和内存峰值，
+并校验下载内容与哈希。
+使用方式: python scripts/bench_downloader.py [--size-mb 64] [--bandwidth-mb 20] [--concurrency 4] [--faults 2] [--no-range]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from utils.file.downloader import download_file
+
+
+class StandInServer:
+    """本地 HTTP 替身服务：GET 支持单段 Range；每个连接按 bandwidth 限速；前 faults 个响应在中途断开"""
+
+    def __init__(self, data: bytes, bandwidth: float, faults: int, ranges: bool):
+        self.data = data
+        self.bandwidth = bandwidth
+        self.faults = faults
+        self.ranges = ranges
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    fail = server.faults > 0
+                    if fail:
+                        server.faults -= 1
+                start, end = 0, len(server.data) - 1
+                range_header = self.headers.get("Range")
+                if server.ranges and range_header and range_header.startswith("bytes="):
+                    first, _, last = range_header[len("bytes="):].partition('-')
+                    start = int(first)
+                    end = min(int(last), end) if last else end
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(server.data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(server.data)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end + 1 - start))
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+                block = 64 * 1024
+                position = start
+                sent = 0
+                began = time.monotonic()
+                while position <= end:
+                    chunk = server.data[position:min(position + block, end + 1)]
+                    if fail and sent >= (end + 1 - start) // 2:
+                        # 模拟传输中断
+                        self.close_connection = True
+                        return
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    position += len(chunk)
+                    sent += len(chunk)
+                    if server.bandwidth:
+                        delay = sent / server.bandwidth - (time.monotonic() - began)
+                        if delay > 0:
+                            time.sleep(delay)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/component.zip"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.monotonic()
+    result = func()
+    seconds = time.monotonic() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {seconds:6.2f}s  peak python memory {peak / 1024 / 1024:7.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="远程压缩包下载基准测试")
+    parser.add_argument("--size-mb", type=float, default=64, help="模拟压缩包大小（MB）")
+    parser.add_argument("--bandwidth-mb", type=float, default=20, help="单连接带宽上限（MB/s，0 表示不限速）")
+    parser.add_argument("--concurrency", type=int, default=4, help="分片并发数")
+    parser.add_argument("--faults", type=int, default=0, help="流式下载时前 N 个响应在中途断开")
+    parser.add_argument("--no-range", action="store_true", help="模拟不支持 Range 的服务端")
+    args = parser.parse_args()
+
+    data = os.urandom(int(args.size_mb * 1024 * 1024))
+    expected = hashlib.sha256(data).hexdigest()
+    server = StandInServer(data, args.bandwidth_mb * 1024 * 1024, 0, not args.no_range)
+    tmp_dir = tempfile.mkdtemp(prefix="bench_downloader_")
+    try:
+        baseline_path = os.path.join(tmp_dir, "baseline.zip")
+
+        def baseline():
+            response = requests.get(server.url, timeout=120)
+            response.raise_for_status()
+            with open(baseline_path, 'wb') as f:
+                f.write(response.content)
+
+        measure("baseline", baseline)
+
+        server.faults = args.faults
+        server.requests = 0
+        stream_path = os.path.join(tmp_dir, "stream.zip")
+        result = measure("streaming", lambda: download_file(server.url, stream_path, concurrency=args.concurrency,
+                                                            min_part_size=4 * 1024 * 1024))
+        print(f"           {result.report()}, {server.requests} requests")
+        with open(stream_path, 'rb') as f:
+            ok = hashlib.sha256(f.read()).hexdigest() == expected
+        print(f"content ok: {ok}, digest ok: {result.digest == expected}")
+        if not ok or result.digest != expected:
+            sys.exit(1)
+    finally:
+        server.close()
+        for name in os.listdir(tmp_dir):
+            os.unlink(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
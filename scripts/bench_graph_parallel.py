@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+工作流关键路径基准测试
+对比线性拓扑（旧）与扇出/扇入拓扑（新）的端到端耗时。
+大模型调用使用按 max_tokens 折算延迟的模拟客户端，不消耗真实 token。
+使用方式: python scripts/bench_graph_parallel.py [-i 组件zip路径] [--ms-per-ktoken 100]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["COZE_WORKSPACE_PATH"] = workspace_path
+# 基准测试需要每次都完整执行，关闭大模型响应缓存和运行结果缓存
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["RUN_CACHE_ENABLED"] = "false"
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+import coze_coding_dev_sdk
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langgraph.graph import StateGraph, END
+from coze_coding_utils.runtime_ctx.context import new_context
+
+
+class SimulatedLLMClient:
+    """模拟大模型：延迟 = max_tokens / 1000 * ms_per_ktoken"""
+    ms_per_ktoken = 100.0
+
+    def __init__(self, ctx=None, **kwargs):
+        pass
+
+    def invoke(self, messages, max_tokens: int = 2000, **kwargs):
+        time.sleep(max_tokens / 1000 * self.ms_per_ktoken / 1000)
+        return AIMessage(content=f"simulated response ({max_tokens} max tokens)")
+
+    def stream(self, messages, max_tokens: int = 2000, **kwargs):
+        yield AIMessageChunk(content=self.invoke(messages, max_tokens=max_tokens).content)
+
+
+def build_linear_graph():
+    """按旧的线性拓扑重建工作流（节点实现与新拓扑完全相同）"""
+    from graphs import graph as g
+
+    linear = StateGraph(g.GlobalState, input_schema=g.GraphInput, output_schema=g.GraphOutput)
+    order = [
+        "upload_local_file", "unzip", "build_source_index", "analyze_structure", "extract_functions",
+        "analyze_call_relation", "generate_flowchart", "generate_readme", "save_readme",
+    ]
+    for name in order:
+        spec = g.builder.nodes[name]
+        linear.add_node(name, spec.runnable, metadata=spec.metadata, input_schema=spec.input_schema)
+    linear.set_entry_point(order[0])
+    for src, dst in zip(order, order[1:]):
+        linear.add_edge(src, dst)
+    linear.add_edge(order[-1], END)
+    return linear.compile()
+
+
+def run_once(graph, component_path: str) -> float:
+    t0 = time.time()
+    graph.invoke({"component_path": component_path}, context=new_context("bench"))
+    return time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工作流关键路径基准测试")
+    parser.add_argument("-i", type=str, default=os.path.join(workspace_path, "assets", "test_real_component.zip"),
+                        help="组件zip路径或目录")
+    parser.add_argument("--ms-per-ktoken", type=float, default=100.0, help="模拟大模型每1k max_tokens的延迟（毫秒）")
+    parser.add_argument("-n", type=int, default=3, help="每种拓扑的运行次数")
+    args = parser.parse_args()
+
+    SimulatedLLMClient.ms_per_ktoken = args.ms_per_ktoken
+    coze_coding_dev_sdk.LLMClient = SimulatedLLMClient
+
+    from graphs.graph import main_graph
+
+    results = {}
+    for label, graph in (("linear", build_linear_graph()), ("fan-out", main_graph)):
+        timings = [run_once(graph, args.i) for _ in range(args.n)]
+        results[label] = min(timings)
+        print(f"{label:8s}: best {results[label]:.3f}s  runs={', '.join(f'{t:.3f}' for t in timings)}")
+
+    print(f"speedup : {results['linear'] / results['fan-out']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
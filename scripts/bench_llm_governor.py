@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+大模型调用调度基准测试
+用模拟大模型并发发起多个运行的调用，检查在途调用数上限、rpm 限制，以及各运行的完成时间分布。
+每个运行依次调用：若干次 map（进度 0.3）+ 一次 reduce（进度 0.6）+ 一次流程图（进度 0.8）。
+使用方式: python scripts/bench_llm_governor.py [--runs 20] [--max-in-flight 4] [--rpm 600] [--latency 0.2] [--async]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["COZE_WORKSPACE_PATH"] = workspace_path
+os.environ["LLM_CACHE_ENABLED"] = "false"
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+import coze_coding_dev_sdk
+from langchain_core.messages import AIMessage, AIMessageChunk
+from coze_coding_utils.runtime_ctx.context import new_context
+
+from utils.llm.client import ainvoke_llm, invoke_llm
+from utils.llm.governor import LLMGovernor, set_llm_governor
+
+MODEL = "bench-model"
+NODE_PROGRESS = {"map": 0.3, "map_reduce": 0.6, "flowchart": 0.8}
+
+
+class SimulatedLLMClient:
+    """模拟大模型：固定延迟，记录同时进行中的调用数与每次调用的开始时间"""
+    latency = 0.2
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    starts = []
+
+    def __init__(self, ctx=None, **kwargs):
+        pass
+
+    @classmethod
+    def _enter(cls):
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+            cls.starts.append(time.monotonic())
+
+    @classmethod
+    def _exit(cls):
+        with cls.lock:
+            cls.active -= 1
+
+    def invoke(self, messages, **kwargs):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+        finally:
+            self._exit()
+        return AIMessage(content="simulated response")
+
+    def stream(self, messages, **kwargs):
+        yield AIMessageChunk(content=self.invoke(messages).content)
+
+    async def astream(self, messages, **kwargs):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._exit()
+        yield AIMessageChunk(content="simulated response")
+
+
+def call_kwargs(node_name: str, run_index: int, step: int):
+    return dict(node_name=node_name, llm_config={"model": MODEL, "max_tokens": 500}, system_prompt="bench",
+                user_prompt=f"run {run_index} step {step}")
+
+
+def run_sync(run_index: int, map_calls: int) -> float:
+    ctx = new_context("bench")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=map_calls) as executor:
+        list(executor.map(lambda i: invoke_llm(ctx, **call_kwargs("map", run_index, i)), range(map_calls)))
+    invoke_llm(ctx, **call_kwargs("map_reduce", run_index, map_calls))
+    invoke_llm(ctx, **call_kwargs("flowchart", run_index, map_calls + 1))
+    return time.monotonic() - start
+
+
+async def run_async(run_index: int, map_calls: int) -> float:
+    ctx = new_context("bench")
+    start = time.monotonic()
+    await asyncio.gather(*(ainvoke_llm(ctx, **call_kwargs("map", run_index, i)) for i in range(map_calls)))
+    await ainvoke_llm(ctx, **call_kwargs("map_reduce", run_index, map_calls))
+    await ainvoke_llm(ctx, **call_kwargs("flowchart", run_index, map_calls + 1))
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型调用调度基准测试")
+    parser.add_argument("--runs", type=int, default=20, help="并发运行数")
+    parser.add_argument("--map-calls", type=int, default=3, help="每个运行的 map 调用数")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="调度器在途调用数上限")
+    parser.add_argument("--rpm", type=float, default=0, help="模型每分钟请求数上限（0 表示不限制）")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟大模型单次调用延迟（秒）")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用异步调用路径")
+    args = parser.parse_args()
+
+    SimulatedLLMClient.latency = args.latency
+    coze_coding_dev_sdk.LLMClient = SimulatedLLMClient
+    governor = LLMGovernor(max_in_flight=args.max_in_flight, models={MODEL: {"rpm": args.rpm}},
+                           node_progress=NODE_PROGRESS)
+    set_llm_governor(governor)
+
+    start = time.monotonic()
+    if args.use_async:
+        async def run_all():
+            return await asyncio.gather(*(run_async(i, args.map_calls) for i in range(args.runs)))
+        durations = asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(max_workers=args.runs) as executor:
+            durations = list(executor.map(lambda i: run_sync(i, args.map_calls), range(args.runs)))
+    total = time.monotonic() - start
+
+    durations = sorted(durations)
+    calls = len(SimulatedLLMClient.starts)
+    print(f"runs={args.runs} calls={calls} total={total:.2f}s peak_in_flight={SimulatedLLMClient.peak} "
+          f"(limit {args.max_in_flight})")
+    print(f"run latency: min {durations[0]:.2f}s  p50 {durations[len(durations) // 2]:.2f}s  "
+          f"max {durations[-1]:.2f}s")
+    if args.rpm:
+        starts = SimulatedLLMClient.starts
+        window = max(sum(1 for t in starts if s <= t < s + 60) for s in starts)
+        print(f"max requests in any 60s window: {window} (rpm {args.rpm:.0f})")
+    stats = governor.stats()
+    print(f"governor: granted {stats['granted']}, wait avg {stats['wait_seconds']['avg']}s "
+          f"p95 {stats['wait_seconds']['p95']}s max {stats['wait_seconds']['max']}s, "
+          f"throttled {stats['models'][MODEL]['throttled']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+签名 URL 缓存基准测试
+在本地 S3 兼容替身服务（含 /sign-url 签名服务）上模拟重复流量：对少量对象反复请求签名 URL，
+对比关闭与开启 storage.cache.presign_cache 时签名服务收到的请求数与耗时；
+并验证剩余有效期不足安全余量时重新签名、超出条目上限时按 LRU 淘汰、删除对象后缓存失效。
+使用方式: python scripts/bench_presign_cache.py [--requests 500] [--keys 20] [--latency-ms 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from s3_stand_in import S3StandInProcess
+from storage.cache.presign_cache import PresignCache, set_presign_cache
+from storage.s3.s3_storage import S3SyncStorage
+from storage.s3.token_cache import WorkloadTokenCache, set_workload_token_cache
+
+BUCKET = "bench"
+
+
+class _StaticTokenClient:
+    """替代 workload identity 客户端，返回固定令牌"""
+
+    def get_access_token(self) -> str:
+        return "bench-token"
+
+    def close(self) -> None:
+        pass
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="签名 URL 缓存基准测试")
+    parser.add_argument("--requests", type=int, default=500, help="签名请求总数")
+    parser.add_argument("--keys", type=int, default=20, help="不同对象数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="签名服务每个响应前的固定延迟（毫秒）")
+    args = parser.parse_args()
+
+    set_workload_token_cache(WorkloadTokenCache(client_factory=_StaticTokenClient))
+    server = S3StandInProcess(latency_ms=args.latency_ms)
+    storage = S3SyncStorage(endpoint_url=server.endpoint_url, access_key="bench", secret_key="bench",
+                            bucket_name=BUCKET, region="us-east-1")
+    rng = random.Random(0)
+    # 有效期在 1800 附近波动，模拟不同调用方的请求
+    workload = [(f"readme/{rng.randrange(args.keys)}.md", rng.choice([1790, 1800, 1800, 1800]))
+                for _ in range(args.requests)]
+    ok = True
+    try:
+        # 条目上限为 0 时不登记任何结果，等同于关闭缓存
+        for label, cache in (("no cache", PresignCache(max_entries=0)), ("presign cache", PresignCache())):
+            set_presign_cache(cache)
+            before = server.stats()["requests"].get("sign", 0)
+            start = time.monotonic()
+            for key, expire_time in workload:
+                storage.generate_presigned_url(key=key, expire_time=expire_time)
+            seconds = time.monotonic() - start
+            signs = server.stats()["requests"].get("sign", 0) - before
+            print(f"{label:<14} {seconds:6.2f}s  sign-url calls {signs:5d} / {args.requests}"
+                  + (f"  {cache.stats()}" if cache.max_entries else ""))
+            if cache.max_entries:
+                ok &= check("sign-url calls bounded by distinct keys", signs <= args.keys)
+
+        print("behaviour:")
+        # 有效期 4 秒、不取整：安全余量为有效期的一半（2 秒）
+        cache = PresignCache(expire_step_seconds=0)
+        set_presign_cache(cache)
+        first = storage.generate_presigned_url(key="short.md", expire_time=4)
+        ok &= check("reused while validity remains", storage.generate_presigned_url(key="short.md", expire_time=4) == first)
+        time.sleep(2.1)
+        storage.generate_presigned_url(key="short.md", expire_time=4)
+        ok &= check("re-signed inside safety margin", cache.stats()["expired"] == 1)
+
+        cache = PresignCache(max_entries=3)
+        set_presign_cache(cache)
+        for i in range(5):
+            storage.generate_presigned_url(key=f"lru/{i}.md")
+        ok &= check("LRU bounded", cache.stats()["entries"] == 3 and cache.stats()["evictions"] == 2)
+
+        key = storage.upload_file(file_content=b"x", file_name="deleted.md")
+        storage.generate_presigned_url(key=key)
+        storage.delete_file(file_key=key)
+        before = server.stats()["requests"].get("sign", 0)
+        storage.generate_presigned_url(key=key)
+        ok &= check("invalidated on delete", server.stats()["requests"].get("sign", 0) == before + 1)
+        if not ok:
+            sys.exit(1)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+对象存储同步 / 异步实现对比
+先在本地 S3 兼容替身服务上逐项验证 S3AsyncStorage（上传、读取、存在性、分页列举、删除、签名 URL、
+本地文件分片上传、字节流分片上传、错误码），再对比 100 个并发上传与签名请求下：
+- S3SyncStorage 经 asyncio.to_thread（默认线程池，即异步节点调用同步客户端的方式）
+- S3SyncStorage 使用与并发数相同的线程池
+- S3AsyncStorage 直接 gather
+的耗时、进程线程数峰值与服务端同时打开的连接数。
+使用方式: python scripts/bench_s3_async.py [--uploads 100] [--size-kb 512] [--bandwidth-mb 4] [--latency-ms 50]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 两种实现使用相同的连接池上限，需在导入存储模块前设置
+os.environ.setdefault("STORAGE_MAX_POOL_CONNECTIONS", "100")
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from botocore.exceptions import ClientError
+from s3_stand_in import S3StandInProcess
+from storage.cache.presign_cache import get_presign_cache
+from storage.s3.s3_async_storage import S3AsyncStorage
+from storage.s3.s3_storage import S3SyncStorage
+from storage.s3.token_cache import WorkloadTokenCache, set_workload_token_cache
+
+BUCKET = "bench"
+
+
+class _StaticTokenClient:
+    """替代 workload identity 客户端，返回固定令牌"""
+
+    def get_access_token(self) -> str:
+        return "bench-token"
+
+    def close(self) -> None:
+        pass
+
+
+class ThreadPeak:
+    """后台采样进程内线程数的峰值（不含采样线程自身）"""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            time.sleep(0.002)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+async def verify(storage: S3AsyncStorage, sync_storage: S3SyncStorage) -> bool:
+    """逐项验证异步实现与同步实现的行为一致"""
+    results = []
+    key = await storage.upload_file(file_content=b"hello", file_name="verify/hello.txt", content_type="text/plain")
+    results.append(check("upload_file / read_file", await storage.read_file(file_key=key) == b"hello"))
+    results.append(check("readable by S3SyncStorage", sync_storage.read_file(file_key=key) == b"hello"))
+    results.append(check("file_exists", await storage.file_exists(file_key=key)
+                         and not await storage.file_exists(file_key="verify/missing.txt")))
+    try:
+        await storage.read_file(file_key="verify/missing.txt")
+        results.append(check("missing key raises ClientError", False))
+    except ClientError as e:
+        results.append(check("missing key raises ClientError", e.response["Error"]["Code"] == "NoSuchKey"))
+
+    # 对象 key 由文件名主干加随机后缀生成，按主干前缀列举
+    for i in range(4):
+        await storage.upload_file(file_content=b"x", file_name=f"listed_{i}.txt")
+    keys, token = [], None
+    while True:
+        page = await storage.list_files(prefix="listed_", max_keys=3, continuation_token=token)
+        keys.extend(page["keys"])
+        token = page["next_continuation_token"]
+        if not page["is_truncated"]:
+            break
+    expected = sync_storage.list_files(prefix="listed_")["keys"]
+    results.append(check("list_files pagination", sorted(keys) == sorted(expected) and len(keys) == 4))
+
+    results.append(check("delete_file", await storage.delete_file(file_key=key)
+                         and not await storage.file_exists(file_key=key)))
+    url = await storage.generate_presigned_url(key="verify/a.txt", expire_time=60)
+    results.append(check("generate_presigned_url", url == sync_storage.generate_presigned_url(
+        key="verify/a.txt", expire_time=60)))
+
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    try:
+        data = os.urandom(20 * 1024 * 1024 + 123)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        key = await storage.stream_upload_path(file_path=path, key="verify/multipart.zip")
+        results.append(check("stream_upload_path (multipart)", await storage.read_file(file_key=key) == data))
+    finally:
+        os.unlink(path)
+
+    async def chunks():
+        for offset in range(0, len(data), 300 * 1024):
+            yield data[offset:offset + 300 * 1024]
+
+    key = await storage.trunk_upload_file(chunk_iter=chunks(), file_name="trunk.bin", part_size=5 * 1024 * 1024)
+    results.append(check("trunk_upload_file (async iterator)", await storage.read_file(file_key=key) == data))
+    key = await storage.trunk_upload_file(chunk_iter=[], file_name="empty.bin")
+    results.append(check("trunk_upload_file (empty)", await storage.read_file(file_key=key) == b""))
+    return all(results)
+
+
+def report(label: str, seconds: float, threads: int, connections: int) -> None:
+    print(f"{label:<26} {seconds:6.2f}s  peak threads {threads:4d}  peak connections {connections:4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对象存储同步 / 异步实现对比")
+    parser.add_argument("--uploads", type=int, default=100, help="并发上传数")
+    parser.add_argument("--size-kb", type=int, default=512, help="每个对象的大小（KB）")
+    parser.add_argument("--bandwidth-mb", type=float, default=4, help="单个请求的带宽上限（MB/s，0 表示不限速）")
+    parser.add_argument("--latency-ms", type=float, default=50, help="服务端每个响应前的固定延迟（毫秒）")
+    args = parser.parse_args()
+
+    set_workload_token_cache(WorkloadTokenCache(client_factory=_StaticTokenClient))
+    server = S3StandInProcess(bandwidth_mb=args.bandwidth_mb, latency_ms=args.latency_ms)
+    options = dict(endpoint_url=server.endpoint_url, access_key="bench", secret_key="bench",
+                   bucket_name=BUCKET, region="us-east-1")
+    sync_storage = S3SyncStorage(**options)
+    async_storage = S3AsyncStorage(**options)
+    payloads = [hashlib.sha256(str(i).encode()).digest() * (args.size_kb * 32) for i in range(args.uploads)]
+    failed = False
+
+    def restart() -> None:
+        # 每轮使用新的替身进程，分别统计连接数
+        nonlocal server
+        server.close()
+        server = S3StandInProcess(bandwidth_mb=args.bandwidth_mb, latency_ms=args.latency_ms)
+        for storage in (sync_storage, async_storage):
+            storage.endpoint_url = server.endpoint_url
+        sync_storage._client = None
+        presign_cache = get_presign_cache()
+        if presign_cache is not None:
+            presign_cache.clear()
+
+    try:
+        print("verify S3AsyncStorage:")
+        failed |= not asyncio.run(verify(async_storage, sync_storage))
+        print(f"\n{args.uploads} concurrent uploads of {args.size_kb} KB:")
+
+        def upload_sync(i: int) -> str:
+            return sync_storage.upload_file(file_content=payloads[i], file_name=f"bench/{i}.bin")
+
+        async def run_to_thread():
+            return await asyncio.gather(*(asyncio.to_thread(upload_sync, i) for i in range(args.uploads)))
+
+        async def run_async():
+            return await asyncio.gather(*(async_storage.upload_file(file_content=payloads[i],
+                                                                    file_name=f"bench/{i}.bin")
+                                          for i in range(args.uploads)))
+
+        def run_pool():
+            with ThreadPoolExecutor(max_workers=args.uploads) as pool:
+                return list(pool.map(upload_sync, range(args.uploads)))
+
+        rounds = [
+            ("sync via to_thread", lambda: asyncio.run(run_to_thread())),
+            (f"sync, {args.uploads}-thread pool", run_pool),
+            ("async", lambda: asyncio.run(run_async())),
+        ]
+        for label, func in rounds:
+            restart()
+            with ThreadPeak() as threads:
+                start = time.monotonic()
+                keys = func()
+                seconds = time.monotonic() - start
+            report(label, seconds, threads.peak, server.stats()["peak_connections"])
+            sample = sync_storage.read_file(file_key=keys[-1])
+            if sample != payloads[-1]:
+                print("  FAIL content mismatch")
+                failed = True
+
+        print(f"\n{args.uploads} concurrent presign requests:")
+
+        async def presign_to_thread():
+            return await asyncio.gather(*(asyncio.to_thread(sync_storage.generate_presigned_url, key=f"bench/{i}.bin")
+                                          for i in range(args.uploads)))
+
+        async def presign_async():
+            return await asyncio.gather(*(async_storage.generate_presigned_url(key=f"bench/{i}.bin")
+                                          for i in range(args.uploads)))
+
+        for label, coro in (("sync via to_thread", presign_to_thread), ("async", presign_async)):
+            restart()
+            with ThreadPeak() as threads:
+                start = time.monotonic()
+                asyncio.run(coro())
+                seconds = time.monotonic() - start
+            report(label, seconds, threads.peak, server.stats()["peak_connections"])
+        if failed:
+            sys.exit(1)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+流式运行：原生异步与线程回退对比
+用一个同时提供同步与异步实现、逐 token 流式输出的模拟大模型节点，分别以
+- 线程回退（STREAM_NATIVE_ASYNC=false：共享线程池执行 graph.stream，跨线程队列推送）
+- 原生异步（直接驱动 graph.astream）
+运行 GraphService.astream，比较：
+1. 单个流的每条消息开销（token 无延迟，消息数 / 耗时）
+2. N 个并发流的总耗时与线程数峰值
+并验证两种模式输出的消息序列一致、超时与取消的行为。
+使用方式: python scripts/bench_stream_async.py [--streams 1000] [--tokens 50] [--token-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from typing_extensions import TypedDict
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import StateGraph, START, END
+from langgraph.utils.runnable import RunnableCallable
+from coze_coding_utils.runtime_ctx.context import new_context
+
+import main
+
+
+class BenchState(TypedDict, total=False):
+    answer: str
+
+
+class AsyncFakeChatModel(GenericFakeChatModel):
+    """GenericFakeChatModel 只实现了 _stream，默认的 _astream 会把每个 chunk 放到线程池里取；这里直接在事件循环中产出"""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self._stream(messages, stop=stop, **kwargs):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def build_graph(tokens: int, token_ms: float):
+    def answer_node(state):
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="tok " * tokens)]))
+        text = ""
+        for chunk in model.stream("question"):
+            text += chunk.content
+            if token_ms:
+                time.sleep(token_ms / 1000)
+        return {"answer": text}
+
+    async def answer_node_async(state):
+        model = AsyncFakeChatModel(messages=iter([AIMessage(content="tok " * tokens)]))
+        text = ""
+        async for chunk in model.astream("question"):
+            text += chunk.content
+            if token_ms:
+                await asyncio.sleep(token_ms / 1000)
+        return {"answer": text}
+
+    builder = StateGraph(BenchState)
+    builder.add_node("answer", RunnableCallable(answer_node, answer_node_async, name="answer", trace=False))
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    return builder.compile()
+
+
+class ThreadPeak:
+    """后台采样进程内线程数的峰值（不含采样线程自身）"""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            time.sleep(0.002)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def consume(graph) -> list:
+    stream = main.service.astream({}, graph, run_config=RunnableConfig(), ctx=new_context(method="bench"))
+    return [item async for item in stream]
+
+
+def shape(messages: list) -> list:
+    """去掉随机 id 与耗时后的消息序列，用于比较两种模式的输出"""
+    return [(m["type"], m["sequence_id"], str(m["content"].get("answer") or (m["content"].get("message_end") or {}).get("code")))
+            for m in messages]
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def set_mode(native: bool) -> None:
+    main.STREAM_NATIVE_ASYNC = native
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="流式运行：原生异步与线程回退对比")
+    parser.add_argument("--streams", type=int, default=1000, help="并发流数量")
+    parser.add_argument("--tokens", type=int, default=50, help="并发测试中每个流输出的 token 数")
+    parser.add_argument("--token-ms", type=float, default=20, help="并发测试中模拟模型每个 token 的耗时（毫秒）")
+    args = parser.parse_args()
+    modes = (("thread fallback", False), ("native async", True))
+    ok = True
+
+    print("single stream, 5000 tokens without delay:")
+    graph = build_graph(5000, 0)
+    outputs = []
+    for label, native in modes:
+        set_mode(native)
+        start = time.monotonic()
+        messages = asyncio.run(consume(graph))
+        seconds = time.monotonic() - start
+        outputs.append(shape(messages))
+        print(f"{label:<18} {seconds:6.2f}s  {len(messages) / seconds:8.0f} msg/s  "
+              f"{seconds / len(messages) * 1e6:6.1f} us/msg")
+    ok &= check("both modes emit the same message sequence", outputs[0] == outputs[1])
+
+    print(f"\n{args.streams} concurrent streams of {args.tokens} tokens, {args.token_ms:.0f} ms per token:")
+    graph = build_graph(args.tokens, args.token_ms)
+    for label, native in modes:
+        set_mode(native)
+        with ThreadPeak() as threads:
+            start = time.monotonic()
+            results = asyncio.run(_gather(graph, args.streams))
+            seconds = time.monotonic() - start
+        complete = all(r[-1]["type"] == "message_end" and r[-1]["content"]["message_end"]["code"] == "0"
+                       for r in results)
+        print(f"{label:<18} {seconds:6.2f}s  peak threads {threads.peak:4d}  all complete {complete}")
+        ok &= complete
+
+    print("\ntimeout and cancellation (native async):")
+    set_mode(True)
+    timeout_seconds = main.TIMEOUT_SECONDS
+    main.TIMEOUT_SECONDS = 0.3
+    try:
+        messages = asyncio.run(consume(build_graph(100, 20)))
+    finally:
+        main.TIMEOUT_SECONDS = timeout_seconds
+    ok &= check("stream ends with a TIMEOUT message_end", messages[-1]["content"]["message_end"]["code"] == "TIMEOUT"
+                and messages[-1]["sequence_id"] == messages[-2]["sequence_id"] + 1)
+
+    produced = {"count": 0}
+
+    async def cancel_mid_stream():
+        graph = build_graph(200, 10)
+        task = asyncio.create_task(consume(graph))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # 取消后图不再继续执行：之后没有新的任务在运行
+        await asyncio.sleep(0.3)
+        produced["count"] = len(asyncio.all_tasks())
+
+    asyncio.run(cancel_mid_stream())
+    ok &= check("cancelling the consumer stops the graph", produced["count"] == 1)
+    if not ok:
+        sys.exit(1)
+
+
+async def _gather(graph, streams):
+    return await asyncio.gather(*(consume(graph) for _ in range(streams)))
+
+
+if __name__ == "__main__":
+    main_bench()
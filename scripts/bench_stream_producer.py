@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+流式运行生产者对比
+GraphService.astream 在线程中执行同步的 graph.stream 并把消息推送给 SSE 消费者。本脚本用一个逐 token 流式输出的
+模拟大模型节点，对比：
+- 每个流一个线程（与流数量相同大小的线程池，等同于原先每个流新建线程）
+- 共享的有界线程池（STREAM_PRODUCER_THREADS）
+在 N 个并发流下的线程数峰值与总耗时；并验证读取缓慢的客户端只缓冲有限条消息、客户端断开后生产者及时停止。
+使用方式: python scripts/bench_stream_producer.py [--streams 100] [--tokens 200] [--token-ms 1]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from typing_extensions import TypedDict
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import StateGraph, START, END
+from coze_coding_utils.runtime_ctx.context import new_context
+
+import main
+
+
+class BenchState(TypedDict, total=False):
+    answer: str
+
+
+def build_graph(tokens: int, token_ms: float):
+    def answer_node(state):
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="tok " * tokens)]))
+        text = ""
+        for chunk in model.stream("question"):
+            text += chunk.content
+            time.sleep(token_ms / 1000)
+        return {"answer": text}
+
+    builder = StateGraph(BenchState)
+    builder.add_node("answer", answer_node)
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    return builder.compile()
+
+
+class ThreadPeak:
+    """后台采样进程内线程数的峰值（不含采样线程自身）"""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            time.sleep(0.002)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def consume(service, graph, *, read_delay: float = 0.0, max_items: int = None) -> int:
+    count = 0
+    stream = service.astream({}, graph, run_config=RunnableConfig(), ctx=new_context(method="bench"))
+    try:
+        async for _ in stream:
+            count += 1
+            if max_items is not None and count >= max_items:
+                break
+            if read_delay:
+                await asyncio.sleep(read_delay)
+    finally:
+        await stream.aclose()
+    return count
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="流式运行生产者对比")
+    parser.add_argument("--streams", type=int, default=100, help="并发流数量")
+    parser.add_argument("--tokens", type=int, default=200, help="每个流输出的 token 数")
+    parser.add_argument("--token-ms", type=float, default=1, help="模拟模型每个 token 的耗时（毫秒）")
+    args = parser.parse_args()
+
+    graph = build_graph(args.tokens, args.token_ms)
+    service = main.service
+    # 本脚本验证线程回退模式；原生异步模式见 bench_stream_async.py
+    main.STREAM_NATIVE_ASYNC = False
+
+    # 统计生产者实际产出的消息数
+    produced = {"count": 0}
+    iter_messages = main.agent_iter_server_messages
+
+    def counting_iter(*a, **kw):
+        for sm in iter_messages(*a, **kw):
+            produced["count"] += 1
+            yield sm
+
+    main.agent_iter_server_messages = counting_iter
+
+    print(f"{args.streams} concurrent streams of {args.tokens} tokens:")
+    rounds = [
+        ("thread per stream", ThreadPoolExecutor(max_workers=args.streams, thread_name_prefix="per-stream")),
+        (f"shared pool of {main.STREAM_PRODUCER_THREADS}", None),
+    ]
+    counts = []
+    for label, executor in rounds:
+        service._stream_executor = executor
+        with ThreadPeak() as threads:
+            start = time.monotonic()
+            result = asyncio.run(_gather(service, graph, args.streams))
+            seconds = time.monotonic() - start
+        counts.append(sum(result))
+        print(f"{label:<24} {seconds:6.2f}s  peak threads {threads.peak:4d}  messages {sum(result)}")
+        if executor is not None:
+            executor.shutdown()
+    ok = check("every stream delivered all messages", counts[0] == counts[1] and min(result) == max(result))
+
+    print("slow client and disconnect:")
+
+    async def slow_then_disconnect():
+        produced["count"] = 0
+        read = await consume(service, graph, read_delay=0.05, max_items=10)
+        buffered = produced["count"] - read
+        # 断开后生产者应在当前消息之后停止，不再继续读取图的输出
+        await asyncio.sleep(1.0)
+        return read, buffered, produced["count"]
+
+    before = service.stream_stats()["stopped_early"]
+    read, buffered, total = asyncio.run(slow_then_disconnect())
+    stats = service.stream_stats()
+    ok &= check(f"slow client buffers at most {main.STREAM_QUEUE_SIZE} messages (buffered {buffered})",
+                buffered <= main.STREAM_QUEUE_SIZE + 1)
+    ok &= check(f"producer stops after disconnect (produced {total} of {counts[1] // args.streams})",
+                total < counts[1] // args.streams and stats["stopped_early"] == before + 1)
+    ok &= check("no producer left running", stats["active"] == 0 and stats["pending"] == 0)
+    if not ok:
+        sys.exit(1)
+
+
+async def _gather(service, graph, streams):
+    return await asyncio.gather(*(consume(service, graph) for _ in range(streams)))
+
+
+if __name__ == "__main__":
+    main_bench()
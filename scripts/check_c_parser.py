@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+C 声明静态解析检查
+对一段覆盖常见写法的头文件/源文件片段运行 extract_symbols，逐项检查提取出的符号：
+函数原型与定义、static、返回函数指针的函数、宏与头文件保护宏、struct/enum/union、
+typedef（含函数指针 typedef）、前置声明、全局变量，以及符号表中完整定义优先于前置声明。
+使用方式: python scripts/check_c_parser.py
+"""
+
+import os
+import sys
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(workspace_path, 'src')
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from utils.code.c_parser import SymbolTable, extract_symbols
+
+SOURCE = r'''
+#ifndef FOO_H
+#define FOO_H
+
+#define FOO_MAX 16
+#define FOO_MIN(a, b) ((a) < (b) ? (a) : (b))
+
+struct bar;
+union baz;
+
+/** 组件句柄 */
+typedef struct foo {
+    int id;
+    struct bar *bar;
+} foo_t;
+
+enum foo_mode { FOO_MODE_A, FOO_MODE_B };
+
+struct bar {
+    int value;
+};
+
+typedef void (*foo_cb_t)(int event, void *arg);
+
+/**
+ * 初始化组件
+ */
+int foo_init(foo_t *foo, foo_cb_t cb);
+
+extern const char *foo_name(const foo_t *foo);
+
+void (*foo_get_handler(int sig))(int);
+
+static void (*foo_swap_handler(int sig, void (*handler)(int)))(int)
+{
+    return handler;
+}
+
+static inline int foo_id(const foo_t *foo) { return foo->id; }
+
+int foo_count = 0;
+
+#endif
+'''
+
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def main():
+    symbols = extract_symbols(SOURCE, "foo.h")
+    by_name = {}
+    for symbol in symbols:
+        by_name.setdefault(symbol.name, []).append(symbol)
+
+    def kind(name: str) -> str:
+        found = by_name.get(name)
+        return found[-1].kind if found else ""
+
+    def signature(name: str) -> str:
+        found = by_name.get(name)
+        return found[-1].signature if found else ""
+
+    ok = True
+    print("macros:")
+    ok &= check("include guard skipped", "FOO_H" not in by_name)
+    ok &= check("object-like macro", signature("FOO_MAX") == "#define FOO_MAX 16")
+    ok &= check("function-like macro", kind("FOO_MIN") == "macro")
+
+    print("types:")
+    ok &= check("typedef struct", kind("foo_t") == "typedef" and "int id;" in signature("foo_t"))
+    ok &= check("enum", kind("foo_mode") == "enum")
+    ok &= check("function pointer typedef", kind("foo_cb_t") == "typedef")
+    ok &= check("struct forward declaration is a type",
+                [s.kind for s in by_name.get("bar", [])] == ["struct", "struct"])
+    ok &= check("union forward declaration is a type", kind("baz") == "union" and signature("baz") == "union baz;")
+    types = SymbolTable(symbols=symbols).types()
+    ok &= check("full definition preferred over forward declaration", types.get("bar") is not None
+                and types["bar"].signature.startswith("struct bar {"))
+    ok &= check("forward declaration kept when never defined", "baz" in types and types["baz"].signature == "union baz;")
+
+    print("functions:")
+    ok &= check("prototype with doc comment", signature("foo_init") == "int foo_init(foo_t *foo, foo_cb_t cb)"
+                and by_name["foo_init"][0].doc == "初始化组件")
+    ok &= check("extern prototype", signature("foo_name") == "const char * foo_name(const foo_t *foo)")
+    ok &= check("returns function pointer",
+                kind("foo_get_handler") == "function"
+                and signature("foo_get_handler") == "void (*foo_get_handler(int sig))(int)"
+                and by_name["foo_get_handler"][0].return_type == "void (*)(int)")
+    swap = by_name.get("foo_swap_handler", [None])[0]
+    ok &= check("static definition returning function pointer",
+                swap is not None and swap.is_definition and swap.is_static
+                and swap.params == ("int sig", "void (*handler)(int)"))
+    ok &= check("static inline definition", kind("foo_id") == "function" and by_name["foo_id"][0].is_static)
+
+    print("variables:")
+    ok &= check("global variable", kind("foo_count") == "variable")
+    ok &= check("no other variables", [s.name for s in symbols if s.kind == "variable"] == ["foo_count"])
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
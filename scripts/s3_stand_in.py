@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+本地 S3 兼容替身服务（仅用于基准测试与本地验证，数据保存在内存中）
+支持 path-style 的 HeadObject / GetObject（含 Range）/ PutObject / DeleteObject / ListObjectsV2，
+以及 CreateMultipartUpload / UploadPart / CompleteMultipartUpload / AbortMultipartUpload、
+签名服务 POST /sign-url；校验请求携带的 Content-MD5，可按连接限速、统计请求数、同时进行中的分片上传数与同时打开的连接数。
+使用方式: python scripts/s3_stand_in.py [--port 9000]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+
+def _read_aws_chunked(rfile, content_length: int) -> bytes:
+    """解码 aws-chunked 请求体（botocore 计算流式校验和时使用）"""
+    data = bytearray()
+    remaining = content_length
+    while remaining > 0:
+        line = rfile.readline()
+        remaining -= len(line)
+        size = int(line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            # 剩余为 trailer 头与结束空行
+            rest = rfile.read(remaining)
+            remaining -= len(rest)
+            break
+        data += rfile.read(size)
+        remaining -= size
+        remaining -= len(rfile.readline())
+    return bytes(data)
+
+
+class _Server(ThreadingHTTPServer):
+    # 基准测试会同时发起上百个连接，默认的监听队列长度（5）会导致连接被丢弃重试
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class S3StandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, bandwidth: float = 0, latency: float = 0):
+        self.objects = {}
+        self.uploads = {}
+        self.bandwidth = bandwidth
+        # 每个响应前的固定延迟（秒），模拟网络往返与服务端处理时间
+        self.latency = latency
+        self.counts = Counter()
+        self.active_parts = 0
+        self.peak_parts = 0
+        self.active_connections = 0
+        self.peak_connections = 0
+        self.lock = threading.Lock()
+        self.httpd = _Server((host, port), self._handler())
+        self.endpoint_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self) -> "S3StandIn":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _throttle(self, size: int, began: float) -> None:
+        if self.bandwidth:
+            delay = size / self.bandwidth - (time.monotonic() - began)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _target(self):
+                parsed = urlparse(self.path)
+                bucket, _, key = unquote(parsed.path).lstrip('/').partition('/')
+                query = {k: v[0] for k, v in parse_qs(parsed.query, keep_blank_values=True).items()}
+                return bucket, key, query
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                if "aws-chunked" in (self.headers.get("Content-Encoding") or "") or \
+                        (self.headers.get("x-amz-content-sha256") or "").startswith("STREAMING-"):
+                    return _read_aws_chunked(self.rfile, length)
+                return self.rfile.read(length)
+
+            def _digest_ok(self, data: bytes) -> bool:
+                expected = self.headers.get("Content-MD5")
+                if expected and base64.b64encode(hashlib.md5(data).digest()).decode("ascii") != expected:
+                    server.counts["bad_digest"] += 1
+                    self._xml("<Error><Code>BadDigest</Code><Message>Content-MD5 mismatch</Message></Error>", 400)
+                    return False
+                return True
+
+            def handle(self):
+                with server.lock:
+                    server.active_connections += 1
+                    server.peak_connections = max(server.peak_connections, server.active_connections)
+                try:
+                    super().handle()
+                finally:
+                    with server.lock:
+                        server.active_connections -= 1
+
+            def _send(self, status: int, body: bytes = b"", headers=None, throttle: bool = False):
+                if server.latency and self.path != "/_stats":
+                    time.sleep(server.latency)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not body or self.command == "HEAD":
+                    return
+                if not throttle:
+                    self.wfile.write(body)
+                    return
+                began = time.monotonic()
+                view = memoryview(body)
+                for offset in range(0, len(body), 256 * 1024):
+                    self.wfile.write(view[offset:offset + 256 * 1024])
+                    server._throttle(offset + 256 * 1024, began)
+
+            def _xml(self, body: str, status: int = 200):
+                self._send(status, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+            def _not_found(self):
+                self._xml("<Error><Code>NoSuchKey</Code><Message>not found</Message></Error>", 404)
+
+            def do_HEAD(self):
+                bucket, key, _ = self._target()
+                server.counts["head"] += 1
+                obj = server.objects.get((bucket, key))
+                if obj is None:
+                    self._send(404)
+                    return
+                self._send(200, obj, {"ETag": f'"{hashlib.md5(obj).hexdigest()}"'})
+
+            def do_GET(self):
+                bucket, key, query = self._target()
+                if bucket == "_stats":
+                    self._send(200, json.dumps(server.stats()).encode("utf-8"), {"Content-Type": "application/json"})
+                    return
+                if not key and query.get("list-type") == "2":
+                    server.counts["list"] += 1
+                    self._list(bucket, query)
+                    return
+                server.counts["get"] += 1
+                obj = server.objects.get((bucket, key))
+                if obj is None:
+                    self._not_found()
+                    return
+                range_header = self.headers.get("Range")
+                if range_header and range_header.startswith("bytes="):
+                    first, _, last = range_header[len("bytes="):].partition('-')
+                    start, end = int(first), min(int(last) if last else len(obj) - 1, len(obj) - 1)
+                    self._send(206, obj[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(obj)}"},
+                               throttle=True)
+                    return
+                self._send(200, obj, {"ETag": f'"{hashlib.md5(obj).hexdigest()}"'}, throttle=True)
+
+            def _list(self, bucket, query):
+                prefix = query.get("prefix", "")
+                max_keys = int(query.get("max-keys", "1000"))
+                start = int(query.get("continuation-token") or 0)
+                keys = sorted(k for b, k in server.objects if b == bucket and k.startswith(prefix))
+                page = keys[start:start + max_keys]
+                truncated = start + max_keys < len(keys)
+                contents = "".join(
+                    f"<Contents><Key>{escape(k)}</Key><Size>{len(server.objects[(bucket, k)])}</Size></Contents>"
+                    for k in page)
+                token = f"<NextContinuationToken>{start + max_keys}</NextContinuationToken>" if truncated else ""
+                self._xml(f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{bucket}</Name>'
+                          f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                          f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+                          f"{contents}{token}</ListBucketResult>")
+
+            def do_PUT(self):
+                bucket, key, query = self._target()
+                began = time.monotonic()
+                if "uploadId" in query:
+                    with server.lock:
+                        server.counts["upload_part"] += 1
+                        server.active_parts += 1
+                        server.peak_parts = max(server.peak_parts, server.active_parts)
+                    try:
+                        data = self._body()
+                        server._throttle(len(data), began)
+                        if not self._digest_ok(data):
+                            return
+                        upload = server.uploads.get(query["uploadId"])
+                        if upload is None:
+                            self._xml("<Error><Code>NoSuchUpload</Code></Error>", 404)
+                            return
+                        upload[int(query["partNumber"])] = data
+                        self._send(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+                    finally:
+                        with server.lock:
+                            server.active_parts -= 1
+                    return
+                server.counts["put"] += 1
+                data = self._body()
+                server._throttle(len(data), began)
+                if not self._digest_ok(data):
+                    return
+                server.objects[(bucket, key)] = data
+                self._send(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+            def do_POST(self):
+                bucket, key, query = self._target()
+                body = self._body()
+                if bucket == "sign-url" and not key:
+                    server.counts["sign"] += 1
+                    if not self.headers.get("x-storage-token"):
+                        self._send(401, b'{"message": "missing x-storage-token"}', {"Content-Type": "application/json"})
+                        return
+                    payload = json.loads(body)
+                    url = f"{server.object_url(payload['bucket_name'], payload['path'])}?expires={payload['expire_time']}"
+                    self._send(200, json.dumps({"data": {"url": url}}).encode("utf-8"), {"Content-Type": "application/json"})
+                    return
+                if "uploads" in query:
+                    server.counts["create_multipart"] += 1
+                    upload_id = uuid.uuid4().hex
+                    server.uploads[upload_id] = {}
+                    self._xml(f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                              f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+                    return
+                if "uploadId" in query:
+                    server.counts["complete_multipart"] += 1
+                    upload = server.uploads.pop(query["uploadId"], None)
+                    if upload is None:
+                        self._xml("<Error><Code>NoSuchUpload</Code></Error>", 404)
+                        return
+                    root = ElementTree.fromstring(body)
+                    numbers = [int(el.text) for el in root.iter() if el.tag.endswith("PartNumber")]
+                    data = b"".join(upload[n] for n in numbers)
+                    server.objects[(bucket, key)] = data
+                    self._xml(f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                              f'<ETag>"{hashlib.md5(data).hexdigest()}-{len(numbers)}"</ETag>'
+                              f"</CompleteMultipartUploadResult>")
+                    return
+                self._xml("<Error><Code>NotImplemented</Code></Error>", 501)
+
+            def do_DELETE(self):
+                bucket, key, query = self._target()
+                if "uploadId" in query:
+                    server.counts["abort_multipart"] += 1
+                    server.uploads.pop(query["uploadId"], None)
+                else:
+                    server.counts["delete"] += 1
+                    server.objects.pop((bucket, key), None)
+                self._send(204)
+
+        return Handler
+
+    def object_url(self, bucket: str, key: str) -> str:
+        return f"{self.endpoint_url}/{bucket}/{quote(key)}"
+
+    def stats(self) -> dict:
+        return {"requests": dict(self.counts), "peak_concurrent_parts": self.peak_parts,
+                "peak_connections": self.peak_connections, "objects": len(self.objects)}
+
+
+class S3StandInProcess:
+    """在独立进程中运行替身服务，避免其内存占用计入被测进程；GET /_stats 返回请求统计"""
+
+    def __init__(self, bandwidth_mb: float = 0, latency_ms: float = 0):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.endpoint_url = f"http://127.0.0.1:{port}"
+        self._proc = subprocess.Popen([sys.executable, __file__, "--port", str(port),
+                                       "--bandwidth-mb", str(bandwidth_mb), "--latency-ms", str(latency_ms)],
+                                      stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("S3 stand-in failed to start")
+                time.sleep(0.05)
+
+    def stats(self) -> dict:
+        import urllib.request
+        with urllib.request.urlopen(f"{self.endpoint_url}/_stats") as resp:
+            return json.loads(resp.read())
+
+    def close(self) -> None:
+        self._proc.terminate()
+        self._proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 S3 兼容替身服务")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="单个请求的带宽上限（MB/s，0 表示不限速）")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个响应前的固定延迟（毫秒）")
+    args = parser.parse_args()
+    server = S3StandIn(port=args.port, bandwidth=args.bandwidth_mb * 1024 * 1024, latency=args.latency_ms / 1000)
+    print(f"S3 stand-in listening on {server.endpoint_url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 import os
+import asyncio
 from langgraph.graph import StateGraph, END
+from langgraph.utils.runnable import RunnableCallable
 from langchain_core.runnables import RunnableConfig
 from langgraph.runtime import Runtime
 from coze_coding_utils.runtime_ctx.context import Context
 from graphs.state import (
     GlobalState,
     GraphInput,
+    ExtractFunctionsInput,
+    AnalyzeCallRelationInput,
+    GenerateFlowchartInput,
     GraphOutput,
     SaveReadmeInput,
     SaveReadmeOutput,
@@ -17,37 +22,77 @@ from graphs.state import (
 from graphs.node import (
     upload_local_file_node,
     unzip_node,
+    build_source_index_node,
     analyze_structure_node,
     extract_functions_node,
+    extract_functions_node_async,
     analyze_call_relation_node,
+    analyze_call_relation_node_async,
     generate_flowchart_node,
+    generate_flowchart_node_async,
     generate_readme_node
 )
 from utils.file.file import File
+from utils.file.workspace import remove_workspace
+from storage.cache.run_cache import get_run_cache, LOCATION_S3, LOCATION_LOCAL
+
+def _readme_file_prefix(content_bytes: bytes) -> str:
+    """README 文件名前缀：内容 MD5 的前两段"""
+    import hashlib
+    md5_hash = hashlib.md5(content_bytes).hexdigest()
+    return f"{md5_hash[:8]}_{md5_hash[8:16]}"
+
+
+def _save_readme_locally(state: SaveReadmeInput, file_prefix: str, run_cache) -> SaveReadmeOutput:
+    """对象存储不可用时回退到本地文件"""
+    readme_path = f"/tmp/README_{file_prefix}.md"
+    with open(readme_path, 'w', encoding='utf-8') as f:
+        f.write(state.readme_content)
+    if run_cache is not None:
+        run_cache.put(state.archive_digest, f"{LOCATION_LOCAL}{readme_path}")
+    return SaveReadmeOutput(readme_url=f"{LOCATION_LOCAL}{readme_path}")
+
 
 def save_readme_node(state: SaveReadmeInput, config: RunnableConfig, runtime: Runtime[Context]) -> SaveReadmeOutput:
     """
     title: 保存README文件
-    desc: 将生成的README内容保存到对象存储并返回可访问的URL
+    desc: 将生成的README内容保存到对象存储并返回可访问的URL；命中运行结果缓存时直接为已有README重新生成URL；保存后删除本次运行的工作目录
     integrations: 对象存储
     """
-    import hashlib
-    from coze_coding_dev_sdk.s3 import S3SyncStorage
+    try:
+        return _save_readme(state)
+    finally:
+        # 后续不再读取源码，删除下载的压缩包、解压结果等临时文件
+        remove_workspace(state.work_dir)
+
+
+def _save_readme(state: SaveReadmeInput) -> SaveReadmeOutput:
+    from storage.s3.s3_storage import get_s3_storage
+
+    run_cache = get_run_cache()
+
+    # 命中运行结果缓存：本地文件直接返回路径，对象存储重新签名
+    if state.cached_readme_location:
+        location = state.cached_readme_location
+        if location.startswith(LOCATION_LOCAL):
+            return SaveReadmeOutput(readme_url=location)
+        storage = get_s3_storage()
+        try:
+            readme_url = storage.generate_presigned_url(key=location[len(LOCATION_S3):], expire_time=1800)
+            return SaveReadmeOutput(readme_url=readme_url)
+        except Exception as e:
+            # 缓存记录失效，下次提交将重新生成
+            if run_cache is not None:
+                run_cache.invalidate(state.archive_digest)
+            raise Exception(f"缓存的README签名失败，已清除缓存记录，请重新提交: {str(e)}")
 
     # 生成唯一的文件名：README_前两段MD5.md（生成Markdown格式）
     content_bytes = state.readme_content.encode('utf-8')
-    md5_hash = hashlib.md5(content_bytes).hexdigest()
-    file_prefix = f"{md5_hash[:8]}_{md5_hash[8:16]}"
+    file_prefix = _readme_file_prefix(content_bytes)
     file_name = f"README_{file_prefix}.md"
 
-    # 上传到对象存储
-    storage = S3SyncStorage(
-        endpoint_url=os.getenv("COZE_BUCKET_ENDPOINT_URL"),
-        access_key="",
-        secret_key="",
-        bucket_name=os.getenv("COZE_BUCKET_NAME"),
-        region="cn-beijing",
-    )
+    # 上传到对象存储（进程内共享的客户端）
+    storage = get_s3_storage()
 
     try:
         # 上传文件内容（Markdown格式，指定UTF-8编码，解决中文乱码问题）
@@ -60,13 +105,74 @@ def save_readme_node(state: SaveReadmeInput, config: RunnableConfig, runtime: Ru
         # 生成签名URL（有效期30分钟）
         readme_url = storage.generate_presigned_url(key=key, expire_time=1800)
 
+        if run_cache is not None:
+            run_cache.put(state.archive_digest, f"{LOCATION_S3}{key}")
         return SaveReadmeOutput(readme_url=readme_url)
     except Exception as e:
         # 如果对象存储不可用，回退到本地文件
-        readme_path = f"/tmp/README_{file_prefix}.md"
-        with open(readme_path, 'w', encoding='utf-8') as f:
-            f.write(state.readme_content)
-        return SaveReadmeOutput(readme_url=f"local:{readme_path}")
+        return _save_readme_locally(state, file_prefix, run_cache)
+
+
+async def save_readme_node_async(state: SaveReadmeInput, config: RunnableConfig, runtime: Runtime[Context]) -> SaveReadmeOutput:
+    """save_readme_node 的异步版本：上传与签名通过异步对象存储客户端完成，等待网络期间不占用线程"""
+    try:
+        return await _asave_readme(state)
+    finally:
+        await asyncio.to_thread(remove_workspace, state.work_dir)
+
+
+async def _asave_readme(state: SaveReadmeInput) -> SaveReadmeOutput:
+    from storage.s3.s3_async_storage import get_s3_async_storage
+
+    run_cache = get_run_cache()
+
+    if state.cached_readme_location:
+        location = state.cached_readme_location
+        if location.startswith(LOCATION_LOCAL):
+            return SaveReadmeOutput(readme_url=location)
+        storage = get_s3_async_storage()
+        try:
+            readme_url = await storage.generate_presigned_url(key=location[len(LOCATION_S3):], expire_time=1800)
+            return SaveReadmeOutput(readme_url=readme_url)
+        except Exception as e:
+            if run_cache is not None:
+                run_cache.invalidate(state.archive_digest)
+            raise Exception(f"缓存的README签名失败，已清除缓存记录，请重新提交: {str(e)}")
+
+    content_bytes = state.readme_content.encode('utf-8')
+    file_prefix = _readme_file_prefix(content_bytes)
+    storage = get_s3_async_storage()
+
+    try:
+        key = await storage.upload_file(
+            file_content=content_bytes,
+            file_name=f"README_{file_prefix}.md",
+            content_type="text/markdown; charset=utf-8",
+        )
+        readme_url = await storage.generate_presigned_url(key=key, expire_time=1800)
+
+        if run_cache is not None:
+            run_cache.put(state.archive_digest, f"{LOCATION_S3}{key}")
+        return SaveReadmeOutput(readme_url=readme_url)
+    except Exception as e:
+        return _save_readme_locally(state, file_prefix, run_cache)
+
+
+def route_after_unzip(state: GlobalState) -> str:
+    """
+    title: 运行结果缓存路由
+    desc: 命中运行结果缓存时直接跳转到保存节点，否则进入源码分析流程
+    """
+    if state.cached_readme_location:
+        return "save_readme"
+    return "build_source_index"
+
+def with_async(func, afunc) -> RunnableCallable:
+    """
+    同时注册节点的同步与异步实现：invoke/stream 执行 func，ainvoke/astream 执行 afunc。
+    节点名称取自 func.__name__，按节点函数名查找节点的逻辑不受影响
+    """
+    return RunnableCallable(func, afunc, name=func.__name__, trace=False)
 
 # 创建状态图，指定图的入参和出参
 builder = StateGraph(GlobalState, input_schema=GraphInput, output_schema=GraphOutput)
@@ -74,23 +180,43 @@ builder = StateGraph(GlobalState, input_schema=GraphInput, output_schema=GraphOu
 # 添加节点
 builder.add_node("upload_local_file", upload_local_file_node)
 builder.add_node("unzip", unzip_node)
+builder.add_node("build_source_index", build_source_index_node)
 builder.add_node("analyze_structure", analyze_structure_node)
-builder.add_node("extract_functions", extract_functions_node, metadata={"type": "agent", "llm_cfg": "config/function_extract_llm_cfg.json"})
-builder.add_node("analyze_call_relation", analyze_call_relation_node, metadata={"type": "agent", "llm_cfg": "config/call_analysis_llm_cfg.json"})
-builder.add_node("generate_flowchart", generate_flowchart_node, metadata={"type": "agent", "llm_cfg": "config/flowchart_llm_cfg.json"})
+# 大模型节点同时提供异步实现，服务端以 ainvoke 运行时等待模型响应不占用线程，取消任务可中断进行中的请求
+builder.add_node("extract_functions", with_async(extract_functions_node, extract_functions_node_async),
+                 metadata={"type": "agent", "llm_cfg": "config/function_extract_llm_cfg.json"},
+                 input_schema=ExtractFunctionsInput)
+builder.add_node("analyze_call_relation", with_async(analyze_call_relation_node, analyze_call_relation_node_async),
+                 metadata={"type": "agent", "llm_cfg": "config/call_analysis_llm_cfg.json"},
+                 input_schema=AnalyzeCallRelationInput)
+builder.add_node("generate_flowchart", with_async(generate_flowchart_node, generate_flowchart_node_async),
+                 metadata={"type": "agent", "llm_cfg": "config/flowchart_llm_cfg.json"},
+                 input_schema=GenerateFlowchartInput)
 builder.add_node("generate_readme", generate_readme_node)
-builder.add_node("save_readme", save_readme_node)
+# 保存节点同样提供异步实现，上传与签名走异步对象存储客户端
+builder.add_node("save_readme", with_async(save_readme_node, save_readme_node_async))
 
 # 设置入口点
 builder.set_entry_point("upload_local_file")
 
-# 添加边（线性流程）
+# 添加边
+# 预处理阶段（线性）
 builder.add_edge("upload_local_file", "unzip")
-builder.add_edge("unzip", "analyze_structure")
-builder.add_edge("analyze_structure", "extract_functions")
-builder.add_edge("extract_functions", "analyze_call_relation")
+# 命中运行结果缓存时跳过全部分析，直接重新生成README的访问URL
+builder.add_conditional_edges("unzip", route_after_unzip, {
+    "build_source_index": "build_source_index",
+    "save_readme": "save_readme",
+})
+
+# 分析阶段（扇出）：三个分析分支只依赖源码索引，并行执行
+builder.add_edge("build_source_index", "analyze_structure")
+builder.add_edge("build_source_index", "extract_functions")
+builder.add_edge("build_source_index", "analyze_call_relation")
+# 流程图只依赖调用关系分析结果，串接在调用关系分支之后
 builder.add_edge("analyze_call_relation", "generate_flowchart")
-builder.add_edge("generate_flowchart", "generate_readme")
+
+# 汇聚阶段（扇入）：所有分支完成后再生成README
+builder.add_edge(["analyze_structure", "extract_functions", "generate_flowchart"], "generate_readme")
 builder.add_edge("generate_readme", "save_readme")
 builder.add_edge("save_readme", END)
 
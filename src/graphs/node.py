@@ -1,12 +1,14 @@
 import os
 import re
+import asyncio
 import zipfile
-import shutil
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Union
 from langchain_core.runnables import RunnableConfig
 from langgraph.runtime import Runtime
 from coze_coding_utils.runtime_ctx.context import Context
 from graphs.state import (
+    BuildSourceIndexInput,
+    BuildSourceIndexOutput,
     AnalyzeStructureInput,
     AnalyzeStructureOutput,
     ExtractFunctionsInput,
@@ -22,14 +24,58 @@ from graphs.state import (
     UploadLocalFileInput,
     UploadLocalFileOutput,
 )
-import json
 from jinja2 import Template
+from utils.code.source_index import (
+    KIND_HEADER,
+    KIND_SOURCE,
+    SourceIndex,
+    build_source_index,
+    get_source_index,
+    in_folders,
+    is_source_path,
+    source_exists,
+    write_source_index,
+)
+from utils.code.call_graph import (
+    ADJACENCY_TITLE,
+    CallGraph,
+    build_call_graph,
+    load_call_graph,
+    render_call_graph,
+    render_cross_module,
+    render_module_sections,
+    render_overview,
+    write_call_graph,
+)
+from utils.code.mermaid import DEFAULT_NODE_BUDGET, render_flowcharts
+from utils.code.c_parser import SymbolTable, CSymbol, build_symbol_table, referenced_types
+from utils.llm.client import load_llm_cfg
+from utils.llm.prompt_packer import PackItem, count_tokens, input_token_budget, pack_items
+from utils.llm.map_reduce import (
+    DEFAULT_MAX_CONCURRENCY,
+    REDUCE_CONCAT,
+    REDUCE_LLM,
+    LLMJob,
+    arun_job,
+    render_shard,
+    run_job,
+    shard_items,
+)
+from utils.file.digest import content_digest
+from utils.file.downloader import download_file
+from utils.file.uploader import upload_local_file
+from utils.file.archive import UNZIP_MODE, UNZIP_MODE_FULL, UNZIP_MODE_IN_PLACE, extract_selected, top_level_dir
+from utils.file.vfs import is_s3_uri, open_vfs
+from utils.file.workspace import create_workspace, remove_workspace, workspace_of
+from storage.cache.run_cache import get_run_cache
+import logging
+logger = logging.getLogger(__name__)
 
 
 def upload_local_file_node(state: UploadLocalFileInput, config: RunnableConfig, runtime: Runtime[Context]) -> UploadLocalFileOutput:
     """
     title: 上传本地文件
-    desc: 如果是本地文件路径，上传到对象存储；如果是URL或目录，直接返回
+    desc: 如果是本地文件路径，上传到对象存储；如果是URL、对象存储前缀（s3://bucket/prefix）或目录，直接返回
     integrations: 对象存储
     """
 
@@ -55,16 +101,27 @@ def upload_local_file_node(state: UploadLocalFileInput, config: RunnableConfig,
         """
         raise Exception(error_msg.strip())
 
-    # 如果是URL，直接返回
-    if path.startswith('http://') or path.startswith('https://'):
+    # 如果是URL或对象存储前缀，直接返回
+    if path.startswith('http://') or path.startswith('https://') or is_s3_uri(path):
         return UploadLocalFileOutput(zip_file_path=path)
 
-    # 如果是目录，直接返回
+    run_cache = get_run_cache()
+
+    # 如果是目录，直接返回（启用运行结果缓存时顺带计算内容哈希）
     if os.path.isdir(path):
-        return UploadLocalFileOutput(zip_file_path=path)
+        archive_digest = content_digest(path) if run_cache is not None else ""
+        return UploadLocalFileOutput(zip_file_path=path, archive_digest=archive_digest or "")
 
     # 如果是本地文件，上传到对象存储（仅在Coze环境中）
     if os.path.isfile(path):
+        archive_digest = ""
+        if run_cache is not None:
+            archive_digest = content_digest(path) or ""
+            # 相同内容已有生成结果时无需上传，由解压节点直接短路
+            if run_cache.get(archive_digest):
+                print(f"♻️ 命中运行结果缓存，跳过上传: {archive_digest[:16]}")
+                return UploadLocalFileOutput(zip_file_path=path, archive_digest=archive_digest)
+
         # 检查是否在Coze环境中（通过环境变量判断）
         in_coze_env = os.getenv('COZE_WORKSPACE_PATH') and (
             os.getenv('COZE_BUCKET_ENDPOINT_URL') or os.getenv('COZE_BUCKET_NAME')
@@ -72,134 +129,200 @@ def upload_local_file_node(state: UploadLocalFileInput, config: RunnableConfig,
 
         if in_coze_env:
             try:
-                from coze_coding_dev_sdk.s3 import S3SyncStorage
-                import os as env_os
-
-                # 初始化对象存储
-                storage = S3SyncStorage(
-                    endpoint_url=env_os.getenv("COZE_BUCKET_ENDPOINT_URL"),
-                    access_key="",
-                    secret_key="",
-                    bucket_name=env_os.getenv("COZE_BUCKET_NAME"),
-                    region="cn-beijing",
-                )
+                from storage.s3.s3_storage import get_s3_storage
 
-                # 读取文件
-                filename = os.path.basename(path)
-                with open(path, 'rb') as f:
-                    file_content = f.read()
+                # 进程内共享的对象存储客户端
+                storage = get_s3_storage()
 
-                # 上传到对象存储
-                file_key = storage.upload_file(
-                    file_content=file_content,
-                    file_name=filename,
+                # 按内容哈希命名、流式并发分片上传，同一内容已上传过时跳过
+                filename = os.path.basename(path)
+                result = upload_local_file(
+                    storage,
+                    path,
+                    digest=archive_digest,
                     content_type="application/zip" if filename.endswith('.zip') else "application/octet-stream",
                 )
+                file_key = result.key
 
                 # 生成下载URL
                 download_url = storage.generate_presigned_url(key=file_key, expire_time=3600)
 
-                print(f"✅ 文件已上传到对象存储: {file_key}")
+                print(f"✅ 文件已上传到对象存储: {file_key}（{result.report()}）")
                 print(f"📥 下载URL: {download_url}")
 
-                return UploadLocalFileOutput(zip_file_path=download_url)
+                return UploadLocalFileOutput(zip_file_path=download_url, archive_digest=archive_digest)
 
             except Exception as e:
                 print(f"⚠️ 上传对象存储失败，将使用本地路径: {str(e)}")
                 # 如果上传失败，返回本地路径
-                return UploadLocalFileOutput(zip_file_path=path)
+                return UploadLocalFileOutput(zip_file_path=path, archive_digest=archive_digest)
         else:
             # 本地环境，直接使用本地路径
             print(f"📁 本地运行模式，使用本地文件路径: {path}")
-            return UploadLocalFileOutput(zip_file_path=path)
+            return UploadLocalFileOutput(zip_file_path=path, archive_digest=archive_digest)
 
     raise Exception(f"❌ 路径无效或文件不存在: {path}\n\n请检查：\n1. 路径是否正确\n2. 文件是否存在\n3. 是否使用了Windows路径格式（应使用Linux路径）")
 
 
+def _run_id(runtime: Runtime[Context]) -> str:
+    return getattr(getattr(runtime, "context", None), "run_id", "") or ""
+
+
 def unzip_node(state: UnzipInput, config: RunnableConfig, runtime: Runtime[Context]) -> UnzipOutput:
     """
     title: 解压缩文件
-    desc: 如果输入是zip文件，则解压到临时目录；如果是文件夹，直接返回
+    desc: 如果输入是zip文件，则解压到本次运行的工作目录；如果是文件夹或对象存储前缀，直接返回
     """
 
     path = state.zip_file_path
+    archive_digest = state.archive_digest
+    run_cache = get_run_cache()
+
+    # 对象存储前缀：不下载到本地，后续节点通过 VFS 直接读取对象
+    if is_s3_uri(path):
+        component_name = path.rstrip('/').rsplit('/', 1)[-1]
+        print(f"组件名称: {component_name}")
+        return UnzipOutput(extracted_path=path, component_name=component_name, archive_path=path,
+                           archive_in_place=True, archive_digest=archive_digest,
+                           work_dir=create_workspace(_run_id(runtime)))
 
     # 判断是否是URL
     is_url = path.startswith('http://') or path.startswith('https://')
 
     # 判断是否是zip文件（对于URL，检查路径部分）
     if is_url or path.endswith('.zip') or path.endswith('.ZIP'):
-        # 如果是URL，先下载到临时文件
-        if is_url:
-            from urllib.parse import urlparse
-            import tempfile
-
-            # 解析URL获取文件名
-            parsed_url = urlparse(path)
-            filename = os.path.basename(parsed_url.path)
-
-            # 创建临时文件
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-            temp_file.close()
+        # 下载的压缩包与解压结果都放在本次运行的工作目录中，运行结束时一并删除
+        work_dir = create_workspace(_run_id(runtime))
 
+        # 如果是URL，先下载到工作目录
+        if is_url:
+            downloaded = os.path.join(work_dir, "archive.zip")
             try:
-                import requests
-                response = requests.get(path, timeout=120)
-                response.raise_for_status()
+                # 流式分片下载，边下载边计算内容哈希
+                result = download_file(path, downloaded)
 
-                with open(temp_file.name, 'wb') as f:
-                    f.write(response.content)
+                if run_cache is not None and not archive_digest:
+                    archive_digest = result.digest
 
-                print(f"已下载到: {temp_file.name}")
-                path = temp_file.name
+                print(f"已下载到: {downloaded}（{result.report()}）")
+                path = downloaded
             except Exception as e:
-                os.unlink(temp_file.name)
+                remove_workspace(work_dir)
                 raise Exception(f"下载失败: {str(e)}")
 
-        # 创建临时解压目录
-        import tempfile
-        temp_dir = tempfile.mkdtemp(prefix="component_extracted_")
+        # 相同内容已有生成结果时跳过解压与分析
+        if run_cache is not None:
+            if not archive_digest:
+                archive_digest = content_digest(path) or ""
+            cached_location = run_cache.get(archive_digest)
+            if cached_location:
+                remove_workspace(work_dir)
+                print(f"♻️ 命中运行结果缓存，跳过解压与分析: {archive_digest[:16]}")
+                return UnzipOutput(archive_digest=archive_digest, cached_readme_location=cached_location)
 
         try:
-            with zipfile.ZipFile(path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            print(f"已解压到: {temp_dir}")
+            # 解压方式：full 解压全部内容；sources 按中央目录重建目录树，只解压源码文件；
+            # in_place 不解压，目录树和文件内容都直接从压缩包读取
+            archive_path = ""
+            extracted_path = os.path.join(work_dir, "extracted")
+            if UNZIP_MODE == UNZIP_MODE_FULL:
+                with zipfile.ZipFile(path, 'r') as zip_ref:
+                    zip_ref.extractall(extracted_path)
+                print(f"已解压到: {extracted_path}")
+            elif UNZIP_MODE == UNZIP_MODE_IN_PLACE:
+                archive_path = path
+                extracted_path = path
+                print(f"不解压，分析时直接读取压缩包: {path}")
+            else:
+                archive_path = path
+                os.makedirs(extracted_path, exist_ok=True)
+                stats = extract_selected(path, extracted_path, is_source_path)
+                print(f"已解压源码文件到: {extracted_path}（{stats.report()}）")
 
-            # 如果是下载的临时文件，删除它
-            if is_url and 'temp_file' in locals():
-                os.unlink(temp_file.name)
+            # 完整解压后不再需要下载的压缩包；选择性解压时索引要从其中央目录构建，由索引节点建完索引后删除；
+            # 直接读取压缩包时保留到运行结束
+            if is_url and UNZIP_MODE == UNZIP_MODE_FULL:
+                os.unlink(path)
 
             # 提取组件名称（从解压后的第一个子文件夹）
             component_name = "Unknown"
             try:
-                items = os.listdir(temp_dir)
-                if items:
-                    # 获取第一个文件夹作为组件名称
-                    first_item = items[0]
-                    if os.path.isdir(os.path.join(temp_dir, first_item)):
-                        component_name = first_item
+                if UNZIP_MODE == UNZIP_MODE_IN_PLACE:
+                    component_name = top_level_dir(path) or component_name
+                else:
+                    items = os.listdir(extracted_path)
+                    if items:
+                        # 获取第一个文件夹作为组件名称
+                        first_item = items[0]
+                        if os.path.isdir(os.path.join(extracted_path, first_item)):
+                            component_name = first_item
             except Exception:
                 component_name = "Component"
 
             print(f"组件名称: {component_name}")
 
             # 返回解压后的路径和组件名称
-            return UnzipOutput(extracted_path=temp_dir, component_name=component_name)
+            return UnzipOutput(
+                extracted_path=extracted_path,
+                component_name=component_name,
+                archive_path=archive_path,
+                archive_in_place=UNZIP_MODE == UNZIP_MODE_IN_PLACE,
+                archive_digest=archive_digest,
+                work_dir=work_dir,
+            )
         except Exception as e:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            remove_workspace(work_dir)
             raise Exception(f"解压失败: {str(e)}")
     else:
         # 如果不是zip文件，直接返回原路径
         if os.path.isdir(path):
+            if run_cache is not None:
+                if not archive_digest:
+                    archive_digest = content_digest(path) or ""
+                cached_location = run_cache.get(archive_digest)
+                if cached_location:
+                    print(f"♻️ 命中运行结果缓存，跳过分析: {archive_digest[:16]}")
+                    return UnzipOutput(archive_digest=archive_digest, cached_readme_location=cached_location)
+
             # 提取组件名称
             component_name = os.path.basename(path.rstrip('/'))
             print(f"组件名称: {component_name}")
-            return UnzipOutput(extracted_path=path, component_name=component_name)
+            return UnzipOutput(extracted_path=path, component_name=component_name, archive_digest=archive_digest,
+                               work_dir=create_workspace(_run_id(runtime)))
         else:
             raise Exception(f"路径既不是zip文件也不是目录: {path}")
 
 
+def build_source_index_node(state: BuildSourceIndexInput, config: RunnableConfig, runtime: Runtime[Context]) -> BuildSourceIndexOutput:
+    """
+    title: 源码索引构建
+    desc: 单次遍历组件源码（本地目录；选择性解压时为压缩包中央目录；或对象存储前缀），构建包含路径、大小、修改时间、内容哈希、文件类型、第三方标记和优先级的源码索引，供后续分析节点共享
+    """
+
+    if state.archive_path and state.archive_in_place:
+        # 不解压：VFS 登记在本次运行的工作目录下，分析节点共享，运行结束时关闭
+        index = build_source_index(state.extracted_path, open_vfs(state.archive_path, state.work_dir),
+                                   in_place=True, workspace=state.work_dir)
+    elif state.archive_path:
+        # 选择性解压：目录树取自压缩包中央目录，源码内容已解压到 extracted_path
+        vfs = open_vfs(state.archive_path)
+        try:
+            index = build_source_index(state.extracted_path, vfs)
+        finally:
+            vfs.close()
+        # 下载到工作目录的压缩包此后不再需要，提前删除释放磁盘
+        if state.work_dir and workspace_of(state.archive_path) == os.path.abspath(state.work_dir):
+            os.unlink(state.archive_path)
+    elif os.path.isdir(state.extracted_path):
+        index = build_source_index(state.extracted_path)
+    else:
+        raise Exception(f"组件路径不存在: {state.extracted_path}")
+    source_index_path = write_source_index(index, state.work_dir or create_workspace(_run_id(runtime)))
+    print(f"源码索引已生成: {source_index_path}（{len(index)} 项）")
+
+    return BuildSourceIndexOutput(source_index_path=source_index_path)
+
+
 def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig, runtime: Runtime[Context]) -> AnalyzeStructureOutput:
     """
     title: 文件夹结构分析
@@ -207,6 +330,9 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
     """
 
     component_path = state.extracted_path
+    if not state.source_index_path and not source_exists(component_path):
+        return AnalyzeStructureOutput(folder_structure=f"❌ 组件路径不存在: {component_path}")
+    index = get_source_index(state.source_index_path, component_path)
 
     # 明确的第三方库/开源代码文件夹名称
     OPENSOURCE_FOLDER_NAMES = [
@@ -224,8 +350,8 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
     ]
 
     def is_opensource_folder(folder_path: str, folder_name: str) -> bool:
-        """检查是否为开源代码库文件夹"""
-        if not os.path.isdir(folder_path):
+        """检查是否为开源代码库文件夹（folder_path 为索引中的相对路径）"""
+        if not index.is_dir(folder_path):
             return False
 
         # 检查文件夹名称是否匹配已知的第三方库名称
@@ -233,15 +359,15 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
             return True
 
         # 检查是否存在.git文件夹（明确的版本控制标记）
-        git_folder = os.path.join(folder_path, '.git')
-        if os.path.exists(git_folder) and os.path.isdir(git_folder):
+        git_folder = f"{folder_path}/.git"
+        if index.is_dir(git_folder):
             return True
 
         # 检查是否存在 LICENSE 文件（仅当根目录有此文件时才认为是开源库）
         # 注意：README.md 很常见，不应该作为判断依据
         license_markers = ['LICENSE', 'LICENSE.txt', 'LICENSE.md', 'LICENSE.MIT',
                           'COPYING', 'COPYRIGHT']
-        items = os.listdir(folder_path)
+        items = index.listdir(folder_path)
         for marker in license_markers:
             if marker in items:
                 return True
@@ -292,23 +418,23 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
         return comments.get(folder_lower, '')
 
     def analyze_directory(path: str, prefix: str = "", is_last: bool = True) -> str:
-        """递归分析目录结构，生成树状结构"""
+        """递归分析目录结构，生成树状结构（path 为索引中的相对路径，根目录为空串）"""
         lines = []
 
         try:
-            items = sorted(os.listdir(path))
+            items = sorted(index.listdir(path))
 
             # 分离文件夹和文件
             dirs = []
             files = []
             for item in items:
-                full_path = os.path.join(path, item)
+                full_path = f"{path}/{item}" if path else item
 
                 # 跳过隐藏文件（.git, .gitignore 等除外，用于识别开源代码）
                 if item.startswith('.') and item not in ['.git', '.gitignore', '.gitmodules']:
                     continue
 
-                if os.path.isdir(full_path):
+                if index.is_dir(full_path):
                     dirs.append(item)
                 else:
                     files.append(item)
@@ -318,7 +444,7 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
             total = len(all_items)
 
             for idx, item in enumerate(all_items):
-                full_path = os.path.join(path, item)
+                full_path = f"{path}/{item}" if path else item
                 is_last_item = (idx == total - 1)
 
                 # 计算当前行的前缀和子项的前缀
@@ -329,7 +455,7 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
                     current_prefix = prefix + "├── "
                     child_prefix = prefix + "│   "
 
-                if os.path.isdir(full_path):
+                if index.is_dir(full_path):
                     # 检查是否为开源代码库
                     if is_opensource_folder(full_path, item):
                         comment = "# [第三方库，略过详细说明]"
@@ -381,22 +507,19 @@ def analyze_structure_node(state: AnalyzeStructureInput, config: RunnableConfig,
         return "\n".join(lines)
 
     # 开始分析
-    if os.path.exists(component_path):
-        # 获取根目录名称
-        root_name = os.path.basename(component_path.rstrip('/'))
-
-        result_lines = []
-        result_lines.append("## 目录结构")
-        result_lines.append("")
-        result_lines.append("```")
-        result_lines.append(f"{root_name}/")
-        result_lines.append(analyze_directory(component_path, "", False))
-        result_lines.append("```")
-        result_lines.append("")
-
-        folder_structure = "\n".join(result_lines)
-    else:
-        folder_structure = f"❌ 组件路径不存在: {component_path}"
+    # 获取根目录名称
+    root_name = os.path.basename(index.root.rstrip('/'))
+
+    result_lines = []
+    result_lines.append("## 目录结构")
+    result_lines.append("")
+    result_lines.append("```")
+    result_lines.append(f"{root_name}/")
+    result_lines.append(analyze_directory("", "", False))
+    result_lines.append("```")
+    result_lines.append("")
+
+    folder_structure = "\n".join(result_lines)
 
     return AnalyzeStructureOutput(folder_structure=folder_structure)
 
@@ -407,139 +530,211 @@ def extract_functions_node(state: ExtractFunctionsInput, config: RunnableConfig,
     desc: 提取include文件夹下.h内部的所有函数，结合头文件注释和大模型分析，详细说明函数功能、输入参数、返回值、调用示例
     integrations: 大语言模型
     """
+    plan = _plan_extract_functions(state, config)
+    header_functions = plan if isinstance(plan, str) else run_job(runtime.context, plan)
+    return ExtractFunctionsOutput(header_functions=header_functions)
+
+
+async def extract_functions_node_async(state: ExtractFunctionsInput, config: RunnableConfig, runtime: Runtime[Context]) -> ExtractFunctionsOutput:
+    """extract_functions_node 的异步版本：解析在线程中进行，大模型调用以协程并发"""
+    plan = await asyncio.to_thread(_plan_extract_functions, state, config)
+    header_functions = plan if isinstance(plan, str) else await arun_job(runtime.context, plan)
+    return ExtractFunctionsOutput(header_functions=header_functions)
+
 
+def _plan_extract_functions(state: ExtractFunctionsInput, config: RunnableConfig) -> Union[str, LLMJob]:
+    """准备头文件函数提取的大模型调用；无需调用大模型时直接返回结果文本"""
     component_path = state.extracted_path
-    component_name = state.component_name
-    ctx = runtime.context
+    index = get_source_index(state.source_index_path, component_path)
 
     # 查找 include 文件夹（支持多层嵌套）
-    include_path = None
-    for root, dirs, files in os.walk(component_path):
+    include_found = False
+    for root, dirs, files in index.walk():
         if 'include' in dirs:
-            include_path = os.path.join(root, 'include')
+            include_found = True
             break
 
-    if not include_path or not os.path.exists(include_path):
-        return ExtractFunctionsOutput(header_functions=f"❌ 未找到 include 文件夹于 {component_path}")
+    if not include_found:
+        return f"❌ 未找到 include 文件夹于 {component_path}"
 
-    # 收集所有头文件和源文件内容
-    header_content = []
-    source_content = []
+    # 读取配置文件
+    _cfg = load_llm_cfg(config)
+    analysis_cfg = _cfg.get("analysis", {})
+
+    # 静态解析头文件得到符号表，大模型只为给定的函数编写说明
+    if analysis_cfg.get("mode", "static") == "static" and _cfg.get("symbols_up"):
+        table = build_symbol_table(index)
+        functions = table.functions()
+        if functions:
+            logger.info(f"extract_functions: {len(functions)} functions parsed from headers")
+            return _describe_symbols_job(table, functions, _cfg)
+        logger.info("extract_functions: no function declarations parsed, falling back to raw code prompt")
+
+    return _extract_functions_raw_job(index, _cfg)
+
+
+def _render_symbol_batch(table: SymbolTable, batch: List[CSymbol], types: Dict[str, CSymbol]) -> str:
+    """将一批函数符号渲染为提示词：按头文件分组，附带文档注释、实现位置、调用示例和相关类型（types 为 table.types()）"""
+    sections = []
+    related = []
+    related_names = set()
+    current_file = None
+    for symbol in batch:
+        if symbol.file != current_file:
+            current_file = symbol.file
+            sections.append(f"\n// File: {symbol.file}")
+        lines = []
+        if symbol.doc:
+            lines.extend(f"// {doc_line}" for doc_line in symbol.doc.split('\n'))
+        lines.append(f"{symbol.signature};")
+        definition = table.definitions.get(symbol.name)
+        if definition is not None:
+            lines.append(f"// 实现位置: {definition.file}:{definition.line}")
+        example = table.call_examples.get(symbol.name)
+        if example is not None:
+            lines.append(f"// 调用示例 ({example[0]}:{example[1]}): {example[2]}")
+        sections.append('\n'.join(lines))
+        for type_symbol in referenced_types(symbol.signature, types):
+            if type_symbol.name not in related_names:
+                related_names.add(type_symbol.name)
+                related.append(type_symbol)
+
+    content = '\n\n'.join(sections)
+    if related:
+        content += "\n\n// 相关类型定义\n" + '\n'.join(f"{t.signature}  // {t.file}" for t in related)
+    return content
+
+
+def _symbol_batches(table: SymbolTable, functions: List[CSymbol], types: Dict[str, CSymbol],
+                    batch_size: int, budget: int) -> List[List[CSymbol]]:
+    """
+    按数量上限和 token 预算切分函数批次，单个函数超出预算时独占一批。
+    每个函数只单独渲染、计数一次并累加；单独渲染包含其文件标题和相关类型，批内共享时累加值略偏大，不会超出预算
+    """
+    batches = []
+    batch: List[CSymbol] = []
+    batch_tokens = 0
+    for symbol in functions:
+        tokens = count_tokens(_render_symbol_batch(table, [symbol], types))
+        if batch and (len(batch) + 1 > batch_size or batch_tokens + tokens > budget):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(symbol)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _reduce_options(_cfg: Dict, extra: Dict = None, default_max_tokens: int = 2000) -> Dict[str, Any]:
+    """reduce 阶段：analysis.reduce 为 llm 且配置了 reduce_up 时调用大模型合并，否则直接拼接"""
+    analysis_cfg = _cfg.get("analysis", {})
+    if analysis_cfg.get("reduce", REDUCE_CONCAT) != REDUCE_LLM or not _cfg.get("reduce_up"):
+        return {}
+    return {
+        "reduce_template": _cfg["reduce_up"],
+        "reduce_budget": input_token_budget(_cfg.get("config", {}), _cfg.get("sp", ""), _cfg["reduce_up"],
+                                            default_max_tokens=default_max_tokens),
+        "reduce_extra": extra or {},
+    }
+
+
+def _strip_repeated_titles(outputs: List[str]) -> List[str]:
+    """后续批次去掉重复的一级标题"""
+    result = []
+    for output in outputs:
+        if result:
+            output = re.sub(r'^\s*##\s*头文件函数详细说明\s*\n', '', output)
+        result.append(output.strip())
+    return result
+
+
+def _describe_symbols_job(table: SymbolTable, functions: List[CSymbol], _cfg: Dict) -> LLMJob:
+    """分批（并发）调用大模型为函数编写说明，并合并为一份文档"""
+    llm_config = _cfg.get("config", {})
+    sp = _cfg.get("sp", "")
+    up = _cfg["symbols_up"]
+    analysis_cfg = _cfg.get("analysis", {})
+    up_tpl = Template(up)
+    budget = input_token_budget(llm_config, sp, up, default_max_tokens=3000)
+    types = table.types()
+    batches = _symbol_batches(table, functions, types, int(analysis_cfg.get("symbol_batch_size", 30)), budget)
+    return LLMJob(
+        node_name="extract_functions",
+        llm_config=llm_config,
+        system_prompt=sp,
+        prompts=[up_tpl.render({"code_content": _render_symbol_batch(table, batch, types)})
+                 for batch in batches],
+        default_max_tokens=3000,
+        max_concurrency=int(analysis_cfg.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+        postprocess=_strip_repeated_titles,
+        **_reduce_options(_cfg, default_max_tokens=3000),
+    )
 
-    include_parent = os.path.dirname(include_path)
 
-    # 第三方库目录列表（跳过这些目录下的文件）
-    third_party_dirs = ['opencv', 'ffmpeg', 'protobuf', 'json', 'gtest', 'boost']
+def _extract_functions_raw_job(index: SourceIndex, _cfg: Dict) -> LLMJob:
+    """
+    未解析到函数声明时的兜底：按 token 预算装入源码原文交给大模型提取；
+    analysis.mode 为 map_reduce 时把源码切分为多个分片分别提取后合并，不丢弃超出预算的文件
+    """
+    llm_config = _cfg.get("config", {})
+    sp = _cfg.get("sp", "")
+    up = _cfg.get("up", "")
+    analysis_cfg = _cfg.get("analysis", {})
 
-    # 收集所有头文件和源文件内容
-    # 按优先级顺序收集：
+    # 按优先级顺序装入（优先级与第三方标记在构建索引时已计算）：
     # 1. 公共 API 头文件（根目录的 include/）
     # 2. 子模块 API 头文件（src/*/include/）
     # 3. 实现文件（所有 .c 和 .cpp 文件）
     # 4. 内部头文件（src/*/src/）
+    pack_priority = {1: 0, 2: 1, 3: 3}
 
-    public_api_headers = []
-    sub_module_api_headers = []
-    internal_headers = []
-    source_files = []
-
-    # 定义优先级检查函数
-    def get_file_priority(file_path, relative_path):
-        """返回文件的优先级：1=公共API，2=子模块API，3=实现文件，4=内部头文件"""
-        if relative_path.startswith('include/'):
-            return 1
-        elif '/include/' in relative_path and not any(tp in relative_path for tp in third_party_dirs):
-            return 2
-        elif file_path.endswith('.c') or file_path.endswith('.cpp'):
-            return 3
-        else:
-            return 4
-
-    # 按优先级排序收集文件
-    all_files = []
-    for root, dirs, files in os.walk(component_path):
-        # 检查是否在第三方库目录下
-        relative_root = os.path.relpath(root, component_path)
-        is_third_party = any(tp_dir in relative_root for tp_dir in third_party_dirs)
-
-        if is_third_party:
-            continue  # 跳过第三方库目录
-
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, component_path)
-
-            # 只处理 .h, .c, .cpp 文件
-            if not (file.endswith('.h') or file.endswith('.c') or file.endswith('.cpp')):
-                continue
-
-            priority = get_file_priority(file_path, relative_path)
-            all_files.append((priority, file_path, relative_path))
-
-    # 按优先级排序
-    all_files.sort(key=lambda x: x[0])
+    # 只处理 .h, .c, .cpp 文件，跳过第三方库目录
+    all_files = [
+        entry for entry in index.files(kinds=(KIND_HEADER, KIND_SOURCE), include_third_party=False)
+        if entry.path.endswith(('.h', '.c', '.cpp'))
+    ]
 
-    # 收集文件内容
-    for priority, file_path, relative_path in all_files:
+    items = []
+    for entry in all_files:
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-
-            if file_path.endswith('.h'):
-                if priority == 1:
-                    public_api_headers.append(f"\n// File: {relative_path}\n{content}\n")
-                elif priority == 2:
-                    sub_module_api_headers.append(f"\n// File: {relative_path}\n{content}\n")
-                else:
-                    internal_headers.append(f"\n// File: {relative_path}\n{content}\n")
-            else:
-                source_files.append(f"\n// File: {relative_path}\n{content}\n")
+            content = index.read_text(entry)
         except Exception as e:
-            pass
-
-    # 按优先级组合代码内容
-    all_code = "\n".join(
-        public_api_headers +
-        sub_module_api_headers +
-        source_files +
-        internal_headers
-    )
+            continue
+        priority = pack_priority.get(entry.priority, 3) if entry.path.endswith('.h') else 2
+        items.append(PackItem(key=entry.path, text=content, priority=priority, header=f"\n// File: {entry.path}"))
 
-    # 读取配置文件
-    cfg_file = os.path.join(os.getenv("COZE_WORKSPACE_PATH"), config['metadata']['llm_cfg'])
-    with open(cfg_file, 'r') as fd:
-        _cfg = json.load(fd)
-
-    llm_config = _cfg.get("config", {})
-    sp = _cfg.get("sp", "")
-    up = _cfg.get("up", "")
-
-    # 使用jinja2模板渲染用户提示词（增加到30000字符）
+    budget = input_token_budget(llm_config, sp, up, default_max_tokens=3000)
     up_tpl = Template(up)
-    user_prompt = up_tpl.render({"code_content": all_code[:30000]})
-
-    # 调用大模型
-    from coze_coding_dev_sdk import LLMClient
-    from langchain_core.messages import SystemMessage, HumanMessage
 
-    client = LLMClient(ctx=ctx)
-    messages = [
-        SystemMessage(content=sp),
-        HumanMessage(content=user_prompt)
-    ]
+    if analysis_cfg.get("mode") == "map_reduce":
+        shards = shard_items(items, budget)
+        logger.info(f"extract_functions map-reduce: {len(items)} files in {len(shards)} shards")
+        return LLMJob(
+            node_name="extract_functions",
+            llm_config=llm_config,
+            system_prompt=sp,
+            prompts=[up_tpl.render({"code_content": render_shard(shard, budget)}) for shard in shards],
+            default_max_tokens=3000,
+            max_concurrency=int(analysis_cfg.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+            **_reduce_options(_cfg, default_max_tokens=3000),
+        )
 
-    response = client.invoke(
-        messages=messages,
-        model=llm_config.get("model", "doubao-seed-1-6-251015"),
-        temperature=llm_config.get("temperature", 0.3),
-        top_p=llm_config.get("top_p", 0.7),
-        max_tokens=llm_config.get("max_tokens", 3000),
-        frequency_penalty=llm_config.get("frequency_penalty", 0)
+    packed = pack_items(items, budget)
+    logger.info(f"extract_functions prompt packed: {packed.report()}")
+    user_prompt = up_tpl.render({"code_content": packed.text})
+
+    # 单次调用大模型
+    return LLMJob(
+        node_name="extract_functions",
+        llm_config=llm_config,
+        system_prompt=sp,
+        prompts=[user_prompt],
+        default_max_tokens=3000,
+        sharded=False,
     )
 
-    header_functions = response.content
-    return ExtractFunctionsOutput(header_functions=header_functions)
-
 
 def analyze_call_relation_node(state: AnalyzeCallRelationInput, config: RunnableConfig, runtime: Runtime[Context]) -> AnalyzeCallRelationOutput:
     """
@@ -547,150 +742,225 @@ def analyze_call_relation_node(state: AnalyzeCallRelationInput, config: Runnable
     desc: 分析代码中函数调用的层级关系，输出组件的处理流程
     integrations: 大语言模型
     """
+    job, call_graph_path = _plan_analyze_call_relation(state, config)
+    return AnalyzeCallRelationOutput(call_relationship=run_job(runtime.context, job), call_graph_path=call_graph_path)
 
-    from coze_coding_dev_sdk import LLMClient
-    from langchain_core.messages import SystemMessage, HumanMessage
 
+async def analyze_call_relation_node_async(state: AnalyzeCallRelationInput, config: RunnableConfig, runtime: Runtime[Context]) -> AnalyzeCallRelationOutput:
+    """analyze_call_relation_node 的异步版本：调用图在线程中构建，大模型调用以协程并发"""
+    job, call_graph_path = await asyncio.to_thread(_plan_analyze_call_relation, state, config)
+    return AnalyzeCallRelationOutput(call_relationship=await arun_job(runtime.context, job),
+                                     call_graph_path=call_graph_path)
+
+
+def _plan_analyze_call_relation(state: AnalyzeCallRelationInput, config: RunnableConfig) -> Tuple[LLMJob, str]:
+    """准备调用关系分析的大模型调用，返回 (LLMJob, 调用图文件路径)"""
     component_path = state.extracted_path
-    ctx = runtime.context
 
     # 读取配置文件
-    cfg_file = os.path.join(os.getenv("COZE_WORKSPACE_PATH"), config['metadata']['llm_cfg'])
-    with open(cfg_file, 'r') as fd:
-        _cfg = json.load(fd)
-
+    _cfg = load_llm_cfg(config)
+    analysis_cfg = _cfg.get("analysis", {})
+    index = get_source_index(state.source_index_path, component_path)
+
+    # 静态构建调用图，大模型只负责总结预先计算好的调用关系
+    if analysis_cfg.get("mode", "static") == "static" and _cfg.get("graph_up"):
+        call_graph = build_call_graph(index)
+        if call_graph.functions:
+            call_graph_path = write_call_graph(call_graph, state.work_dir)
+            return _summarize_call_graph_job(call_graph, _cfg), call_graph_path
+        logger.info("analyze_call_relation: no function definitions parsed, falling back to raw code prompt")
+
+    return _analyze_call_relation_raw_job(index, _cfg), ""
+
+
+def _call_graph_shards(call_graph: CallGraph, budget: int) -> List[str]:
+    """按模块把调用邻接表切分为不超过预算的分片，单个模块超出预算时按函数拆分"""
+    blocks = []
+    for module, text in render_module_sections(call_graph):
+        if count_tokens(text) <= budget:
+            blocks.append(text)
+            continue
+        title, _, body = text.partition('\n')
+        chunk = title
+        for func_block in re.split(r'(?m)^(?=- )', body):
+            if not func_block.strip():
+                continue
+            if chunk != title and count_tokens(chunk) + count_tokens(func_block) > budget:
+                blocks.append(chunk)
+                chunk = f"{title}（续）"
+            chunk += '\n' + func_block.rstrip('\n')
+        blocks.append(chunk)
+
+    shards = []
+    current = []
+    used = 0
+    for block in blocks:
+        tokens = count_tokens(block)
+        if current and used + tokens > budget:
+            shards.append('\n\n'.join(current))
+            current, used = [], 0
+        current.append(block)
+        used += tokens
+    if current:
+        shards.append('\n\n'.join(current))
+    return shards
+
+
+def _summarize_call_graph_job(call_graph: CallGraph, _cfg: Dict) -> LLMJob:
+    """调用图放得进单次上下文时一次总结；否则按模块分片并发总结，再合并（map-reduce）"""
     llm_config = _cfg.get("config", {})
     sp = _cfg.get("sp", "")
-    up = _cfg.get("up", "")
+    analysis_cfg = _cfg.get("analysis", {})
+    up_tpl = Template(_cfg["graph_up"])
+    budget = input_token_budget(llm_config, sp, _cfg["graph_up"], default_max_tokens=2000)
+
+    graph_text = render_call_graph(call_graph)
+    graph_tokens = count_tokens(graph_text)
+    logger.info(f"analyze_call_relation: {len(call_graph.functions)} functions, "
+                f"{sum(len(v) for v in call_graph.edges.values())} edges, prompt {graph_tokens} tokens")
+    if graph_tokens <= budget:
+        return LLMJob(
+            node_name="analyze_call_relation",
+            llm_config=llm_config,
+            system_prompt=sp,
+            prompts=[up_tpl.render({"call_graph": graph_text})],
+            default_max_tokens=2000,
+            sharded=False,
+        )
 
-    # 收集所有代码文件内容，优先收集media_stream和object_detector相关代码
-    code_content = []
+    # 每个分片都带上概览（入口函数、线程入口）和跨模块调用，邻接表按模块切分
+    overview = render_overview(call_graph) + '\n\n' + render_cross_module(call_graph)
+    shards = _call_graph_shards(call_graph, max(budget - count_tokens(overview), budget // 4))
+    logger.info(f"analyze_call_relation map-reduce: call graph {graph_tokens} tokens > budget {budget}, "
+                f"{len(shards)} shards")
+    return LLMJob(
+        node_name="analyze_call_relation",
+        llm_config=llm_config,
+        system_prompt=sp,
+        prompts=[up_tpl.render({"call_graph": f"{overview}\n\n{ADJACENCY_TITLE}\n\n{shard}"}) for shard in shards],
+        default_max_tokens=2000,
+        max_concurrency=int(analysis_cfg.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+        **_reduce_options(_cfg, extra={"overview": overview}),
+    )
 
-    # 定义优先级文件夹（这些文件夹的代码优先收集，且不限制长度）
-    priority_folders = ['media_stream', 'object_detector', 'vision', 'audio']
 
-    # 第一阶段：优先收集media_stream和object_detector的完整代码
-    for root, dirs, files in os.walk(component_path):
-        for file in files:
-            if file.endswith('.c') or file.endswith('.h'):
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, component_path)
-
-                # 检查是否在优先级文件夹中
-                is_priority = False
-                for priority_folder in priority_folders:
-                    if f'/{priority_folder}/' in f'/{relative_path}' or relative_path.startswith(f'{priority_folder}/'):
-                        is_priority = True
-                        break
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-
-                    if is_priority:
-                        # 优先文件夹：收集完整代码
-                        code_content.append(f"\n// File: {relative_path}\n{content}\n")
-                except Exception as e:
-                    code_content.append(f"\n// Error reading {file_path}: {str(e)}\n")
-
-    # 第二阶段：收集其他文件夹的代码（限制长度）
-    for root, dirs, files in os.walk(component_path):
-        for file in files:
-            if file.endswith('.c') or file.endswith('.h'):
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, component_path)
-
-                # 检查是否在优先级文件夹中
-                is_priority = False
-                for priority_folder in priority_folders:
-                    if f'/{priority_folder}/' in f'/{relative_path}' or relative_path.startswith(f'{priority_folder}/'):
-                        is_priority = True
-                        break
-
-                # 如果不是优先文件夹，才收集（限制长度）
-                if not is_priority:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            code_content.append(f"\n// File: {relative_path}\n{content[:8000]}\n")
-                    except Exception as e:
-                        code_content.append(f"\n// Error reading {file_path}: {str(e)}\n")
-
-    all_code = "\n".join(code_content)
+def _analyze_call_relation_raw_job(index: SourceIndex, _cfg: Dict) -> LLMJob:
+    """
+    未解析到函数定义时的兜底：按 token 预算装入源码原文交给大模型推断调用关系；
+    analysis.mode 为 map_reduce 时把源码切分为多个分片分别分析后合并
+    """
+    llm_config = _cfg.get("config", {})
+    sp = _cfg.get("sp", "")
+    up = _cfg.get("up", "")
+    analysis_cfg = _cfg.get("analysis", {})
+    code_files = [entry for entry in index.files() if entry.path.endswith(('.c', '.h'))]
 
-    # 使用jinja2模板渲染提示词
+    # 优先级文件夹（media_stream、object_detector 等）的代码优先装入，其余文件在剩余预算内按声明装入
+    priority_folders = ['media_stream', 'object_detector', 'vision', 'audio']
+    items = []
+    for entry in code_files:
+        try:
+            content = index.read_text(entry)
+        except Exception as e:
+            content = f"// Error reading {entry.path}: {str(e)}"
+        items.append(PackItem(
+            key=entry.path,
+            text=content,
+            priority=0 if in_folders(entry.path, priority_folders) else 1,
+            header=f"\n// File: {entry.path}",
+        ))
+
+    budget = input_token_budget(llm_config, sp, up, default_max_tokens=2000)
     up_tpl = Template(up)
-    user_prompt_content = up_tpl.render({"code_content": all_code[:80000]})
 
-    # 调用大模型分析函数调用关系
-    from coze_coding_dev_sdk import LLMClient
-    from langchain_core.messages import SystemMessage, HumanMessage
+    if analysis_cfg.get("mode") == "map_reduce":
+        shards = shard_items(items, budget)
+        logger.info(f"analyze_call_relation map-reduce: {len(items)} files in {len(shards)} shards")
+        return LLMJob(
+            node_name="analyze_call_relation",
+            llm_config=llm_config,
+            system_prompt=sp,
+            prompts=[up_tpl.render({"code_content": render_shard(shard, budget)}) for shard in shards],
+            default_max_tokens=2000,
+            max_concurrency=int(analysis_cfg.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+            **_reduce_options(_cfg, extra={"overview": ""}),
+        )
 
-    client = LLMClient(ctx=ctx)
-    messages = [
-        SystemMessage(content=sp),
-        HumanMessage(content=user_prompt_content)
-    ]
+    packed = pack_items(items, budget)
+    logger.info(f"analyze_call_relation prompt packed: {packed.report()}")
 
-    response = client.invoke(
-        messages=messages,
-        model=llm_config.get("model", "doubao-seed-1-6-251015"),
-        temperature=llm_config.get("temperature", 0.3),
-        top_p=llm_config.get("top_p", 0.7),
-        max_tokens=llm_config.get("max_tokens", 2000),
-        frequency_penalty=llm_config.get("frequency_penalty", 0)
+    # 使用jinja2模板渲染提示词
+    user_prompt_content = up_tpl.render({"code_content": packed.text})
+
+    # 单次调用大模型分析函数调用关系
+    return LLMJob(
+        node_name="analyze_call_relation",
+        llm_config=llm_config,
+        system_prompt=sp,
+        prompts=[user_prompt_content],
+        default_max_tokens=2000,
+        sharded=False,
     )
 
-    call_relationship = response.content
-
-    return AnalyzeCallRelationOutput(call_relationship=call_relationship)
-
 
 def generate_flowchart_node(state: GenerateFlowchartInput, config: RunnableConfig, runtime: Runtime[Context]) -> GenerateFlowchartOutput:
     """
     title: 流程图生成
-    desc: 根据函数调用关系生成清晰的流程图（Mermaid格式），可拆分为多个小流程图
+    desc: 根据静态调用图或函数调用关系生成清晰的流程图（Mermaid格式），可拆分为多个小流程图
     integrations: 大语言模型
     """
+    plan = _plan_generate_flowchart(state, config)
+    flow_diagrams = plan if isinstance(plan, str) else run_job(runtime.context, plan)
+    return GenerateFlowchartOutput(flow_diagrams=flow_diagrams)
 
-    from coze_coding_dev_sdk import LLMClient
-    from langchain_core.messages import SystemMessage, HumanMessage
 
-    ctx = runtime.context
+async def generate_flowchart_node_async(state: GenerateFlowchartInput, config: RunnableConfig, runtime: Runtime[Context]) -> GenerateFlowchartOutput:
+    """generate_flowchart_node 的异步版本"""
+    plan = await asyncio.to_thread(_plan_generate_flowchart, state, config)
+    flow_diagrams = plan if isinstance(plan, str) else await arun_job(runtime.context, plan)
+    return GenerateFlowchartOutput(flow_diagrams=flow_diagrams)
 
-    # 读取配置文件
-    cfg_file = os.path.join(os.getenv("COZE_WORKSPACE_PATH"), config['metadata']['llm_cfg'])
-    with open(cfg_file, 'r') as fd:
-        _cfg = json.load(fd)
 
+def _plan_generate_flowchart(state: GenerateFlowchartInput, config: RunnableConfig) -> Union[str, LLMJob]:
+    """准备流程图生成的大模型调用；static 模式直接返回静态渲染的流程图"""
+    # 读取配置文件
+    _cfg = load_llm_cfg(config)
     llm_config = _cfg.get("config", {})
     sp = _cfg.get("sp", "")
     up = _cfg.get("up", "")
-
-    # 使用jinja2模板渲染提示词
-    up_tpl = Template(up)
-    user_prompt_content = up_tpl.render({"call_relationship": state.call_relationship})
+    analysis_cfg = _cfg.get("analysis", {})
+
+    # 生成方式：static 直接由调用图渲染；static_then_llm 以静态流程图为底稿交给大模型完善；llm 由大模型根据调用关系生成
+    mode = analysis_cfg.get("mode", "static")
+    if mode in ("static", "static_then_llm") and state.call_graph_path and os.path.exists(state.call_graph_path):
+        call_graph = load_call_graph(state.call_graph_path)
+        static_flowcharts = render_flowcharts(call_graph, int(analysis_cfg.get("node_budget", DEFAULT_NODE_BUDGET)))
+        if static_flowcharts:
+            if mode == "static":
+                return static_flowcharts
+            up_tpl = Template(_cfg.get("refine_up", up))
+            user_prompt_content = up_tpl.render({
+                "call_relationship": state.call_relationship,
+                "static_flowcharts": static_flowcharts,
+            })
+        else:
+            up_tpl = Template(up)
+            user_prompt_content = up_tpl.render({"call_relationship": state.call_relationship})
+    else:
+        # 使用jinja2模板渲染提示词
+        up_tpl = Template(up)
+        user_prompt_content = up_tpl.render({"call_relationship": state.call_relationship})
 
     # 调用大模型生成流程图
-    client = LLMClient(ctx=ctx)
-    messages = [
-        SystemMessage(content=sp),
-        HumanMessage(content=user_prompt_content)
-    ]
-
-    response = client.invoke(
-        messages=messages,
-        model=llm_config.get("model", "doubao-seed-1-6-251015"),
-        temperature=llm_config.get("temperature", 0.3),
-        top_p=llm_config.get("top_p", 0.7),
-        max_tokens=llm_config.get("max_tokens", 2000),
-        frequency_penalty=llm_config.get("frequency_penalty", 0)
+    return LLMJob(
+        node_name="generate_flowchart",
+        llm_config=llm_config,
+        system_prompt=sp,
+        prompts=[user_prompt_content],
+        default_max_tokens=2000,
+        sharded=False,
     )
 
-    flow_diagrams = response.content
-
-    return GenerateFlowchartOutput(flow_diagrams=flow_diagrams)
-
 
 def generate_readme_node(state: GenerateReadmeInput, config: RunnableConfig, runtime: Runtime[Context]) -> GenerateReadmeOutput:
     """
@@ -5,30 +5,50 @@ from utils.file.file import File
 # 全局状态定义
 class GlobalState(BaseModel):
     """全局状态定义"""
-    component_path: str = Field(default="", description="组件文件夹路径或zip文件路径")
+    component_path: str = Field(default="", description="组件文件夹路径、zip文件路径或对象存储前缀（s3://bucket/prefix）")
     component_name: str = Field(default="", description="组件名称（文件夹名称）")
     zip_file_path: str = Field(default="", description="zip文件路径（可能是URL或本地路径）")
+    archive_digest: str = Field(default="", description="组件压缩包或目录的内容哈希")
+    cached_readme_location: str = Field(default="", description="命中运行结果缓存时已有README的存放位置")
     extracted_path: str = Field(default="", description="解压后的组件文件夹路径")
+    archive_path: str = Field(default="", description="选择性解压时的源压缩包路径或对象存储前缀（s3://bucket/prefix），目录树从中读取")
+    archive_in_place: bool = Field(default=False, description="是否不解压、分析时直接从压缩包读取文件内容")
+    work_dir: str = Field(default="", description="本次运行的工作目录（下载的压缩包、解压结果等临时文件），保存README后删除")
+    source_index_path: str = Field(default="", description="源码索引文件路径（索引句柄，不内联索引内容）")
     folder_structure: str = Field(default="", description="文件夹结构分析结果")
     header_functions: str = Field(default="", description="头文件函数信息")
     call_relationship: str = Field(default="", description="函数调用关系分析结果")
+    call_graph_path: str = Field(default="", description="静态调用图文件路径（调用图句柄，不内联调用图内容）")
     flow_diagrams: str = Field(default="", description="流程图数据")
     readme_content: str = Field(default="", description="生成的README内容")
 
 # 工作流输入
 class GraphInput(BaseModel):
     """工作流输入"""
-    component_path: str = Field(..., description="组件文件夹路径或zip文件路径")
+    component_path: str = Field(..., description="组件文件夹路径、zip文件路径或对象存储前缀（s3://bucket/prefix）")
 
 # 工作流输出
 class GraphOutput(BaseModel):
     """工作流输出"""
     readme_url: str = Field(..., description="生成的README.html文件URL或路径")
 
+# 源码索引节点输入输出
+class BuildSourceIndexInput(BaseModel):
+    """源码索引构建输入"""
+    extracted_path: str = Field(..., description="解压后的组件文件夹路径")
+    archive_path: str = Field(default="", description="源压缩包路径或对象存储前缀（非空时从中构建索引）")
+    archive_in_place: bool = Field(default=False, description="是否直接从压缩包读取文件内容")
+    work_dir: str = Field(default="", description="本次运行的工作目录，其中下载的压缩包在选择性解压建完索引后删除")
+
+class BuildSourceIndexOutput(BaseModel):
+    """源码索引构建输出"""
+    source_index_path: str = Field(..., description="源码索引文件路径")
+
 # 文件夹结构分析节点输入输出
 class AnalyzeStructureInput(BaseModel):
     """文件夹结构分析输入"""
     extracted_path: str = Field(..., description="解压后的组件文件夹路径")
+    source_index_path: str = Field(default="", description="源码索引文件路径")
 
 class AnalyzeStructureOutput(BaseModel):
     """文件夹结构分析输出"""
@@ -38,6 +58,7 @@ class AnalyzeStructureOutput(BaseModel):
 class ExtractFunctionsInput(BaseModel):
     """头文件函数提取输入"""
     extracted_path: str = Field(..., description="解压后的组件文件夹路径")
+    source_index_path: str = Field(default="", description="源码索引文件路径")
     component_name: str = Field(default="", description="组件名称")
 
 class ExtractFunctionsOutput(BaseModel):
@@ -48,15 +69,19 @@ class ExtractFunctionsOutput(BaseModel):
 class AnalyzeCallRelationInput(BaseModel):
     """函数调用关系分析输入"""
     extracted_path: str = Field(..., description="解压后的组件文件夹路径")
+    source_index_path: str = Field(default="", description="源码索引文件路径")
+    work_dir: str = Field(default="", description="本次运行的工作目录，静态调用图写入其中")
 
 class AnalyzeCallRelationOutput(BaseModel):
     """函数调用关系分析输出"""
     call_relationship: str = Field(..., description="函数调用关系分析结果")
+    call_graph_path: str = Field(default="", description="静态调用图文件路径，未构建调用图时为空")
 
 # 流程图生成节点输入输出
 class GenerateFlowchartInput(BaseModel):
     """流程图生成输入"""
     call_relationship: str = Field(..., description="函数调用关系")
+    call_graph_path: str = Field(default="", description="静态调用图文件路径，为空时由大模型生成流程图")
 
 class GenerateFlowchartOutput(BaseModel):
     """流程图生成输出"""
@@ -78,7 +103,10 @@ class GenerateReadmeOutput(BaseModel):
 # README保存节点输入输出
 class SaveReadmeInput(BaseModel):
     """README保存输入"""
-    readme_content: str = Field(..., description="生成的README内容")
+    readme_content: str = Field(default="", description="生成的README内容")
+    archive_digest: str = Field(default="", description="组件内容哈希，用于记录运行结果缓存")
+    cached_readme_location: str = Field(default="", description="命中缓存时已有README的存放位置")
+    work_dir: str = Field(default="", description="本次运行的工作目录，保存完成后删除")
 
 class SaveReadmeOutput(BaseModel):
     """README保存输出"""
@@ -88,17 +116,24 @@ class SaveReadmeOutput(BaseModel):
 class UnzipInput(BaseModel):
     """解压缩输入"""
     zip_file_path: str = Field(..., description="zip文件路径（URL或本地路径）")
+    archive_digest: str = Field(default="", description="组件内容哈希（上游已计算时直接复用）")
 
 class UnzipOutput(BaseModel):
     """解压缩输出"""
-    extracted_path: str = Field(..., description="解压后的组件文件夹路径")
-    component_name: str = Field(..., description="组件名称（文件夹名称）")
+    extracted_path: str = Field(default="", description="解压后的组件文件夹路径（命中缓存时为空）")
+    component_name: str = Field(default="", description="组件名称（文件夹名称）")
+    archive_path: str = Field(default="", description="选择性解压时的源压缩包路径或对象存储前缀")
+    archive_in_place: bool = Field(default=False, description="是否不解压、直接从压缩包或对象存储读取文件内容")
+    archive_digest: str = Field(default="", description="组件内容哈希")
+    cached_readme_location: str = Field(default="", description="命中运行结果缓存时已有README的存放位置")
+    work_dir: str = Field(default="", description="本次运行的工作目录（命中缓存时为空）")
 
 # 本地文件上传节点输入输出
 class UploadLocalFileInput(BaseModel):
     """本地文件上传输入"""
-    component_path: str = Field(..., description="组件文件夹路径或本地文件路径")
+    component_path: str = Field(..., description="组件文件夹路径、本地文件路径或对象存储前缀")
 
 class UploadLocalFileOutput(BaseModel):
     """本地文件上传输出"""
     zip_file_path: str = Field(..., description="zip文件路径（可能是上传后的URL或本地路径）")
+    archive_digest: str = Field(default="", description="本地文件或目录的内容哈希（URL输入时为空）")
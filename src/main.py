@@ -1,19 +1,24 @@
 import argparse
 import asyncio
 import json
+import os
 import traceback
 import logging
-from typing import Any, Dict, Iterable, AsyncIterable, AsyncGenerator, Optional
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, AsyncIterable, AsyncGenerator, List, Optional
 import threading
 import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import cozeloop
 import uvicorn
 import time
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
+from langgraph.utils.runnable import RunnableCallable
 
 from coze_coding_utils.runtime_ctx.context import new_context, Context
 from utils.helper import graph_helper
@@ -26,6 +31,34 @@ from utils.messages.server import (
     MESSAGE_END_CODE_CANCELED,
 )
 from utils.error import ErrorClassifier, classify_error
+from storage.cache.llm_cache import get_llm_cache
+from utils.llm.map_reduce import get_shard_stats
+from utils.llm.governor import get_llm_governor
+from storage.s3.s3_storage import storage_stats
+from utils.helper.admission import AdmissionRejected, Permit, get_admission_controller
+from utils.file.workspace import remove_run_workspace
+from utils.helper.workers import set_worker_count, worker_count
+from storage.registry.run_registry import (
+    RUN_REGISTRY_CANCEL_WAIT_SECONDS,
+    RUN_REGISTRY_POLL_SECONDS,
+    RUN_STATUS_CANCELLED,
+    RUN_STATUS_COMPLETED,
+    RUN_STATUS_FAILED,
+    RUN_STATUS_LOST,
+    RUN_STATUS_RUNNING,
+    RUN_STATUS_TIMEOUT,
+    RunRegistry,
+    current_worker_id,
+    get_run_registry,
+)
+from storage.registry.job_queue import (
+    JOB_STATUS_CANCELLED,
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_QUEUED,
+    JobQueue,
+    JobRecord,
+    JobWorkerPool,
+)
 
 setup_logging(
     log_file=LOG_FILE,
@@ -41,6 +74,7 @@ from utils.helper.agent_helper import (
     to_stream_input,
     to_client_message,
     agent_iter_server_messages,
+    agent_aiter_server_messages,
 )
 from utils.log.parser import LangGraphParser
 from utils.log.err_trace import extract_core_stack
@@ -49,6 +83,15 @@ from utils.log.loop_trace import init_run_config, init_agent_config
 
 # 超时配置常量
 TIMEOUT_SECONDS = 900  # 15分钟
+# HTTP 服务的 worker 进程数，auto 表示按 CPU 核数。
+# 大模型调用调度与准入控制的额度是整个服务的总额度，多个 worker 时按 worker 数均分（见 utils.helper.workers）
+HTTP_WORKERS = os.getenv("HTTP_WORKERS", "1")
+# 流式运行直接驱动 graph.astream；设为 false 时回退为在线程池中执行同步的 graph.stream
+STREAM_NATIVE_ASYNC = os.getenv("STREAM_NATIVE_ASYNC", "true").lower() not in ("0", "false", "no")
+# 线程回退模式下生产者线程池大小（每个 worker 进程共享），超出的流排队等待线程
+STREAM_PRODUCER_THREADS = int(os.getenv("STREAM_PRODUCER_THREADS", "16"))
+# 每个流最多缓冲的消息数，客户端读取跟不上时生产者暂停
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
 
 class GraphService:
     def __init__(self):
@@ -57,6 +100,16 @@ class GraphService:
 
         # 用于跟踪正在运行的任务（使用asyncio.Task）
         self.running_tasks: Dict[str, asyncio.Task] = {}
+        # 跨 worker 的运行登记表，HTTP 服务启动时挂载；为空时只能取消本 worker 的运行
+        self.run_registry: Optional[RunRegistry] = None
+        self._registry_watcher: Optional[asyncio.Task] = None
+        # 持久化任务队列与本 worker 的任务执行池，依赖运行登记表，HTTP 服务启动时挂载
+        self.job_queue: Optional[JobQueue] = None
+        self.job_pool: Optional[JobWorkerPool] = None
+        # 流式运行的生产者线程池，首次流式请求时创建
+        self._stream_executor: Optional[ThreadPoolExecutor] = None
+        self._stream_lock = threading.Lock()
+        self._stream_counts = {"native_started": 0, "pending": 0, "active": 0, "stopped_early": 0}
         # 错误分类器
         self.error_classifier = ErrorClassifier()
 
@@ -68,6 +121,13 @@ class GraphService:
             return self.graph
     
     
+    @staticmethod
+    def _stream_input(payload: Dict[str, Any], client_msg) -> Dict[str, Any]:
+        # 智能体的输入是消息列表；工作流直接以请求体作为图的入参（与 /run 一致），节点中的大模型输出按节点流式返回
+        if graph_helper.is_agent_proj():
+            return to_stream_input(client_msg)
+        return payload
+
     @staticmethod
     def _sse_event(data: Any) -> str:
         return f"event: message\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
@@ -77,7 +137,7 @@ class GraphService:
         client_msg, session_id = to_client_message(payload)
         run_config["recursion_limit"] = 100
         run_config["configurable"] = {"thread_id": session_id}
-        stream_input = to_stream_input(client_msg)
+        stream_input = self._stream_input(payload, client_msg)
         t0 = time.time()
         try:
             items = self._get_graph(ctx).stream(stream_input, stream_mode="messages", config=run_config, context=ctx)
@@ -121,12 +181,13 @@ class GraphService:
             yield error_msg
 
     # 同步运行：本地/HTTP 通用
-    async def run(self, payload: Dict[str, Any], ctx=None) -> Dict[str, Any]:
+    async def run(self, payload: Dict[str, Any], ctx=None, timeout: Optional[float] = None) -> Dict[str, Any]:
         if ctx is None:
             ctx = new_context("run")
 
         run_id = ctx.run_id
         logger.info(f"Starting run with run_id: {run_id}")
+        status = RUN_STATUS_FAILED
 
         try:
             graph = self._get_graph(ctx)
@@ -136,10 +197,24 @@ class GraphService:
 
             # 直接调用，LangGraph会在当前任务上下文中执行
             # 如果当前任务被取消，LangGraph的执行也会被取消
-            return await graph.ainvoke(payload, config=run_config, context=ctx)
+            # 超时在本任务内计时，与外部取消区分开，登记为 timeout
+            deadline = asyncio.timeout(timeout)
+            try:
+                async with deadline:
+                    result = await graph.ainvoke(payload, config=run_config, context=ctx)
+            except TimeoutError:
+                # 节点内部抛出的 TimeoutError 按普通错误处理
+                if not deadline.expired():
+                    raise
+                logger.error(f"Run execution timeout after {timeout}s for run_id: {run_id}")
+                status = RUN_STATUS_TIMEOUT
+                return {"status": "timeout", "run_id": run_id, "message": f"Execution timeout: exceeded {timeout} seconds"}
+            status = RUN_STATUS_COMPLETED
+            return result
 
         except asyncio.CancelledError:
             logger.info(f"Run {run_id} was cancelled")
+            status = RUN_STATUS_CANCELLED
             return {"status": "cancelled", "run_id": run_id, "message": "Execution was cancelled"}
         except Exception as e:
             # 使用错误分类器分类错误
@@ -154,7 +229,7 @@ class GraphService:
             raise
         finally:
             # 清理任务记录
-            self.running_tasks.pop(run_id, None)
+            self.track_finish(run_id, status)
 
     # 流式运行（SSE 格式化）：HTTP 路由使用
     async def stream_sse(self, payload: Dict[str, Any], ctx=None) -> AsyncGenerator[str, None]:
@@ -169,21 +244,170 @@ class GraphService:
         else:
             run_config = init_run_config(graph, ctx)  # vibeflow
 
+        # 客户端断开或被取消时不会走到循环之后
+        status = RUN_STATUS_CANCELLED
         try:
             async for chunk in self.astream(payload, graph, run_config=run_config, ctx=ctx):
                 yield self._sse_event(chunk)
+            status = RUN_STATUS_COMPLETED
+        except Exception:
+            status = RUN_STATUS_FAILED
+            raise
         finally:
             # 清理任务记录
-            self.running_tasks.pop(run_id, None)
+            self.track_finish(run_id, status)
+            cozeloop.flush()
+
+    # 队列任务：与 run 相同地执行图，按节点完成情况上报进度
+    async def run_job(self, job: JobRecord, report_progress: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        ctx = new_context(method="job")
+        # 任务以 job_id 作为 run_id 登记，/cancel/{job_id} 可从任一 worker 取消
+        ctx.run_id = job.job_id
+        request_context.set(ctx)
+        self.track_start(job.job_id, asyncio.current_task(), "job")
+        status = RUN_STATUS_FAILED
+        try:
+            graph = self._get_graph(ctx)
+            run_config = init_run_config(graph, ctx)
+            run_config["configurable"] = {"thread_id": job.job_id}
+            nodes = [name for name in graph.nodes if not name.startswith("__")]
+            completed: List[str] = []
+            result: Dict[str, Any] = {}
+            # 与 ainvoke 相同，按出参字段取最后一次的状态作为结果
+            async for mode, chunk in graph.astream(job.payload, config=run_config, context=ctx,
+                                                   stream_mode=["updates", "values"],
+                                                   output_keys=graph.output_channels):
+                if mode == "values":
+                    result = chunk
+                    continue
+                for node in chunk:
+                    if not node.startswith("__") and node not in completed:
+                        completed.append(node)
+                report_progress({
+                    "nodes_total": len(nodes),
+                    "nodes_completed": len(completed),
+                    "completed": list(completed),
+                    "last_node": completed[-1] if completed else "",
+                })
+            status = RUN_STATUS_COMPLETED
+            return result
+        except asyncio.CancelledError:
+            status = RUN_STATUS_CANCELLED
+            raise
+        finally:
+            self.track_finish(job.job_id, status)
             cozeloop.flush()
 
+    async def start_job_pool(self) -> None:
+        """挂载持久化任务队列并启动本 worker 的任务执行池（需要运行登记表）"""
+        if self.run_registry is None or self.job_pool is not None:
+            return
+        queue = JobQueue(self.run_registry)
+        try:
+            await queue.call(queue.setup)
+        except Exception as e:
+            logger.warning(f"Job queue unavailable: {e}")
+            return
+        self.job_queue = queue
+        self.job_pool = JobWorkerPool(queue, self.run_job)
+        self.job_pool.start()
+
+    async def stop_job_pool(self) -> None:
+        if self.job_pool is not None:
+            await self.job_pool.stop()
+            self.job_pool = None
+
+    # 运行登记：本 worker 的任务句柄保存在 running_tasks，跨 worker 的状态写入登记表
+    def _registry_submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """登记表写入在其专用线程中按顺序执行，不等待结果"""
+        def log_error(future):
+            if future.exception() is not None:
+                logger.warning(f"Run registry update failed: {future.exception()}")
+        self.run_registry.submit(fn, *args, **kwargs).add_done_callback(log_error)
+
+    def track_start(self, run_id: str, task: asyncio.Task, method: str) -> None:
+        self.running_tasks[run_id] = task
+        if self.run_registry is not None:
+            self._registry_submit(self.run_registry.register, run_id, method=method)
+
+    def track_finish(self, run_id: str, status: str) -> None:
+        self.running_tasks.pop(run_id, None)
+        if self.run_registry is not None:
+            self._registry_submit(self.run_registry.finish, run_id, status)
+        # 正常完成时 save_readme 已删除工作目录；失败、取消、超时的运行在这里兜底删除
+        try:
+            asyncio.get_running_loop().run_in_executor(None, remove_run_workspace, run_id)
+        except RuntimeError:
+            remove_run_workspace(run_id)
+
+    async def _registry_call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await asyncio.wrap_future(self.run_registry.submit(fn, *args, **kwargs))
+
+    def start_run_registry(self, registry: Optional[RunRegistry]) -> None:
+        """挂载运行登记表，并启动后台任务处理其他 worker 转来的取消请求、刷新心跳"""
+        self.run_registry = registry
+        if registry is not None and self._registry_watcher is None:
+            self._registry_watcher = asyncio.create_task(self._watch_run_registry())
+
+    async def stop_run_registry(self) -> None:
+        if self._registry_watcher is not None:
+            self._registry_watcher.cancel()
+            try:
+                await self._registry_watcher
+            except asyncio.CancelledError:
+                pass
+            self._registry_watcher = None
+
+    async def _watch_run_registry(self) -> None:
+        registry = self.run_registry
+        last_heartbeat = 0.0
+        last_purge = 0.0
+        while True:
+            try:
+                now = time.monotonic()
+                if now - last_purge >= 3600:
+                    last_purge = now
+                    await self._registry_call(registry.purge)
+                if self.running_tasks:
+                    for run_id in await self._registry_call(registry.poll_cancellations):
+                        task = self.running_tasks.get(run_id)
+                        if task is not None and not task.done():
+                            logger.info(f"Cancellation forwarded from another worker for run_id: {run_id}")
+                            task.cancel()
+                    if now - last_heartbeat >= registry.heartbeat_seconds:
+                        last_heartbeat = now
+                        await self._registry_call(registry.heartbeat)
+            except Exception as e:
+                logger.warning(f"Run registry watcher error: {e}")
+            await asyncio.sleep(RUN_REGISTRY_POLL_SECONDS)
+
+    async def run_status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """查询运行状态：登记表可用时可查到任一 worker 的运行"""
+        if self.run_registry is not None:
+            record = await self._registry_call(self.run_registry.get, run_id)
+            if record is not None:
+                return record.to_dict()
+        if run_id in self.running_tasks:
+            return {"run_id": run_id, "worker_id": current_worker_id(), "status": RUN_STATUS_RUNNING}
+        return None
+
+    async def list_runs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        if self.run_registry is not None:
+            records = await self._registry_call(self.run_registry.list_runs, status=status, limit=limit)
+            return [record.to_dict() for record in records]
+        if status not in (None, RUN_STATUS_RUNNING):
+            return []
+        return [{"run_id": run_id, "worker_id": current_worker_id(), "status": RUN_STATUS_RUNNING}
+                for run_id in list(self.running_tasks)[:limit]]
+
     # 取消执行 - 使用asyncio的标准方式
-    def cancel_run(self, run_id: str, ctx: Optional[Context] = None) -> Dict[str, Any]:
+    async def cancel_run(self, run_id: str, ctx: Optional[Context] = None) -> Dict[str, Any]:
         """
         取消指定run_id的执行
 
         使用asyncio.Task.cancel()来取消任务,这是标准的Python异步取消机制。
         LangGraph会在节点之间检查CancelledError,实现优雅的取消。
+        运行在其他 worker 上时，在登记表中标记取消请求，由该 worker 轮询到后取消，并在此等待其确认。
         """
         logger.info(f"Attempting to cancel run_id: {run_id}")
 
@@ -207,13 +431,50 @@ class GraphService:
                     "run_id": run_id,
                     "message": "Task has already completed"
                 }
-        else:
+
+        record = None
+        if self.run_registry is not None:
+            record = await self._registry_call(self.run_registry.request_cancel, run_id)
+        if record is None:
             logger.warning(f"No active task found for run_id: {run_id}")
             return {
                 "status": "not_found",
                 "run_id": run_id,
                 "message": "No active task found with this run_id. Task may have already completed or run_id is invalid."
             }
+        if record.status == RUN_STATUS_LOST:
+            logger.warning(f"Worker {record.worker_id} owning run_id {run_id} is no longer alive")
+            return {
+                "status": "not_found",
+                "run_id": run_id,
+                "message": f"Worker {record.worker_id} running this task is no longer alive."
+            }
+        if record.status != RUN_STATUS_RUNNING:
+            logger.info(f"Task already completed for run_id: {run_id}")
+            return {
+                "status": "already_completed",
+                "run_id": run_id,
+                "message": f"Task has already completed with status {record.status}"
+            }
+
+        # 等待目标 worker 处理取消请求
+        deadline = time.monotonic() + RUN_REGISTRY_CANCEL_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(RUN_REGISTRY_POLL_SECONDS / 2)
+            current = await self._registry_call(self.run_registry.get, run_id)
+            if current is None or current.status != RUN_STATUS_RUNNING:
+                logger.info(f"Run {run_id} cancelled by worker {record.worker_id}")
+                return {
+                    "status": "success",
+                    "run_id": run_id,
+                    "message": f"Task cancelled by worker {record.worker_id}"
+                }
+        logger.info(f"Cancellation forwarded to worker {record.worker_id} for run_id: {run_id}")
+        return {
+            "status": "success",
+            "run_id": run_id,
+            "message": f"Cancellation forwarded to worker {record.worker_id}, task will be cancelled at its next await point"
+        }
 
     # 运行指定节点：本地/HTTP 通用
     async def run_node(self, node_id: str, payload: Dict[str, Any], ctx=None) -> Any:
@@ -227,8 +488,12 @@ class GraphService:
         parser = LangGraphParser(self.graph)
         metadata = parser.get_node_metadata(node_id) or {}
 
+        # 节点注册了异步实现时一并带上，ainvoke 走异步路径
+        node_afunc = graph_helper.get_graph_node_afunc(self.graph.get_graph(), node_id)
+        action = RunnableCallable(node_func, node_afunc, name=node_func.__name__, trace=False) if node_afunc else node_func
+
         _g = StateGraph(input_cls, input_schema=input_cls, output_schema=output_cls)
-        _g.add_node("sn", node_func, metadata=metadata)
+        _g.add_node("sn", action, metadata=metadata, input_schema=input_cls)
         _g.set_entry_point("sn")
         _g.add_edge("sn", END)
         _graph = _g.compile()
@@ -249,15 +514,97 @@ class GraphService:
         client_msg, session_id = to_client_message(payload)
         run_config["recursion_limit"] = 100
         run_config["configurable"] = {"thread_id": session_id}
-        stream_input = to_stream_input(client_msg)
+        stream_input = self._stream_input(payload, client_msg)
+        if not STREAM_NATIVE_ASYNC:
+            async for item in self._astream_threaded(graph, stream_input, run_config, client_msg, ctx):
+                yield item
+            return
 
-        # 使用后台线程拉取同步流，并通过事件循环安全地推送到异步队列
+        # 直接在事件循环上驱动 graph.astream：不占用线程，取消或客户端断开时关闭迭代器即停止图的执行
+        start_time = time.time()
+        self._count_stream(native_started=1)
+        server_msgs = agent_aiter_server_messages(
+            graph.astream(stream_input, stream_mode="messages", config=run_config, context=ctx),
+            session_id=client_msg.session_id,
+            query_msg_id=client_msg.local_msg_id,
+            local_msg_id=client_msg.local_msg_id,
+            run_id=ctx.run_id,
+            log_id=ctx.logid,
+        )
+        last_seq = 0
+        reply_id = ""
+        try:
+            while True:
+                # 等待下一条消息时也受总超时约束，卡住的节点不会无限占用连接
+                try:
+                    async with asyncio.timeout(max(TIMEOUT_SECONDS - (time.time() - start_time), 0)):
+                        sm = await server_msgs.__anext__()
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                    yield create_message_end_dict(
+                        code="TIMEOUT",
+                        message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
+                        session_id=client_msg.session_id,
+                        query_msg_id=client_msg.local_msg_id,
+                        log_id=ctx.logid,
+                        time_cost_ms=int((time.time() - start_time) * 1000),
+                        reply_id=reply_id,
+                        sequence_id=last_seq + 1,
+                    )
+                    break
+                yield sm.dict()
+                reply_id = sm.reply_id
+                last_seq = sm.sequence_id
+        except asyncio.CancelledError:
+            logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
+            raise
+        except Exception as ex:
+            # 使用错误分类器获取错误码
+            err = classify_error(ex, {"node_name": "astream"})
+            yield create_message_end_dict(
+                code=str(err.code),
+                message=err.message,
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                log_id=ctx.logid,
+                time_cost_ms=int((time.time() - start_time) * 1000),
+                reply_id="",
+                sequence_id=last_seq + 1,
+            )
+        finally:
+            await server_msgs.aclose()
+
+    async def _astream_threaded(self, graph: CompiledStateGraph, stream_input: Dict[str, Any],
+                                run_config: RunnableConfig, client_msg, ctx: Context) -> AsyncIterable[Any]:
+        """astream 的线程回退实现（STREAM_NATIVE_ASYNC=false）：节点只有同步实现且依赖线程内状态时使用"""
+        # 在共享线程池中拉取同步流，并通过事件循环安全地推送到异步队列。
+        # slots 限制队列中未读取的消息数：客户端读取慢时生产者阻塞等待，断开后生产者停止并关闭图的迭代器
         loop = asyncio.get_running_loop()
         q: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(STREAM_QUEUE_SIZE)
+        stopped = threading.Event()
         context = contextvars.copy_context()
         start_time = time.time()
+
+        def put(item) -> bool:
+            while not slots.acquire(timeout=0.5):
+                if stopped.is_set():
+                    return False
+            if stopped.is_set():
+                return False
+            loop.call_soon_threadsafe(q.put_nowait, item)
+            return True
+
         def producer():
+            items = None
+            server_msgs_iter = None
+            last_seq = 0
+            self._count_stream(pending=-1, active=1)
             try:
+                if stopped.is_set():
+                    return
                 items = graph.stream(stream_input, stream_mode="messages", config=run_config, context=ctx)
                 server_msgs_iter = agent_iter_server_messages(
                     items,
@@ -267,7 +614,6 @@ class GraphService:
                     run_id=ctx.run_id,
                     log_id=ctx.logid,
                 )
-                last_seq = 0
                 for sm in server_msgs_iter:
                     # 主动检查执行时间，及时中断
                     if time.time() - start_time > TIMEOUT_SECONDS:
@@ -282,9 +628,12 @@ class GraphService:
                             reply_id=getattr(sm, 'reply_id', ''),
                             sequence_id=last_seq + 1,
                         )
-                        loop.call_soon_threadsafe(q.put_nowait, timeout_msg)
+                        put(timeout_msg)
+                        return
+                    if not put(sm.dict()):
+                        logger.info(f"Stream consumer gone, stopping producer for run_id: {ctx.run_id}")
+                        self._count_stream(stopped_early=1)
                         return
-                    loop.call_soon_threadsafe(q.put_nowait, sm.dict())
                     last_seq = sm.sequence_id
             except Exception as ex:
                 # 使用错误分类器获取错误码
@@ -299,25 +648,85 @@ class GraphService:
                     reply_id="",
                     sequence_id=last_seq + 1,
                 )
-                loop.call_soon_threadsafe(q.put_nowait, end_msg)
+                put(end_msg)
             finally:
-                loop.call_soon_threadsafe(q.put_nowait, None)
-
-        threading.Thread(target=lambda: context.run(producer), daemon=True).start()
+                # 提前结束时关闭迭代器，图在当前步骤结束后停止执行
+                for it in (server_msgs_iter, items):
+                    if it is not None and hasattr(it, "close"):
+                        try:
+                            it.close()
+                        except Exception as e:
+                            logger.warning(f"Error closing stream for run_id {ctx.run_id}: {e}")
+                self._count_stream(active=-1)
+                # 结束标记不占用缓冲名额
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(q.put_nowait, None)
+
+        self._count_stream(pending=1)
+        loop.run_in_executor(self._get_stream_executor(), context.run, producer)
 
         try:
             while True:
                 item = await q.get()
                 if item is None:
                     break
+                slots.release()
                 yield item
         except asyncio.CancelledError:
             logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
             raise
+        finally:
+            stopped.set()
+
+    def _get_stream_executor(self) -> ThreadPoolExecutor:
+        if self._stream_executor is None:
+            with self._stream_lock:
+                if self._stream_executor is None:
+                    self._stream_executor = ThreadPoolExecutor(max_workers=STREAM_PRODUCER_THREADS,
+                                                               thread_name_prefix="stream-producer")
+        return self._stream_executor
+
+    def _count_stream(self, **deltas: int) -> None:
+        with self._stream_lock:
+            for name, delta in deltas.items():
+                self._stream_counts[name] += delta
+
+    def stream_stats(self) -> Dict[str, Any]:
+        with self._stream_lock:
+            return {"mode": "async" if STREAM_NATIVE_ASYNC else "thread",
+                    "max_producer_threads": STREAM_PRODUCER_THREADS, "queue_size": STREAM_QUEUE_SIZE,
+                    **self._stream_counts}
 
 
 service = GraphService()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 每个 worker 进程启动时挂载运行登记表（多 worker 间转发取消请求、共享运行状态）
+    service.start_run_registry(get_run_registry())
+    await service.start_job_pool()
+    yield
+    await service.stop_job_pool()
+    await service.stop_run_registry()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def admit_run(kind: str) -> Optional[Permit]:
+    """取得本 worker 的执行名额；排队已满或等待超时时返回 429 与 Retry-After"""
+    controller = get_admission_controller()
+    if controller is None:
+        return None
+    try:
+        permit = await controller.acquire(kind)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected {kind} request: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if permit.waited_seconds > 0:
+        logger.info(f"Admitted {kind} request after queueing {permit.waited_seconds:.3f}s")
+    return permit
 
 
 @app.post("/run")
@@ -342,26 +751,16 @@ async def http_run(request: Request) -> Dict[str, Any]:
         f"body={body_text}"
     )
 
+    # 超出并发上限时在此排队，队列已满直接返回 429
+    permit = await admit_run("run")
     try:
         payload = await request.json()
 
         # 创建任务并记录 - 这是关键，让我们可以通过run_id取消任务
-        task = asyncio.create_task(service.run(payload, ctx))
-        service.running_tasks[run_id] = task
-
-        try:
-            result = await asyncio.wait_for(task, timeout=float(TIMEOUT_SECONDS))
-        except asyncio.TimeoutError:
-            logger.error(f"Run execution timeout after {TIMEOUT_SECONDS}s for run_id: {run_id}")
-            task.cancel()
-            try:
-                result = await task
-            except asyncio.CancelledError:
-                return {
-                    "status": "timeout", 
-                    "run_id": run_id, 
-                    "message": f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds"
-                }
+        # 超时由 service.run 自行计时并登记，超时与取消都以结果字典返回
+        task = asyncio.create_task(service.run(payload, ctx, timeout=float(TIMEOUT_SECONDS)))
+        service.track_start(run_id, task, "run")
+        result = await task
 
         if not result:
             result = {}
@@ -394,6 +793,8 @@ async def http_run(request: Request) -> Dict[str, Any]:
             }
         )
     finally:
+        if permit is not None:
+            permit.release()
         cozeloop.flush()
 
 
@@ -423,12 +824,15 @@ async def http_stream_run(request: Request):
         logger.error(f"JSON decode error in http_stream_run: {e}, traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON format:{extract_core_stack()}")
 
+    # 名额在流结束（完成、出错或客户端断开）时释放
+    permit = await admit_run("stream_run")
+
     # 包装stream_sse为可取消的任务
     async def cancellable_stream():
         # 将真正的流式任务登记到 running_tasks，确保 /cancel 能定位到它
         task = asyncio.current_task()
         if task:
-            service.running_tasks[run_id] = task
+            service.track_start(run_id, task, "stream_run")
             logger.info(f"Registered streaming task for run_id: {run_id}")
 
         client_msg, _ = to_client_message(payload)
@@ -469,9 +873,14 @@ async def http_stream_run(request: Request):
                 local_msg_id=client_msg.local_msg_id,
             )
             yield service._sse_event(error_msg)
+        finally:
+            if permit is not None:
+                permit.release()
 
     # 注意：StreamingResponse会在后台运行generator
-    response = StreamingResponse(cancellable_stream(), media_type="text/event-stream")
+    # 生成器未开始迭代（如发送响应头时客户端已断开）时，由后台任务兜底释放名额
+    response = StreamingResponse(cancellable_stream(), media_type="text/event-stream",
+                                 background=BackgroundTask(permit.release) if permit is not None else None)
     return response
 
 @app.post("/cancel/{run_id}")
@@ -485,10 +894,94 @@ async def http_cancel(run_id: str, request: Request):
     ctx = new_context(method="cancel", headers=request.headers)
     request_context.set(ctx)
     logger.info(f"Received cancel request for run_id: {run_id}")
-    result = service.cancel_run(run_id, ctx)
+    result = await service.cancel_run(run_id, ctx)
+    return result
+
+
+@app.get("/runs/{run_id}")
+async def http_run_status(run_id: str):
+    """查询运行状态；多 worker 部署时可查到任一 worker 上的运行"""
+    record = await service.run_status(run_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"run_id '{run_id}' not found")
+    return record
+
+
+@app.get("/runs")
+async def http_list_runs(status: Optional[str] = None, limit: int = 100):
+    return {"runs": await service.list_runs(status, max(1, min(limit, 1000)))}
+
+
+def _require_job_queue() -> JobQueue:
+    if service.job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is unavailable: run registry is disabled or failed to start")
+    return service.job_queue
+
+
+async def _get_job(job_id: str) -> JobRecord:
+    queue = _require_job_queue()
+    job = await queue.call(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job_id '{job_id}' not found")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def http_submit_job(request: Request):
+    """提交图运行任务，立即返回 job_id；由任务执行池异步执行，通过 /jobs/{job_id} 轮询状态"""
+    queue = _require_job_queue()
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in http_submit_job: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=400, detail=f"Invalid JSON format, {extract_core_stack()}")
+    job = await queue.call(queue.enqueue, payload)
+    service.job_pool.notify()
+    logger.info(f"Job {job.job_id} queued")
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@app.get("/jobs")
+async def http_list_jobs(status: Optional[str] = None, limit: int = 100):
+    queue = _require_job_queue()
+    jobs = await queue.call(queue.list_jobs, status=status, limit=max(1, min(limit, 1000)))
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+
+@app.get("/jobs/{job_id}")
+async def http_job_status(job_id: str):
+    """任务状态、按节点的进度，完成后附带 readme_url"""
+    return (await _get_job(job_id)).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def http_job_result(job_id: str):
+    job = await _get_job(job_id)
+    if job.status != JOB_STATUS_COMPLETED:
+        raise HTTPException(status_code=409, detail={"job_id": job_id, "status": job.status, "error": job.error})
+    result = dict(job.result or {})
+    result["run_id"] = job_id
     return result
 
 
+@app.post("/jobs/{job_id}/cancel")
+async def http_cancel_job(job_id: str, request: Request):
+    """取消任务：未开始的任务直接取消，执行中的任务按 /cancel/{run_id} 转发给执行它的 worker"""
+    job = await _get_job(job_id)
+    if job.status == JOB_STATUS_QUEUED:
+        queue = service.job_queue
+        job = await queue.call(queue.cancel_queued, job_id)
+        if job.status == JOB_STATUS_CANCELLED:
+            logger.info(f"Queued job {job_id} cancelled")
+            return {"status": "success", "run_id": job_id, "message": "Queued job cancelled before it started"}
+    if job.finished:
+        return {"status": "already_completed", "run_id": job_id,
+                "message": f"Job has already finished with status {job.status}"}
+    ctx = new_context(method="cancel", headers=request.headers)
+    request_context.set(ctx)
+    return await service.cancel_run(job_id, ctx)
+
+
 @app.post(path="/node_run/{node_id}")
 async def http_node_run(node_id: str, request: Request):
     raw_body = await request.body()
@@ -546,6 +1039,26 @@ async def health_check():
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@app.get("/metrics")
+async def http_metrics():
+    llm_cache = get_llm_cache()
+    llm_governor = get_llm_governor()
+    registry = service.run_registry
+    admission = get_admission_controller()
+    return {
+        "worker": {"id": current_worker_id(), "workers": worker_count(), "running": len(service.running_tasks)},
+        "run_registry": await service._registry_call(registry.stats) if registry is not None else {},
+        "jobs": {**service.job_pool.stats(), **await service.job_queue.call(service.job_queue.stats)}
+        if service.job_pool is not None else {},
+        "admission": admission.stats() if admission is not None else {},
+        "stream": service.stream_stats(),
+        "llm_cache": llm_cache.stats() if llm_cache is not None else {},
+        "map_reduce": get_shard_stats(),
+        "llm_governor": llm_governor.stats() if llm_governor is not None else {},
+        "storage": storage_stats(),
+    }
+
+
 @app.get(path="/graph_parameter")
 async def http_graph_inout_parameter(request: Request):
     return service.graph_inout_schema()
@@ -556,6 +1069,7 @@ def parse_args():
     parser.add_argument("-n", type=str, default="", help="Node ID for single node run")
     parser.add_argument("-p", type=int, default=5000, help="HTTP server port")
     parser.add_argument("-i", type=str, default="", help="Input JSON string for flow/node mode")
+    parser.add_argument("-w", type=str, default=HTTP_WORKERS, help="HTTP worker processes, a number or auto (CPU cores); LLM and admission limits are split across workers")
     return parser.parse_args()
 
 
@@ -571,19 +1085,29 @@ def parse_input(input_str: str) -> Dict[str, Any]:
         # If not valid JSON, treat as plain text
         return {"text": input_str}
 
-def start_http_server(port):
-    workers = 1
+def resolve_workers(value: str) -> int:
+    if str(value).strip().lower() in ("", "auto"):
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+
+def start_http_server(port, workers: str = HTTP_WORKERS):
+    workers = resolve_workers(workers)
     reload = False
     if graph_helper.is_dev_env():
+        # 热重载只支持单进程
         reload = True
+        workers = 1
 
+    # worker 进程继承该环境变量，按 worker 数均分大模型调用与准入控制的额度
+    set_worker_count(workers)
     logger.info(f"Start HTTP Server, Port: {port}, Workers: {workers}")
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload, workers=workers)
 
 if __name__ == "__main__":
     args = parse_args()
     if args.m == "http":
-        start_http_server(args.p)
+        start_http_server(args.p, args.w)
     elif args.m == "flow":
         payload = parse_input(args.i)
         result = asyncio.run(service.run(payload))
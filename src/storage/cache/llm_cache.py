@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+logger = logging.getLogger(__name__)
+
+# 缓存配置（可通过环境变量覆盖）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "/tmp/llm_cache")
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 512MB
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 7天
+LLM_CACHE_EVICT_INTERVAL = int(os.getenv("LLM_CACHE_EVICT_INTERVAL", "64"))  # 每写入多少次执行一次淘汰
+
+
+def make_cache_key(*, model: str, params: Dict[str, Any], system_prompt: str, user_prompt: str) -> str:
+    """缓存键：模型 + 采样参数 + 系统提示词 + 用户提示词哈希"""
+    payload = {
+        "model": model,
+        "params": params,
+        "sp": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        "up": hashlib.sha256(user_prompt.encode("utf-8")).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级大模型响应缓存：进程内 LRU + SQLite 磁盘缓存（按 TTL 和总大小淘汰）。
+    内存 LRU 与 SQLite 连接各用一把锁，磁盘读写不阻塞内存命中；
+    磁盘命中的访问时间暂存在内存中，随下一次写入批量更新；淘汰每 evict_interval 次写入
+    （或估计的总大小超过上限时）执行一次，并以表中实际大小校正估计值（多个 worker 共用同一数据库）
+    """
+
+    def __init__(self, *, cache_dir: str = LLM_CACHE_DIR, memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+                 evict_interval: int = LLM_CACHE_EVICT_INTERVAL):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_interval = max(1, evict_interval)
+        self._lock = threading.Lock()  # 内存 LRU、统计与待更新的访问时间
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (response, created_at)
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._touched: Dict[str, float] = {}  # 磁盘命中 key -> 访问时间，尚未写回
+        self._db_lock = threading.Lock()  # SQLite 连接及以下字段
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes: Optional[int] = None  # 磁盘缓存总大小的估计值，首次淘汰时从表中读取
+        self._puts_since_evict = 0
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                conn = sqlite3.connect(os.path.join(self.cache_dir, "llm_cache.sqlite3"), timeout=30,
+                                       check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, "
+                    "created_at REAL, accessed_at REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+                conn.commit()
+                self._conn = conn
+            except Exception as e:
+                # 磁盘缓存不可用时仅使用内存缓存
+                logger.warning(f"LLM disk cache unavailable, using memory cache only: {e}")
+        return self._conn
+
+    def _count(self, node_name: str, field: str) -> None:
+        node_stats = self._stats.setdefault(node_name, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        node_stats[field] += 1
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, node_name: str = "") -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                response, created_at = cached
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._count(node_name, "memory_hits")
+                    return response
+                self._memory.pop(key, None)
+
+        row = None
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                except Exception as e:
+                    logger.warning(f"LLM disk cache read failed: {e}")
+
+        # 过期条目留给下一次淘汰删除，读路径不写数据库
+        with self._lock:
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                response, created_at = row
+                self._remember(key, response, created_at)
+                self._touched[key] = now
+                self._count(node_name, "disk_hits")
+                return response
+            self._count(node_name, "misses")
+            return None
+
+    def put(self, key: str, response: str, model: str = "") -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._remember(key, response, now)
+            touched, self._touched = self._touched, {}
+        touched.pop(key, None)
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, size, now, now),
+                )
+                if touched:
+                    conn.executemany("UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                                     [(accessed_at, k) for k, accessed_at in touched.items()])
+                self._puts_since_evict += 1
+                if self._disk_bytes is not None:
+                    self._disk_bytes += size
+                if (self._disk_bytes is None or self._disk_bytes > self.max_bytes
+                        or self._puts_since_evict >= self.evict_interval):
+                    self._evict(conn, now)
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"LLM disk cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """先淘汰过期条目，再按最近访问时间淘汰直到总大小不超过上限，并记录淘汰后的总大小"""
+        self._puts_since_evict = 0
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = []
+            for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at ASC"):
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+            logger.info(f"LLM disk cache evicted {len(evicted)} entries")
+        self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """按节点返回命中/未命中计数"""
+        with self._lock:
+            return {node: dict(values) for node, values in self._stats.items()}
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取进程级缓存实例；LLM_CACHE_ENABLED=false 时返回 None"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import logging
+logger = logging.getLogger(__name__)
+
+# 签名 URL 缓存配置（可通过环境变量覆盖）
+PRESIGN_CACHE_ENABLED = os.getenv("PRESIGN_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+PRESIGN_CACHE_ENTRIES = int(os.getenv("PRESIGN_CACHE_ENTRIES", "1024"))
+# 剩余有效期不超过该值的缓存 URL 不再返回（短有效期的 URL 取其有效期的一半）
+PRESIGN_CACHE_MARGIN_SECONDS = int(os.getenv("PRESIGN_CACHE_MARGIN_SECONDS", "300"))
+# 有效期按该粒度向上取整后签名，相近有效期的请求共用同一个 URL；0 表示不取整
+PRESIGN_CACHE_EXPIRE_STEP_SECONDS = int(os.getenv("PRESIGN_CACHE_EXPIRE_STEP_SECONDS", "300"))
+
+# (签名端点, bucket, key, 取整后的有效期)
+CacheKey = Tuple[str, str, str, int]
+
+
+class PresignCache:
+    """进程内签名 URL 缓存：按签名时间和有效期判断是否仍可返回，超出条目数时按 LRU 淘汰"""
+
+    def __init__(self, *, max_entries: int = PRESIGN_CACHE_ENTRIES, margin_seconds: int = PRESIGN_CACHE_MARGIN_SECONDS,
+                 expire_step_seconds: int = PRESIGN_CACHE_EXPIRE_STEP_SECONDS):
+        self.max_entries = max_entries
+        self.margin_seconds = margin_seconds
+        self.expire_step_seconds = expire_step_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, tuple]" = OrderedDict()  # key -> (url, expires_at)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def sign_expire_time(self, expire_time: int) -> int:
+        """实际签名使用的有效期：按粒度向上取整，不短于调用方要求的有效期"""
+        step = self.expire_step_seconds
+        if step <= 0 or expire_time <= 0:
+            return expire_time
+        return -(-expire_time // step) * step
+
+    def _margin(self, expire_time: int) -> float:
+        return min(self.margin_seconds, expire_time / 2)
+
+    def get(self, *, endpoint: str, bucket: str, key: str, expire_time: int) -> Optional[str]:
+        sign_expire = self.sign_expire_time(expire_time)
+        cache_key = (endpoint, bucket, key, sign_expire)
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached is None:
+                self._stats["misses"] += 1
+                return None
+            url, expires_at = cached
+            if expires_at - now <= self._margin(sign_expire):
+                del self._entries[cache_key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self._stats["hits"] += 1
+            return url
+
+    def put(self, *, endpoint: str, bucket: str, key: str, expire_time: int, url: str, signed_at: float) -> None:
+        """登记签名结果；signed_at 取发起签名请求前的时间，估算的过期时间只会偏早"""
+        sign_expire = self.sign_expire_time(expire_time)
+        if self.max_entries <= 0 or sign_expire <= 0:
+            return
+        with self._lock:
+            self._entries[(endpoint, bucket, key, sign_expire)] = (url, signed_at + sign_expire)
+            self._entries.move_to_end((endpoint, bucket, key, sign_expire))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *, bucket: str, key: str) -> None:
+        """对象被删除或覆盖时移除其全部签名 URL"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[1] == bucket and k[2] == key]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
+
+
+_presign_cache: Optional[PresignCache] = None
+_presign_cache_lock = threading.Lock()
+
+
+def get_presign_cache() -> Optional[PresignCache]:
+    """获取进程级签名 URL 缓存；PRESIGN_CACHE_ENABLED=false 且未通过 set_presign_cache 指定时返回 None"""
+    global _presign_cache
+    if _presign_cache is None and PRESIGN_CACHE_ENABLED:
+        with _presign_cache_lock:
+            if _presign_cache is None:
+                _presign_cache = PresignCache()
+    return _presign_cache
+
+
+def set_presign_cache(cache: Optional[PresignCache]) -> None:
+    """替换进程级签名 URL 缓存（测试或自定义容量、余量时使用）"""
+    global _presign_cache
+    with _presign_cache_lock:
+        _presign_cache = cache
@@ -0,0 +1,119 @@
+import os
+import glob
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+import logging
+logger = logging.getLogger(__name__)
+
+# 整体运行结果缓存配置（可通过环境变量覆盖）
+RUN_CACHE_ENABLED = os.getenv("RUN_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+RUN_CACHE_DIR = os.getenv("RUN_CACHE_DIR", "/tmp/run_cache")
+RUN_CACHE_TTL_SECONDS = int(os.getenv("RUN_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))  # 30天
+
+# README 存放位置前缀：对象存储 key 或本地文件路径
+LOCATION_S3 = "s3:"
+LOCATION_LOCAL = "local:"
+
+
+# 影响生成结果的节点配置（提示词、模型、采样与分析参数）；llm_governor_cfg.json 等调度配置不参与
+PROMPT_CONFIG_PATTERN = "*_llm_cfg.json"
+
+
+def get_prompt_config_version() -> str:
+    """提示词配置版本：config/*_llm_cfg.json 内容哈希，任一节点配置变化都会使旧结果失效"""
+    workspace = os.getenv("COZE_WORKSPACE_PATH") or ""
+    h = hashlib.sha256()
+    for cfg_file in sorted(glob.glob(os.path.join(workspace, "config", PROMPT_CONFIG_PATTERN))):
+        h.update(os.path.basename(cfg_file).encode("utf-8") + b"\0")
+        with open(cfg_file, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class RunResultCache:
+    """按 (组件内容哈希, 提示词配置版本) 记录已生成 README 的存放位置"""
+
+    def __init__(self, *, cache_dir: str = RUN_CACHE_DIR, ttl_seconds: int = RUN_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.cache_dir, "run_cache.sqlite3"), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS run_result ("
+                "digest TEXT, config_version TEXT, location TEXT, created_at REAL, "
+                "PRIMARY KEY (digest, config_version))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, digest: str) -> Optional[str]:
+        """返回可复用的 README 存放位置；本地文件已丢失或已过期时视为未命中"""
+        if not digest:
+            return None
+        version = get_prompt_config_version()
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                row = conn.execute(
+                    "SELECT location, created_at FROM run_result WHERE digest = ? AND config_version = ?",
+                    (digest, version),
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Run result cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        location, created_at = row
+        if time.time() - created_at > self.ttl_seconds or (
+                location.startswith(LOCATION_LOCAL) and not os.path.exists(location[len(LOCATION_LOCAL):])):
+            self.invalidate(digest)
+            return None
+        return location
+
+    def put(self, digest: str, location: str) -> None:
+        if not digest:
+            return
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO run_result (digest, config_version, location, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (digest, get_prompt_config_version(), location, time.time()),
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Run result cache write failed: {e}")
+
+    def invalidate(self, digest: str) -> None:
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                conn.execute("DELETE FROM run_result WHERE digest = ?", (digest,))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Run result cache invalidate failed: {e}")
+
+
+_run_cache: Optional[RunResultCache] = None
+
+
+def get_run_cache() -> Optional[RunResultCache]:
+    """获取进程级运行结果缓存；RUN_CACHE_ENABLED=false 时返回 None"""
+    global _run_cache
+    if not RUN_CACHE_ENABLED:
+        return None
+    if _run_cache is None:
+        _run_cache = RunResultCache()
+    return _run_cache
@@ -0,0 +1,336 @@
+"""
+持久化任务队列：POST /jobs 提交的图运行写入运行登记表所在的数据库（同一 SQLite 文件或 Postgres），
+由各 worker 进程内固定并发数的 JobWorkerPool 领取执行，吞吐量由队列并发数决定，与客户端连接数无关。
+- 任务状态、按节点的进度与结果都保存在队列表中，客户端断开后仍可轮询获取
+- 执行中的任务定期刷新心跳；worker 退出（重启、崩溃）后心跳超时的任务重新入队，超过最大尝试次数时记为失败
+- 正常停止的 worker 会把执行中的任务放回队列，不计入尝试次数
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from storage.registry.run_registry import RunRegistry
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 任务队列配置（可通过环境变量覆盖）
+# 每个 worker 进程同时执行的任务数
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# 空闲时检查新任务的间隔（秒）；本进程提交的任务会立即唤醒
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# 单个任务的最长执行时间
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "900"))
+# worker 异常退出后任务最多被执行的次数
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# 已结束任务的保留时间
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+JOB_STATUS_TIMEOUT = "timeout"
+JOB_FINISHED_STATUSES = (JOB_STATUS_COMPLETED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED, JOB_STATUS_TIMEOUT)
+
+_COLUMNS = ("job_id, status, payload, result, error, progress, worker_id, attempts, "
+            "created_at, started_at, finished_at, updated_at, heartbeat_at")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS job_queue ("
+    "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, "
+    "error TEXT NOT NULL DEFAULT '', progress TEXT, worker_id TEXT NOT NULL DEFAULT '', "
+    "attempts INTEGER NOT NULL DEFAULT 0, created_at DOUBLE PRECISION NOT NULL, started_at DOUBLE PRECISION, "
+    "finished_at DOUBLE PRECISION, updated_at DOUBLE PRECISION NOT NULL, heartbeat_at DOUBLE PRECISION)",
+    "CREATE INDEX IF NOT EXISTS idx_job_queue_status ON job_queue (status, created_at)",
+)
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return json.dumps(value, ensure_ascii=False, default=str) if value is not None else None
+
+
+def _loads(value: Optional[str]) -> Any:
+    return json.loads(value) if value else None
+
+
+@dataclass
+class JobRecord:
+    job_id: str
+    status: str
+    payload: Dict[str, Any]
+    result: Optional[Dict[str, Any]]
+    error: str
+    progress: Optional[Dict[str, Any]]
+    worker_id: str
+    attempts: int
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    updated_at: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """状态查询返回的内容：不含请求体与完整结果，完成后附带 readme_url"""
+        data = asdict(self)
+        data.pop("payload")
+        result = data.pop("result") or {}
+        data["readme_url"] = result.get("readme_url") if isinstance(result, dict) else None
+        return data
+
+
+class JobQueue:
+    """任务队列表的读写，复用运行登记表的数据库连接与专用线程"""
+
+    def __init__(self, registry: RunRegistry, *, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.registry = registry
+        self.worker_id = registry.worker_id
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+
+    def setup(self) -> None:
+        for statement in _SCHEMA:
+            self.registry.execute(statement)
+
+    async def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在登记表专用线程中执行队列操作，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.registry.submit(fn, *args, **kwargs))
+
+    @staticmethod
+    def _record(row: tuple) -> JobRecord:
+        return JobRecord(job_id=row[0], status=row[1], payload=_loads(row[2]) or {}, result=_loads(row[3]),
+                         error=row[4] or "", progress=_loads(row[5]), worker_id=row[6] or "",
+                         attempts=int(row[7]), created_at=float(row[8]),
+                         started_at=float(row[9]) if row[9] is not None else None,
+                         finished_at=float(row[10]) if row[10] is not None else None,
+                         updated_at=float(row[11]))
+
+    def enqueue(self, payload: Dict[str, Any]) -> JobRecord:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self.registry.execute(
+            "INSERT INTO job_queue (job_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, JOB_STATUS_QUEUED, _dumps(payload), now, now))
+        return self.get(job_id)
+
+    def claim(self) -> Optional[JobRecord]:
+        """领取最早入队的任务并标记为执行中；没有待执行任务时返回 None"""
+        now = time.time()
+        rows = self.registry.execute(
+            "UPDATE job_queue SET status = ?, worker_id = ?, attempts = attempts + 1, started_at = ?, "
+            "updated_at = ?, heartbeat_at = ?, progress = NULL "
+            "WHERE status = ? AND job_id = (SELECT job_id FROM job_queue WHERE status = ? "
+            f"ORDER BY created_at LIMIT 1{self.registry.row_lock}) RETURNING {_COLUMNS}",
+            (JOB_STATUS_RUNNING, self.worker_id, now, now, now, JOB_STATUS_QUEUED, JOB_STATUS_QUEUED))
+        return self._record(rows[0]) if rows else None
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        self.registry.execute(
+            "UPDATE job_queue SET progress = ?, updated_at = ? WHERE job_id = ? AND status = ? AND worker_id = ?",
+            (_dumps(progress), time.time(), job_id, JOB_STATUS_RUNNING, self.worker_id))
+
+    def finish(self, job_id: str, status: str, *, result: Optional[Dict[str, Any]] = None, error: str = "") -> None:
+        """记录任务结束状态（仅限本 worker 领取的任务）"""
+        now = time.time()
+        self.registry.execute(
+            "UPDATE job_queue SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ? "
+            "WHERE job_id = ? AND status = ? AND worker_id = ?",
+            (status, _dumps(result), error, now, now, job_id, JOB_STATUS_RUNNING, self.worker_id))
+
+    def release(self, job_id: str) -> None:
+        """worker 正常停止时把执行中的任务放回队列，不计入尝试次数"""
+        self.registry.execute(
+            "UPDATE job_queue SET status = ?, worker_id = '', attempts = attempts - 1, progress = NULL, "
+            "updated_at = ? WHERE job_id = ? AND status = ? AND worker_id = ?",
+            (JOB_STATUS_QUEUED, time.time(), job_id, JOB_STATUS_RUNNING, self.worker_id))
+
+    def cancel_queued(self, job_id: str) -> Optional[JobRecord]:
+        """取消尚未开始的任务；返回取消后的记录（执行中的任务需通过运行登记表取消）"""
+        now = time.time()
+        self.registry.execute(
+            "UPDATE job_queue SET status = ?, finished_at = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+            (JOB_STATUS_CANCELLED, now, now, job_id, JOB_STATUS_QUEUED))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        rows = self.registry.execute(f"SELECT {_COLUMNS} FROM job_queue WHERE job_id = ?", (job_id,))
+        return self._record(rows[0]) if rows else None
+
+    def list_jobs(self, *, status: Optional[str] = None, limit: int = 100) -> List[JobRecord]:
+        if status:
+            rows = self.registry.execute(
+                f"SELECT {_COLUMNS} FROM job_queue WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                (status, limit))
+        else:
+            rows = self.registry.execute(
+                f"SELECT {_COLUMNS} FROM job_queue ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._record(row) for row in rows]
+
+    def heartbeat(self) -> None:
+        self.registry.execute(
+            "UPDATE job_queue SET heartbeat_at = ? WHERE worker_id = ? AND status = ?",
+            (time.time(), self.worker_id, JOB_STATUS_RUNNING))
+
+    def recover(self) -> None:
+        """心跳超时（worker 已退出）的执行中任务重新入队，超过最大尝试次数的记为失败"""
+        now = time.time()
+        stale = now - 3 * self.registry.heartbeat_seconds
+        self.registry.execute(
+            "UPDATE job_queue SET status = ?, error = ?, finished_at = ?, updated_at = ? "
+            "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+            (JOB_STATUS_FAILED, "worker lost while running the job", now, now, JOB_STATUS_RUNNING, stale,
+             self.max_attempts))
+        self.registry.execute(
+            "UPDATE job_queue SET status = ?, worker_id = '', progress = NULL, updated_at = ? "
+            "WHERE status = ? AND heartbeat_at < ?",
+            (JOB_STATUS_QUEUED, now, JOB_STATUS_RUNNING, stale))
+
+    def purge(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        self.registry.execute(
+            "DELETE FROM job_queue WHERE status IN (?, ?, ?, ?) AND updated_at < ?",
+            (*JOB_FINISHED_STATUSES, cutoff))
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self.registry.execute("SELECT status, COUNT(*), MIN(created_at) FROM job_queue GROUP BY status")
+        oldest_queued = next((row[2] for row in rows if row[0] == JOB_STATUS_QUEUED), None)
+        return {
+            "jobs": {row[0]: int(row[1]) for row in rows},
+            "oldest_queued_seconds": round(time.time() - float(oldest_queued), 1) if oldest_queued else 0.0,
+        }
+
+
+# 执行任务的回调：接收任务与进度上报函数，返回图的输出
+JobExecutor = Callable[[JobRecord, Callable[[Dict[str, Any]], None]], Awaitable[Dict[str, Any]]]
+
+
+class JobWorkerPool:
+    """worker 进程内的任务执行池：concurrency 个协程循环领取并执行任务，另有一个协程负责心跳与故障恢复"""
+
+    def __init__(self, queue: JobQueue, execute: JobExecutor, *, concurrency: int = JOB_CONCURRENCY,
+                 poll_seconds: float = JOB_POLL_SECONDS, timeout_seconds: float = JOB_TIMEOUT_SECONDS):
+        self.queue = queue
+        self.execute = execute
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.timeout_seconds = timeout_seconds
+        self._wakeup = asyncio.Event()
+        self._loops: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+        self._stats = {"completed": 0, "failed": 0, "cancelled": 0, "timeout": 0, "released": 0}
+
+    def start(self) -> None:
+        if self._loops:
+            return
+        self._loops = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        self._maintenance = asyncio.create_task(self._maintenance_loop())
+
+    def notify(self) -> None:
+        """本进程提交了新任务，唤醒空闲的执行协程"""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        """停止领取新任务，取消执行中的任务并将其放回队列"""
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._running.values():
+            task.cancel()
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        # 执行协程在放回任务后自行退出
+        await asyncio.gather(*self._loops, self._maintenance, return_exceptions=True)
+        self._loops = []
+        self._maintenance = None
+
+    async def _worker_loop(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self.queue.call(self.queue.claim)
+            except Exception as e:
+                logger.warning(f"Job queue claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if self._stopping:
+                await self._finish_safely(self.queue.release, job.job_id)
+                break
+            await self._run_job(job)
+
+    async def _run_job(self, job: JobRecord) -> None:
+        logger.info(f"Job {job.job_id} started (attempt {job.attempts})")
+
+        def report_progress(progress: Dict[str, Any]) -> None:
+            self.queue.registry.submit(self.queue.update_progress, job.job_id, progress)
+
+        task = asyncio.create_task(asyncio.wait_for(self.execute(job, report_progress), timeout=self.timeout_seconds))
+        self._running[job.job_id] = task
+        # 单独等待执行任务：取消单个任务（/cancel 或 stop）不会取消执行协程本身
+        await asyncio.wait({task})
+        self._running.pop(job.job_id, None)
+
+        if task.cancelled():
+            if self._stopping:
+                logger.info(f"Job {job.job_id} released back to the queue")
+                self._stats["released"] += 1
+                await self._finish_safely(self.queue.release, job.job_id)
+            else:
+                logger.info(f"Job {job.job_id} cancelled")
+                self._stats["cancelled"] += 1
+                await self._finish_safely(self.queue.finish, job.job_id, JOB_STATUS_CANCELLED)
+            return
+        error = task.exception()
+        if isinstance(error, asyncio.TimeoutError):
+            logger.error(f"Job {job.job_id} timeout after {self.timeout_seconds}s")
+            self._stats["timeout"] += 1
+            await self._finish_safely(self.queue.finish, job.job_id, JOB_STATUS_TIMEOUT,
+                                      error=f"Execution timeout: exceeded {self.timeout_seconds} seconds")
+        elif error is not None:
+            logger.error(f"Job {job.job_id} failed: {error}")
+            self._stats["failed"] += 1
+            await self._finish_safely(self.queue.finish, job.job_id, JOB_STATUS_FAILED, error=str(error))
+        else:
+            logger.info(f"Job {job.job_id} completed")
+            self._stats["completed"] += 1
+            await self._finish_safely(self.queue.finish, job.job_id, JOB_STATUS_COMPLETED, result=task.result())
+
+    async def _finish_safely(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        try:
+            await self.queue.call(fn, *args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Job queue update failed: {e}")
+
+    async def _maintenance_loop(self) -> None:
+        last_purge = 0.0
+        while True:
+            try:
+                if self._running:
+                    await self.queue.call(self.queue.heartbeat)
+                await self.queue.call(self.queue.recover)
+                if time.monotonic() - last_purge >= 3600:
+                    last_purge = time.monotonic()
+                    await self.queue.call(self.queue.purge)
+            except Exception as e:
+                logger.warning(f"Job queue maintenance error: {e}")
+            await asyncio.sleep(self.queue.registry.heartbeat_seconds)
+
+    def running_jobs(self) -> Set[str]:
+        return set(self._running)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"concurrency": self.concurrency, "running": len(self._running), **self._stats}
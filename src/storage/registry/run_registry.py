@@ -0,0 +1,263 @@
+"""
+跨进程运行登记表：多 worker 部署时记录每个运行由哪个 worker 执行、当前状态以及是否被请求取消。
+- 任一 worker 收到 /cancel 时在登记表中标记取消请求，执行该运行的 worker 轮询到后取消本地任务
+- 执行中的运行定期刷新心跳，心跳超时的记录视为 worker 已退出（lost）
+- 默认使用本机共享的 SQLite 文件（单机多 worker）；RUN_REGISTRY_BACKEND=postgres 时使用 PGDATABASE_URL 指向的数据库（多机部署）
+所有读写在登记表专用线程中按提交顺序执行，事件循环通过 submit 提交，不会被数据库锁阻塞。
+"""
+import os
+import time
+import socket
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import logging
+logger = logging.getLogger(__name__)
+
+# 登记表配置（可通过环境变量覆盖）
+RUN_REGISTRY_BACKEND = os.getenv("RUN_REGISTRY_BACKEND", "sqlite").lower()  # sqlite / postgres / none
+RUN_REGISTRY_PATH = os.getenv("RUN_REGISTRY_PATH", "/tmp/run_registry/run_registry.sqlite3")
+# worker 检查取消请求的间隔（秒）
+RUN_REGISTRY_POLL_SECONDS = float(os.getenv("RUN_REGISTRY_POLL_SECONDS", "0.5"))
+# 执行中运行的心跳间隔；超过 3 个间隔未刷新的记录视为 worker 已退出
+RUN_REGISTRY_HEARTBEAT_SECONDS = float(os.getenv("RUN_REGISTRY_HEARTBEAT_SECONDS", "5"))
+# 跨 worker 取消时等待目标 worker 确认的最长时间
+RUN_REGISTRY_CANCEL_WAIT_SECONDS = float(os.getenv("RUN_REGISTRY_CANCEL_WAIT_SECONDS", "2"))
+# 已结束运行的保留时间
+RUN_REGISTRY_RETENTION_SECONDS = int(os.getenv("RUN_REGISTRY_RETENTION_SECONDS", str(24 * 3600)))
+
+RUN_STATUS_RUNNING = "running"
+RUN_STATUS_COMPLETED = "completed"
+RUN_STATUS_FAILED = "failed"
+RUN_STATUS_CANCELLED = "cancelled"
+RUN_STATUS_TIMEOUT = "timeout"
+# 执行中但心跳超时，仅在查询结果中出现
+RUN_STATUS_LOST = "lost"
+
+_COLUMNS = "run_id, worker_id, method, status, cancel_requested, created_at, updated_at, heartbeat_at"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS run_registry ("
+    "run_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, method TEXT NOT NULL, status TEXT NOT NULL, "
+    "cancel_requested INTEGER NOT NULL DEFAULT 0, created_at DOUBLE PRECISION NOT NULL, "
+    "updated_at DOUBLE PRECISION NOT NULL, heartbeat_at DOUBLE PRECISION NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_run_registry_worker ON run_registry (worker_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_run_registry_updated ON run_registry (status, updated_at)",
+)
+
+
+def current_worker_id() -> str:
+    """当前 worker 的标识：主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class RunRecord:
+    run_id: str
+    worker_id: str
+    method: str
+    status: str
+    cancel_requested: bool
+    created_at: float
+    updated_at: float
+    heartbeat_at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RunRegistry:
+    """登记表的 SQL 实现，子类提供连接与参数占位符"""
+
+    placeholder = "?"
+    # 领取队列任务时附加的行锁子句，多个进程并发领取时互不阻塞
+    row_lock = ""
+
+    def __init__(self, *, worker_id: Optional[str] = None,
+                 heartbeat_seconds: float = RUN_REGISTRY_HEARTBEAT_SECONDS,
+                 retention_seconds: int = RUN_REGISTRY_RETENTION_SECONDS):
+        self.worker_id = worker_id or current_worker_id()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-registry")
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """执行一条语句并提交；SELECT 返回全部行"""
+        raise NotImplementedError
+
+    def _sql(self, sql: str) -> str:
+        return sql.replace("?", self.placeholder) if self.placeholder != "?" else sql
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """在登记表所在的数据库上执行一条语句（? 占位符），供同库的其他表（如任务队列）使用"""
+        return self._execute(self._sql(sql), params)
+
+    def setup(self) -> None:
+        for statement in _SCHEMA:
+            self._execute(statement)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        """在登记表专用线程中执行；提交顺序即执行顺序，事件循环中可 await asyncio.wrap_future(...)"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def _record(self, row: tuple) -> RunRecord:
+        record = RunRecord(run_id=row[0], worker_id=row[1], method=row[2], status=row[3],
+                           cancel_requested=bool(row[4]), created_at=float(row[5]), updated_at=float(row[6]),
+                           heartbeat_at=float(row[7]))
+        if record.status == RUN_STATUS_RUNNING and time.time() - record.heartbeat_at > 3 * self.heartbeat_seconds:
+            record.status = RUN_STATUS_LOST
+        return record
+
+    def register(self, run_id: str, *, method: str) -> None:
+        now = time.time()
+        self._execute(self._sql(
+            f"INSERT INTO run_registry ({_COLUMNS}) VALUES (?, ?, ?, ?, 0, ?, ?, ?) "
+            "ON CONFLICT (run_id) DO UPDATE SET worker_id = excluded.worker_id, method = excluded.method, "
+            "status = excluded.status, cancel_requested = 0, updated_at = excluded.updated_at, "
+            "heartbeat_at = excluded.heartbeat_at"
+        ), (run_id, self.worker_id, method, RUN_STATUS_RUNNING, now, now, now))
+
+    def finish(self, run_id: str, status: str) -> None:
+        """记录运行结束状态（仅限本 worker 登记的运行）"""
+        self._execute(self._sql(
+            "UPDATE run_registry SET status = ?, updated_at = ? WHERE run_id = ? AND worker_id = ?"
+        ), (status, time.time(), run_id, self.worker_id))
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        rows = self._execute(self._sql(f"SELECT {_COLUMNS} FROM run_registry WHERE run_id = ?"), (run_id,))
+        return self._record(rows[0]) if rows else None
+
+    def list_runs(self, *, status: Optional[str] = None, limit: int = 100) -> List[RunRecord]:
+        """按更新时间倒序列出运行；status=lost 时返回心跳超时的执行中运行"""
+        query_status = RUN_STATUS_RUNNING if status == RUN_STATUS_LOST else status
+        if query_status:
+            rows = self._execute(self._sql(
+                f"SELECT {_COLUMNS} FROM run_registry WHERE status = ? ORDER BY updated_at DESC LIMIT ?"
+            ), (query_status, limit))
+        else:
+            rows = self._execute(self._sql(
+                f"SELECT {_COLUMNS} FROM run_registry ORDER BY updated_at DESC LIMIT ?"
+            ), (limit,))
+        records = [self._record(row) for row in rows]
+        return [record for record in records if not status or record.status == status]
+
+    def request_cancel(self, run_id: str) -> Optional[RunRecord]:
+        """标记取消请求，由执行该运行的 worker 轮询处理；返回更新后的记录"""
+        self._execute(self._sql(
+            "UPDATE run_registry SET cancel_requested = 1, updated_at = ? WHERE run_id = ? AND status = ?"
+        ), (time.time(), run_id, RUN_STATUS_RUNNING))
+        return self.get(run_id)
+
+    def poll_cancellations(self) -> List[str]:
+        """本 worker 执行中且被请求取消的运行"""
+        rows = self._execute(self._sql(
+            "SELECT run_id FROM run_registry WHERE worker_id = ? AND status = ? AND cancel_requested = 1"
+        ), (self.worker_id, RUN_STATUS_RUNNING))
+        return [row[0] for row in rows]
+
+    def heartbeat(self) -> None:
+        self._execute(self._sql(
+            "UPDATE run_registry SET heartbeat_at = ? WHERE worker_id = ? AND status = ?"
+        ), (time.time(), self.worker_id, RUN_STATUS_RUNNING))
+
+    def purge(self) -> None:
+        """删除超过保留时间的已结束运行，以及心跳超时超过保留时间的记录"""
+        cutoff = time.time() - self.retention_seconds
+        self._execute(self._sql(
+            "DELETE FROM run_registry WHERE (status <> ? AND updated_at < ?) OR heartbeat_at < ?"
+        ), (RUN_STATUS_RUNNING, cutoff, cutoff))
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._execute(self._sql(
+            "SELECT status, COUNT(*), COUNT(DISTINCT worker_id) FROM run_registry GROUP BY status"
+        ))
+        return {
+            "worker_id": self.worker_id,
+            "runs": {row[0]: int(row[1]) for row in rows},
+            "workers_with_runs": {row[0]: int(row[2]) for row in rows},
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class SqliteRunRegistry(RunRegistry):
+    """本机 SQLite 文件（WAL 模式），同一主机上的多个 worker 进程共享"""
+
+    def __init__(self, *, path: str = RUN_REGISTRY_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def setup(self) -> None:
+        # 多个 worker 同时启动时，切换 WAL 与建表不受 busy timeout 保护，需自行重试
+        for attempt in range(50):
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                super().setup()
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == 49:
+                    raise
+                time.sleep(0.1)
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+            self._conn.commit()
+            return rows
+
+    def close(self) -> None:
+        super().close()
+        self._conn.close()
+
+
+class PostgresRunRegistry(RunRegistry):
+    """PostgreSQL 实现，多台主机上的 worker 共享；连接串取自 PGDATABASE_URL"""
+
+    placeholder = "%s"
+    row_lock = " FOR UPDATE SKIP LOCKED"
+
+    def __init__(self, *, db_url: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        from psycopg_pool import ConnectionPool
+        from storage.database.db import get_db_url
+        self._pool = ConnectionPool(db_url or get_db_url(), min_size=1, max_size=2,
+                                    kwargs={"autocommit": True}, open=True)
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self._pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            return cursor.fetchall() if cursor.description else []
+
+    def close(self) -> None:
+        super().close()
+        self._pool.close()
+
+
+_run_registry: Optional[RunRegistry] = None
+_run_registry_failed = False
+_run_registry_lock = threading.Lock()
+
+
+def get_run_registry() -> Optional[RunRegistry]:
+    """获取进程级运行登记表；RUN_REGISTRY_BACKEND=none 或初始化失败时返回 None（仅支持取消本 worker 的运行）"""
+    global _run_registry, _run_registry_failed
+    if _run_registry is not None or _run_registry_failed or RUN_REGISTRY_BACKEND == "none":
+        return _run_registry
+    with _run_registry_lock:
+        if _run_registry is None and not _run_registry_failed:
+            try:
+                registry = PostgresRunRegistry() if RUN_REGISTRY_BACKEND == "postgres" else SqliteRunRegistry()
+                registry.setup()
+                _run_registry = registry
+            except Exception as e:
+                _run_registry_failed = True
+                logger.warning(f"Run registry unavailable, cancellation limited to the local worker: {e}")
+    return _run_registry
@@ -0,0 +1,468 @@
+"""
+S3 兼容存储的异步实现：接口与 S3SyncStorage 一致，基于 httpx.AsyncClient（连接池复用）发送 SigV4 签名请求，
+等待网络期间不占用线程，可在 graph.ainvoke 的事件循环中直接 await。
+签名复用 botocore 的 S3SigV4Auth；请求体不参与签名（UNSIGNED-PAYLOAD），完整性由 Content-MD5 交给服务端校验，
+避免在事件循环中对大分片计算 sha256。
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import httpx
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from botocore.exceptions import ClientError
+
+from storage.cache.presign_cache import get_presign_cache
+from storage.s3.s3_storage import STORAGE_MAX_POOL_CONNECTIONS, ListFilesResult, S3StorageBase
+from storage.s3.token_cache import get_workload_token_cache
+import logging
+logger = logging.getLogger(__name__)
+
+# 单个请求的超时（秒）与遇到连接错误、5xx、429 时的重试次数
+STORAGE_ASYNC_TIMEOUT = float(os.getenv("STORAGE_ASYNC_TIMEOUT", "60"))
+STORAGE_ASYNC_MAX_RETRIES = int(os.getenv("STORAGE_ASYNC_MAX_RETRIES", "3"))
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_OK_STATUS = {200, 204, 206}
+
+
+class _UnsignedPayloadAuth(S3SigV4Auth):
+    """请求体不参与签名（X-Amz-Content-SHA256: UNSIGNED-PAYLOAD）"""
+
+    def _should_sha256_sign_payload(self, request) -> bool:
+        return False
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find_text(root: ElementTree.Element, name: str) -> str:
+    """按本地名查找第一个元素的文本，兼容带命名空间与不带命名空间的响应"""
+    for el in root.iter():
+        if _local_name(el.tag) == name:
+            return el.text or ""
+    return ""
+
+
+def _content_md5(data: bytes) -> str:
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def _read_range(path: str, offset: int, size: int) -> Tuple[bytes, str]:
+    """读取文件的一段并计算 Content-MD5（在线程池中执行）"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size)
+    return data, _content_md5(data)
+
+
+async def _aiter_chunks(chunk_iter: Union[AsyncIterable[bytes], Iterable[bytes]]) -> AsyncIterator[bytes]:
+    if hasattr(chunk_iter, "__aiter__"):
+        async for chunk in chunk_iter:
+            yield chunk
+    else:
+        for chunk in chunk_iter:
+            yield chunk
+
+
+class S3AsyncStorage(S3StorageBase):
+    """
+    S3兼容存储的异步实现
+    httpx.AsyncClient 与创建它的事件循环绑定：在其他事件循环中调用时会为该循环新建客户端
+    """
+
+    def __init__(self, *, endpoint_url: Optional[str] = None, access_key: str, secret_key: str, bucket_name: str,
+                 region: str = "cn-beijing", max_connections: int = STORAGE_MAX_POOL_CONNECTIONS,
+                 timeout: float = STORAGE_ASYNC_TIMEOUT, max_retries: int = STORAGE_ASYNC_MAX_RETRIES):
+        super().__init__(endpoint_url=endpoint_url, access_key=access_key, secret_key=secret_key,
+                         bucket_name=bucket_name, region=region)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._credentials = Credentials(access_key, secret_key)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def _endpoint(self) -> str:
+        if self.endpoint_url:
+            return self.endpoint_url
+        # 需要请求 workload identity 服务读取项目环境变量，放到线程中执行
+        return await asyncio.to_thread(self._resolve_endpoint)
+
+    async def _token(self) -> Optional[str]:
+        """读取进程级缓存的 x-storage-token；仅在进程内首次获取尚未完成时到线程中等待"""
+        token_cache = get_workload_token_cache()
+        token = token_cache.peek()
+        if token is None and not token_cache.attempted:
+            token = await asyncio.to_thread(token_cache.get)
+        return token
+
+    def _client_error(self, operation: str, response: httpx.Response) -> ClientError:
+        """将错误响应转换为与 boto3 一致的 ClientError，调用方可按 Error.Code 判断"""
+        code, message = str(response.status_code), response.reason_phrase
+        if response.content:
+            try:
+                root = ElementTree.fromstring(response.content)
+                code = _find_text(root, "Code") or code
+                message = _find_text(root, "Message") or message
+            except ElementTree.ParseError:
+                pass
+        return ClientError({
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": response.status_code, "HTTPHeaders": dict(response.headers)},
+        }, operation)
+
+    async def _request(self, operation: str, method: str, *, bucket: str, key: str = "",
+                       params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None,
+                       content: Optional[bytes] = None, max_retries: Optional[int] = None) -> httpx.Response:
+        """发送签名请求（path-style，与 boto3 访问自定义端点时一致）；连接错误、5xx、429 按指数退避重试"""
+        client = self._get_client()
+        url = f"{(await self._endpoint()).rstrip('/')}/{bucket}"
+        if key:
+            url += "/" + quote(key, safe="/~")
+        if params:
+            url += "?" + "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in params.items())
+        retries = self.max_retries if max_retries is None else max_retries
+
+        for attempt in range(retries + 1):
+            request_headers = dict(headers or {})
+            token = await self._token()
+            if token is not None:
+                request_headers["x-storage-token"] = token
+            # 每次重试重新签名（签名包含请求时间）
+            aws_request = AWSRequest(method=method, url=url, headers=request_headers)
+            _UnsignedPayloadAuth(self._credentials, "s3", self.region).add_auth(aws_request)
+            try:
+                response = await client.request(method, url, headers=dict(aws_request.headers.items()),
+                                                content=content)
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    raise
+                logger.warning("%s failed, retry %d/%d: %s", operation, attempt + 1, retries, e)
+            else:
+                if response.status_code in _OK_STATUS:
+                    return response
+                error = self._client_error(operation, response)
+                if response.status_code not in _RETRYABLE_STATUS or attempt >= retries:
+                    raise error
+                logger.warning(self._error_msg(f"{operation} failed, retry {attempt + 1}/{retries}", error))
+            await asyncio.sleep(min(0.5 * (2 ** attempt), 8.0) * (0.5 + random.random() / 2))
+        raise RuntimeError("unreachable")
+
+    async def upload_file(self, *, file_content: bytes, file_name: str, content_type: str = "application/octet-stream", bucket: Optional[str] = None) -> str:
+        # 先对输入文件名做规范校验，避免生成无效对象 key
+        self._validate_file_name(file_name)
+        try:
+            object_key = self._generate_object_key(original_name=file_name)
+            target_bucket = self._resolve_bucket(bucket)
+            await self._put_object(target_bucket, object_key, bytes(file_content), content_type)
+            return object_key
+        except Exception as e:
+            logger.error(self._error_msg("Error uploading file to S3", e))
+            raise e
+
+    async def _put_object(self, bucket: str, key: str, data: bytes, content_type: str,
+                          content_md5: str = "") -> httpx.Response:
+        headers = {"Content-MD5": content_md5 or _content_md5(data)}
+        if content_type:
+            headers["Content-Type"] = content_type
+        return await self._request("PutObject", "PUT", bucket=bucket, key=key, headers=headers, content=data)
+
+    async def delete_file(self, *, file_key: str, bucket: Optional[str] = None) -> bool:
+        try:
+            target_bucket = self._resolve_bucket(bucket)
+            await self._request("DeleteObject", "DELETE", bucket=target_bucket, key=file_key)
+            presign_cache = get_presign_cache()
+            if presign_cache is not None:
+                presign_cache.invalidate(bucket=target_bucket, key=file_key)
+            return True
+        except Exception as e:
+            logger.error(self._error_msg("Error deleting file from S3", e))
+            raise e
+
+    async def file_exists(self, *, file_key: str, bucket: Optional[str] = None) -> bool:
+        try:
+            target_bucket = self._resolve_bucket(bucket)
+            await self._request("HeadObject", "HEAD", bucket=target_bucket, key=file_key)
+            return True
+        except ClientError as e:
+            code = (e.response or {}).get("Error", {}).get("Code", "")
+            if code in {"404", "NoSuchKey", "NotFound"}:
+                return False
+            logger.error(self._error_msg("Error checking file existence in S3", e))
+            return False
+        except Exception as e:
+            logger.error(self._error_msg("Error checking file existence in S3", e))
+            return False
+
+    async def read_file(self, *, file_key: str, bucket: Optional[str] = None) -> bytes:
+        try:
+            target_bucket = self._resolve_bucket(bucket)
+            response = await self._request("GetObject", "GET", bucket=target_bucket, key=file_key)
+            return response.content
+        except Exception as e:
+            logger.error(self._error_msg("Error reading file from S3", e))
+            raise e
+
+    async def list_files(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None, max_keys: int = 1000, continuation_token: Optional[str] = None) -> ListFilesResult:
+        """列出对象，支持前缀过滤与分页；返回 keys/is_truncated/next_continuation_token。"""
+        try:
+            target_bucket = self._resolve_bucket(bucket)
+            if max_keys <= 0 or max_keys > 1000:
+                raise ValueError("max_keys 必须在 1 到 1000 之间")
+
+            params = {"list-type": "2", "max-keys": str(max_keys), "prefix": prefix,
+                      "continuation-token": continuation_token}
+            params = {k: v for k, v in params.items() if v is not None}
+
+            response = await self._request("ListObjectsV2", "GET", bucket=target_bucket, params=params)
+            root = ElementTree.fromstring(response.content)
+            keys: List[str] = []
+            for el in root:
+                if _local_name(el.tag) == "Contents":
+                    key = _find_text(el, "Key")
+                    if key:
+                        keys.append(key)
+            return {
+                "keys": keys,
+                "is_truncated": _find_text(root, "IsTruncated").lower() == "true",
+                "next_continuation_token": _find_text(root, "NextContinuationToken") or None,
+            }
+        except ClientError as e:
+            code = (e.response or {}).get("Error", {}).get("Code", "")
+            logger.error(self._error_msg(f"Error listing files in S3 (code={code})", e))
+            raise e
+        except Exception as e:
+            logger.error(self._error_msg("Error listing files in S3", e))
+            raise e
+
+    async def generate_presigned_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
+        """通过 S3 Proxy 生成签名 URL；与 S3SyncStorage 共用进程级签名 URL 缓存。"""
+        try:
+            sign_url_endpoint = self._sign_endpoint()
+            target_bucket = self._resolve_bucket(bucket)
+        except Exception as e:
+            logger.error(f"Error creating request for sign-url: {e}")
+            raise RuntimeError(f"创建 sign-url 请求失败: {e}")
+
+        presign_cache = get_presign_cache()
+        if presign_cache is not None:
+            cached = presign_cache.get(endpoint=sign_url_endpoint, bucket=target_bucket, key=key, expire_time=expire_time)
+            if cached is not None:
+                return cached
+            expire_time = presign_cache.sign_expire_time(expire_time)
+
+        token = await self._token()
+        if token is None:
+            e = get_workload_token_cache().last_error
+            logger.error(f"Error loading x-storage-token: {e}")
+            raise RuntimeError(f"获取 x-storage-token 失败: {e}")
+
+        signed_at = time.time()
+        try:
+            payload = {"bucket_name": target_bucket, "path": key, "expire_time": expire_time}
+            response = await self._get_client().post(sign_url_endpoint, json=payload,
+                                                      headers={"x-storage-token": token})
+            response.raise_for_status()
+            url = self._parse_sign_response(response.headers.get("Content-Type", ""), response.text)
+        except Exception as e:
+            raise RuntimeError(f"生成签名URL失败: {e}")
+        if presign_cache is not None:
+            presign_cache.put(endpoint=sign_url_endpoint, bucket=target_bucket, key=key, expire_time=expire_time,
+                              url=url, signed_at=signed_at)
+        return url
+
+    async def _multipart_upload(self, *, bucket: str, key: str, content_type: str,
+                                parts: AsyncIterator[Tuple[bytes, str]], max_concurrency: int,
+                                max_retries: int) -> None:
+        """
+        显式分片上传：parts 逐个产生 (分片数据, Content-MD5)。
+        取下一个分片前先占用窗口名额，在途与已读入内存的分片合计不超过 max_concurrency 个
+        """
+        headers = {"Content-Type": content_type} if content_type else {}
+        try:
+            response = await self._request("CreateMultipartUpload", "POST", bucket=bucket, key=key,
+                                           params={"uploads": ""}, headers=headers)
+            upload_id = _find_text(ElementTree.fromstring(response.content), "UploadId")
+        except Exception as e:
+            logger.error(self._error_msg("create_multipart_upload failed", e))
+            raise e
+
+        window = asyncio.Semaphore(max(1, max_concurrency))
+        tasks: List["asyncio.Task[Dict[str, Any]]"] = []
+        errors: List[BaseException] = []
+
+        async def upload(part_number: int, data: bytes, content_md5: str) -> Dict[str, Any]:
+            try:
+                resp = await self._request("UploadPart", "PUT", bucket=bucket, key=key,
+                                           params={"partNumber": str(part_number), "uploadId": upload_id},
+                                           headers={"Content-MD5": content_md5}, content=data,
+                                           max_retries=max_retries)
+                return {"PartNumber": part_number, "ETag": resp.headers.get("ETag", "")}
+            except BaseException as e:
+                errors.append(e)
+                raise
+            finally:
+                window.release()
+
+        try:
+            part_number = 0
+            while not errors:
+                await window.acquire()
+                try:
+                    data, content_md5 = await parts.__anext__()
+                except StopAsyncIteration:
+                    window.release()
+                    break
+                except BaseException:
+                    window.release()
+                    raise
+                part_number += 1
+                tasks.append(asyncio.create_task(upload(part_number, data, content_md5)))
+            completed = await asyncio.gather(*tasks)
+
+            # 完成分片
+            body = "".join(f"<Part><PartNumber>{part['PartNumber']}</PartNumber><ETag>{escape(part['ETag'])}</ETag></Part>"
+                           for part in completed)
+            response = await self._request(
+                "CompleteMultipartUpload", "POST", bucket=bucket, key=key, params={"uploadId": upload_id},
+                headers={"Content-Type": "application/xml"},
+                content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode("utf-8"))
+            # 服务端可能以 200 返回错误内容
+            if response.content and _local_name(ElementTree.fromstring(response.content).tag) == "Error":
+                raise self._client_error("CompleteMultipartUpload", response)
+        except BaseException as e:
+            logger.error(self._error_msg("multipart upload failed", e))
+            # 等在途分片结束后再中止，避免中止后仍有分片写入
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._request("AbortMultipartUpload", "DELETE", bucket=bucket, key=key,
+                                    params={"uploadId": upload_id})
+            except Exception as ae:
+                logger.error(self._error_msg("abort_multipart_upload failed", ae))
+            raise e
+
+    async def stream_upload_path(
+            self,
+            *,
+            file_path: str,
+            key: Optional[str] = None,
+            content_type: str = "application/octet-stream",
+            bucket: Optional[str] = None,
+            multipart_chunksize: int = 8 * 1024 * 1024,
+            multipart_threshold: int = 8 * 1024 * 1024,
+            max_concurrency: int = 4,
+    ) -> str:
+        """流式上传（本地文件路径）
+        - 各分片在占用上传窗口后才在线程中从磁盘读取，内存占用上限为 max_concurrency × multipart_chunksize
+        - 参数与返回值同 S3SyncStorage.stream_upload_path
+        """
+        if key:
+            self._validate_file_name(key)
+        try:
+            target_bucket = self._resolve_bucket(bucket)
+            key = key or self._generate_object_key(original_name=os.path.basename(file_path))
+            size = os.path.getsize(file_path)
+            if size < multipart_threshold:
+                data, content_md5 = await asyncio.to_thread(_read_range, file_path, 0, size)
+                await self._put_object(target_bucket, key, data, content_type, content_md5)
+                return key
+
+            async def read_parts() -> AsyncIterator[Tuple[bytes, str]]:
+                for offset in range(0, size, multipart_chunksize):
+                    yield await asyncio.to_thread(_read_range, file_path, offset, multipart_chunksize)
+
+            await self._multipart_upload(bucket=target_bucket, key=key, content_type=content_type,
+                                         parts=read_parts(), max_concurrency=max_concurrency,
+                                         max_retries=self.max_retries)
+            return key
+        except Exception as e:
+            logger.error(self._error_msg("Error streaming upload (path) to S3", e))
+            raise e
+
+    async def trunk_upload_file(self, *, chunk_iter: Union[AsyncIterable[bytes], Iterable[bytes]], file_name: str,
+                                content_type: str = "application/octet-stream", bucket: Optional[str] = None,
+                                part_size: int = 5 * 1024 * 1024, max_concurrency: int = 4, max_retries: int = 3) -> str:
+        """流式上传（字节迭代器，显式分片 Multipart Upload）
+        - chunk_iter: 同步或异步可迭代对象，逐块产生 bytes；内部累积到 part_size 再上传
+        - 其余参数与返回值同 S3SyncStorage.trunk_upload_file；内存占用上限为 max_concurrency × part_size
+        """
+        target_bucket = self._resolve_bucket(bucket)
+        key = self._generate_object_key(original_name=file_name)
+
+        async def cut_parts() -> AsyncIterator[Tuple[bytes, str]]:
+            pending: List[bytes] = []
+            filled = 0
+            produced = False
+            async for chunk in _aiter_chunks(chunk_iter):
+                view = memoryview(chunk).cast("B")
+                offset = 0
+                while offset < len(view):
+                    n = min(part_size - filled, len(view) - offset)
+                    whole = offset == 0 and n == len(view) and isinstance(chunk, bytes)
+                    pending.append(chunk if whole else view[offset:offset + n].tobytes())
+                    filled += n
+                    offset += n
+                    if filled == part_size:
+                        data = b"".join(pending)
+                        pending, filled, produced = [], 0, True
+                        yield data, await asyncio.to_thread(_content_md5, data)
+            # 最后不足 part_size 的余量（没有任何数据时上传一个空分片）
+            if filled or not produced:
+                data = b"".join(pending)
+                yield data, await asyncio.to_thread(_content_md5, data)
+
+        await self._multipart_upload(bucket=target_bucket, key=key, content_type=content_type, parts=cut_parts(),
+                                     max_concurrency=max_concurrency, max_retries=max_retries)
+        return key
+
+
+_async_storages: Dict[Tuple[str, str, str], S3AsyncStorage] = {}
+_async_storages_lock = threading.Lock()
+
+
+def get_s3_async_storage(*, bucket_name: Optional[str] = None, endpoint_url: Optional[str] = None,
+                         region: str = "cn-beijing") -> S3AsyncStorage:
+    """进程内共享的 S3AsyncStorage，复用规则同 get_s3_storage"""
+    endpoint_url = endpoint_url or os.getenv("COZE_BUCKET_ENDPOINT_URL") or ""
+    bucket_name = bucket_name or os.getenv("COZE_BUCKET_NAME") or ""
+    key = (endpoint_url, bucket_name, region)
+    storage = _async_storages.get(key)
+    if storage is None:
+        with _async_storages_lock:
+            storage = _async_storages.get(key)
+            if storage is None:
+                storage = S3AsyncStorage(endpoint_url=endpoint_url, access_key="", secret_key="",
+                                         bucket_name=bucket_name, region=region)
+                _async_storages[key] = storage
+    get_workload_token_cache().start()
+    return storage
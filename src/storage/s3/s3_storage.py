@@ -1,18 +1,32 @@
+import io
 import os
+import json
 import re
+import time
+import queue
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Any, Dict, List, TypedDict, Iterable
+from typing import Optional, Any, Dict, List, Tuple, TypedDict, Iterable
 from uuid import uuid4
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from boto3.s3.transfer import TransferConfig
+from storage.cache.presign_cache import get_presign_cache
+from storage.s3.token_cache import get_workload_token_cache
 import logging
 logger = logging.getLogger(__name__)
 
 # 允许的文件名字符集（面向用户输入的约束）
 FILE_NAME_ALLOWED_RE = re.compile(r"^[A-Za-z0-9._\-/]+$")
 
+# 每个 boto3 客户端的连接池大小，需不小于并发分片上传数之和
+STORAGE_MAX_POOL_CONNECTIONS = int(os.getenv("STORAGE_MAX_POOL_CONNECTIONS", "32"))
+
 
 class ListFilesResult(TypedDict):
     # list_files 的返回结构类型
@@ -20,8 +34,8 @@ class ListFilesResult(TypedDict):
     is_truncated: bool
     next_continuation_token: Optional[str]
 
-class S3SyncStorage:
-    """S3兼容存储实现"""
+class S3StorageBase:
+    """S3 兼容存储的公共部分：配置、对象命名与校验、错误信息；同步与异步实现共用"""
 
     def __init__(self, *, endpoint_url: Optional[str] = None, access_key: str, secret_key: str, bucket_name: str, region: str = "cn-beijing"):
         self.endpoint_url = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or endpoint_url or ''
@@ -29,59 +43,28 @@ class S3SyncStorage:
         self.secret_key = secret_key
         self.bucket_name = bucket_name
         self.region = region
-        self._client = None
-
-    def _get_client(self):
-        if self._client is None:
-            endpoint = self.endpoint_url
-            if endpoint is None or endpoint == "":
-                try:
-                    from coze_workload_identity import Client as CozeEnvClient
-                    coze_env_client = CozeEnvClient()
-                    env_vars = coze_env_client.get_project_env_vars()
-                    coze_env_client.close()
-                    for env_var in env_vars:
-                        if env_var.key == "COZE_BUCKET_ENDPOINT_URL":
-                            endpoint = env_var.value.replace("'", "'\\''")
-                            self.endpoint_url = endpoint
-                            break
-                except Exception as e:
-                    logger.error(f"Error loading COZE_BUCKET_ENDPOINT_URL: {e}")
-                    # 保持向下校验逻辑，避免在此处中断
-            if endpoint is None or endpoint == "":
-                logger.error("未配置存储端点：请设置endpoint_url")
-                raise ValueError("未配置存储端点：请设置endpoint_url")
 
-            client = boto3.client(
-                "s3",
-                endpoint_url=endpoint,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                region_name=self.region,
-            )
-
-            # 注册 before-call 钩子，发送前注入 x-storage-token 头
-            def _inject_header(**kwargs):
-                try:
-                    from coze_workload_identity import Client as CozeClient
-                    coze_client = CozeClient()
-                    try:
-                        token = coze_client.get_access_token()
-                    except Exception as e:
-                        logger.error("Error loading COZE_WORKLOAD_IDENTITY_TOKEN: %s", e)
-                        token = None
-                        raise e
-                    finally:
-                        coze_client.close()
-                    params = kwargs.get("params", {})
-                    headers = params.setdefault("headers", {})
-                    headers["x-storage-token"] = token
-                except Exception as e:
-                    logger.error("Error loading COZE_WORKLOAD_IDENTITY_TOKEN: %s", e)
-                    pass
-            client.meta.events.register("before-call.s3", _inject_header)
-            self._client = client
-        return self._client
+    def _resolve_endpoint(self) -> str:
+        """解析存储端点：未配置时从项目环境变量读取（会请求 workload identity 服务）"""
+        endpoint = self.endpoint_url
+        if endpoint is None or endpoint == "":
+            try:
+                from coze_workload_identity import Client as CozeEnvClient
+                coze_env_client = CozeEnvClient()
+                env_vars = coze_env_client.get_project_env_vars()
+                coze_env_client.close()
+                for env_var in env_vars:
+                    if env_var.key == "COZE_BUCKET_ENDPOINT_URL":
+                        endpoint = env_var.value.replace("'", "'\\''")
+                        self.endpoint_url = endpoint
+                        break
+            except Exception as e:
+                logger.error(f"Error loading COZE_BUCKET_ENDPOINT_URL: {e}")
+                # 保持向下校验逻辑，避免在此处中断
+        if endpoint is None or endpoint == "":
+            logger.error("未配置存储端点：请设置endpoint_url")
+            raise ValueError("未配置存储端点：请设置endpoint_url")
+        return endpoint
 
     def _generate_object_key(self, *, original_name: str) -> str:
         suffix = Path(original_name).suffix.lower()
@@ -139,6 +122,69 @@ class S3SyncStorage:
             example = bad[0] if bad else "非法字符"
             raise ValueError(msg + f"（原因：包含非法字符，例如：{example}）")
 
+    def _sign_endpoint(self) -> str:
+        sign_base = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or self.endpoint_url
+        if not sign_base:
+            raise ValueError("未配置签名端点：请设置 COZE_BUCKET_ENDPOINT_URL 或传入 endpoint_url")
+        return sign_base.rstrip("/") + "/sign-url"
+
+    def _parse_sign_response(self, content_type: str, text: str) -> str:
+        """解析 sign-url 服务的响应，取出签名 URL"""
+        if "application/json" in content_type or text.strip().startswith("{"):
+            try:
+                obj = json.loads(text)
+            except Exception:
+                return text
+            data = obj.get("data")
+            if isinstance(data, dict) and "url" in data:
+                return data["url"]
+            url_value = obj.get("url") or obj.get("signed_url") or obj.get("presigned_url")
+            if url_value:
+                return url_value
+            raise ValueError("签名服务返回缺少 data.url/url 字段")
+        return text
+
+
+class S3SyncStorage(S3StorageBase):
+    """S3兼容存储实现"""
+
+    def __init__(self, *, endpoint_url: Optional[str] = None, access_key: str, secret_key: str, bucket_name: str, region: str = "cn-beijing"):
+        super().__init__(endpoint_url=endpoint_url, access_key=access_key, secret_key=secret_key,
+                         bucket_name=bucket_name, region=region)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is not None:
+            return self._client
+        with self._client_lock:
+            if self._client is not None:
+                return self._client
+            endpoint = self._resolve_endpoint()
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region,
+                config=Config(max_pool_connections=STORAGE_MAX_POOL_CONNECTIONS),
+            )
+
+            # 注册 before-call 钩子，发送前注入 x-storage-token 头（令牌由进程级缓存在后台刷新，这里只读内存）
+            get_workload_token_cache().start()
+
+            def _inject_header(**kwargs):
+                token = get_workload_token_cache().get()
+                if token is None:
+                    return
+                params = kwargs.get("params", {})
+                headers = params.setdefault("headers", {})
+                headers["x-storage-token"] = token
+            client.meta.events.register("before-call.s3", _inject_header)
+            self._client = client
+        return self._client
+
     def upload_file(self, *, file_content: bytes, file_name: str, content_type: str = "application/octet-stream", bucket: Optional[str] = None) -> str:
         # 先对输入文件名做规范校验，避免生成无效对象 key
         self._validate_file_name(file_name)
@@ -157,6 +203,9 @@ class S3SyncStorage:
             client = self._get_client()
             target_bucket = self._resolve_bucket(bucket)
             client.delete_object(Bucket=target_bucket, Key=file_key)
+            presign_cache = get_presign_cache()
+            if presign_cache is not None:
+                presign_cache.invalidate(bucket=target_bucket, key=file_key)
             return True
         except Exception as e:
             logger.error(self._error_msg("Error deleting file from S3", e))
@@ -231,35 +280,33 @@ class S3SyncStorage:
             raise e
 
     def generate_presigned_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
-        """通过 S3 Proxy 生成签名 URL。"""
-        import json
+        """通过 S3 Proxy 生成签名 URL；剩余有效期充足的已签名 URL 直接从进程级缓存返回，不请求签名服务。"""
         import urllib.request as urllib_request
         try:
-            from coze_workload_identity import Client as CozeClient
-            coze_client = CozeClient()
-            try:
-                token = coze_client.get_access_token()
-            finally:
-                try:
-                    coze_client.close()
-                except Exception:
-                    # 资源释放失败不影响后续流程
-                    pass
+            sign_url_endpoint = self._sign_endpoint()
+            target_bucket = self._resolve_bucket(bucket)
         except Exception as e:
+            logger.error(f"Error creating request for sign-url: {e}")
+            raise RuntimeError(f"创建 sign-url 请求失败: {e}")
+
+        presign_cache = get_presign_cache()
+        if presign_cache is not None:
+            cached = presign_cache.get(endpoint=sign_url_endpoint, bucket=target_bucket, key=key, expire_time=expire_time)
+            if cached is not None:
+                return cached
+            expire_time = presign_cache.sign_expire_time(expire_time)
+
+        token_cache = get_workload_token_cache()
+        token = token_cache.get()
+        if token is None:
+            e = token_cache.last_error
             logger.error(f"Error loading x-storage-token: {e}")
             raise RuntimeError(f"获取 x-storage-token 失败: {e}")
         try:
-            sign_base = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or self.endpoint_url
-            if not sign_base:
-                raise ValueError("未配置签名端点：请设置 COZE_BUCKET_ENDPOINT_URL 或传入 endpoint_url")
-            sign_url_endpoint = sign_base.rstrip("/") + "/sign-url"
-
             headers = {
                 "Content-Type": "application/json",
                 "x-storage-token": token,
             }
-
-            target_bucket = self._resolve_bucket(bucket)
             payload = {"bucket_name": target_bucket, "path": key, "expire_time": expire_time}
             data = json.dumps(payload).encode("utf-8")
             request = urllib_request.Request(sign_url_endpoint, data=data, headers=headers, method="POST")
@@ -267,26 +314,19 @@ class S3SyncStorage:
             logger.error(f"Error creating request for sign-url: {e}")
             raise RuntimeError(f"创建 sign-url 请求失败: {e}")
 
+        signed_at = time.time()
         try:
             with urllib_request.urlopen(request) as resp:
                 resp_bytes = resp.read()
                 content_type = resp.headers.get("Content-Type", "")
                 text = resp_bytes.decode("utf-8", errors="replace")
-                if "application/json" in content_type or text.strip().startswith("{"):
-                    try:
-                        obj = json.loads(text)
-                    except Exception:
-                        return text
-                    data = obj.get("data")
-                    if isinstance(data, dict) and "url" in data:
-                        return data["url"]
-                    url_value = obj.get("url") or obj.get("signed_url") or obj.get("presigned_url")
-                    if url_value:
-                        return url_value
-                    raise ValueError("签名服务返回缺少 data.url/url 字段")
-                return text
+                url = self._parse_sign_response(content_type, text)
         except Exception as e:
             raise RuntimeError(f"生成签名URL失败: {e}")
+        if presign_cache is not None:
+            presign_cache.put(endpoint=sign_url_endpoint, bucket=target_bucket, key=key, expire_time=expire_time,
+                              url=url, signed_at=signed_at)
+        return url
 
     def stream_upload_file(
             self,
@@ -331,6 +371,44 @@ class S3SyncStorage:
             logger.error(self._error_msg("Error streaming upload (fileobj) to S3", e))
             raise e
 
+    def stream_upload_path(
+            self,
+            *,
+            file_path: str,
+            key: Optional[str] = None,
+            content_type: str = "application/octet-stream",
+            bucket: Optional[str] = None,
+            multipart_chunksize: int = 8 * 1024 * 1024,
+            multipart_threshold: int = 8 * 1024 * 1024,
+            max_concurrency: int = 4,
+    ) -> str:
+        """流式上传（本地文件路径）
+        - 与 stream_upload_file 相比，各分片上传时才从磁盘按需读取，不在内存中缓冲分片，适合大文件
+        - file_path: 本地文件路径
+        - key: 指定对象 key；为空时按文件名生成唯一 key
+        - multipart_chunksize / multipart_threshold: 分片大小与触发分片上传的阈值（默认 8MB）
+        - max_concurrency: 并发分片上传的并发数（默认 4）
+        返回：最终写入的对象 key
+        """
+        if key:
+            self._validate_file_name(key)
+        try:
+            client = self._get_client()
+            target_bucket = self._resolve_bucket(bucket)
+            key = key or self._generate_object_key(original_name=os.path.basename(file_path))
+            extra_args = {"ContentType": content_type} if content_type else {}
+            config = TransferConfig(
+                multipart_chunksize=multipart_chunksize,
+                multipart_threshold=multipart_threshold,
+                max_concurrency=max(1, max_concurrency),
+                use_threads=max_concurrency > 1,
+            )
+            client.upload_file(Filename=file_path, Bucket=target_bucket, Key=key, ExtraArgs=extra_args, Config=config)
+            return key
+        except Exception as e:
+            logger.error(self._error_msg("Error streaming upload (path) to S3", e))
+            raise e
+
     def upload_from_url(
             self,
             *,
@@ -362,20 +440,39 @@ class S3SyncStorage:
             logger.error(self._error_msg("Error uploading from URL to S3", e))
             raise e
 
+    def _upload_part(self, client, *, bucket: str, key: str, upload_id: str, part_number: int, view: memoryview,
+                     max_retries: int) -> Dict[str, Any]:
+        """上传单个分片：附带 Content-MD5 由服务端校验，失败时按分片重试"""
+        content_md5 = base64.b64encode(hashlib.md5(view).digest()).decode("ascii")
+        for attempt in range(max_retries + 1):
+            try:
+                resp = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                          Body=_PartReader(view), ContentLength=len(view), ContentMD5=content_md5)
+                return {"PartNumber": part_number, "ETag": resp["ETag"]}
+            except (ClientError, BotoCoreError) as e:
+                if attempt >= max_retries:
+                    raise
+                logger.warning(self._error_msg(f"upload_part {part_number} failed, retry {attempt + 1}/{max_retries}", e))
+                time.sleep(min(0.5 * (2 ** attempt), 8.0))
+        raise RuntimeError("unreachable")
+
     def trunk_upload_file(self, *, chunk_iter: Iterable[bytes], file_name: str,
                            content_type: str = "application/octet-stream", bucket: Optional[str] = None,
-                           part_size: int = 5 * 1024 * 1024) -> str:
+                           part_size: int = 5 * 1024 * 1024, max_concurrency: int = 4, max_retries: int = 3) -> str:
         """流式上传（字节迭代器，显式分片 Multipart Upload）
         - chunk_iter: 可迭代对象，逐块产生 bytes；每块大小可变（内部累积到 part_size 再上传），最后一块可小于 5MB
         - file_name: 原始文件名，用于生成唯一 key
         - content_type: MIME 类型
         - bucket: 目标桶；为空时取环境或实例默认值
         - part_size: 每个 part 的最小大小（除最后一个）；默认 5MB
+        - max_concurrency: 同时上传的分片数（默认 4）；分片缓冲区循环复用，内存占用上限为 max_concurrency × part_size
+        - max_retries: 单个分片失败后的重试次数（默认 3）
         返回：最终写入的对象 key
         """
         client = self._get_client()
         target_bucket = self._resolve_bucket(bucket)
         key = self._generate_object_key(original_name=file_name)
+        window = max(1, max_concurrency)
 
         # 初始化分片上传
         try:
@@ -385,27 +482,64 @@ class S3SyncStorage:
             logger.error(self._error_msg("create_multipart_upload failed", e))
             raise e
 
-        parts = []
-        part_number = 1
-        buffer = bytearray()
+        # 空闲缓冲区队列兼作在途窗口：窗口内的缓冲区都在上传时，生产者阻塞等待归还
+        free_buffers: "queue.Queue[bytearray]" = queue.Queue()
+        allocated = 0
+        futures = []
+        errors: List[BaseException] = []
+
+        def take_buffer() -> bytearray:
+            nonlocal allocated
+            if allocated < window and free_buffers.empty():
+                allocated += 1
+                return bytearray(part_size)
+            return free_buffers.get()
+
+        def upload(buffer: bytearray, size: int, part_number: int) -> Dict[str, Any]:
+            try:
+                return self._upload_part(client, bucket=target_bucket, key=key, upload_id=upload_id,
+                                         part_number=part_number, view=memoryview(buffer)[:size],
+                                         max_retries=max_retries)
+            except BaseException as e:
+                errors.append(e)
+                raise
+            finally:
+                free_buffers.put(buffer)
+
+        executor = ThreadPoolExecutor(max_workers=window)
         try:
+            buffer: Optional[bytearray] = None
+            filled = 0
+            part_number = 1
             for chunk in chunk_iter:
                 if not chunk:
                     continue
-                buffer.extend(chunk)
-                while len(buffer) >= part_size:
-                    data = bytes(buffer[:part_size])
-                    buffer = buffer[part_size:]
-                    resp = client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
-                                              Body=data)
-                    parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
-                    part_number += 1
-
-            # 上传最后不足 part_size 的余量
-            if len(buffer) > 0:
-                resp = client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
-                                          Body=bytes(buffer))
-                parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+                data = memoryview(chunk).cast("B")
+                offset = 0
+                while offset < len(data):
+                    if buffer is None:
+                        buffer = take_buffer()
+                        filled = 0
+                    # 直接拷入分片缓冲区，不产生余量拷贝
+                    n = min(part_size - filled, len(data) - offset)
+                    buffer[filled:filled + n] = data[offset:offset + n]
+                    filled += n
+                    offset += n
+                    if filled == part_size:
+                        futures.append(executor.submit(upload, buffer, filled, part_number))
+                        part_number += 1
+                        buffer = None
+                    if errors:
+                        raise errors[0]
+
+            # 上传最后不足 part_size 的余量（没有任何数据时上传一个空分片）
+            if buffer is not None or part_number == 1:
+                if buffer is None:
+                    buffer = take_buffer()
+                    filled = 0
+                futures.append(executor.submit(upload, buffer, filled, part_number))
+
+            parts = [future.result() for future in futures]
 
             # 完成分片
             client.complete_multipart_upload(
@@ -417,8 +551,87 @@ class S3SyncStorage:
             return key
         except Exception as e:
             logger.error(self._error_msg("multipart upload failed", e))
+            # 等在途分片结束后再中止，避免中止后仍有分片写入
+            executor.shutdown(wait=True, cancel_futures=True)
             try:
                 client.abort_multipart_upload(Bucket=target_bucket, Key=key, UploadId=upload_id)
             except Exception as ae:
                 logger.error(self._error_msg("abort_multipart_upload failed", ae))
             raise e
+        finally:
+            executor.shutdown(wait=True)
+
+
+class _PartReader(io.RawIOBase):
+    """以只读文件对象的形式包装分片的 memoryview，上传时不复制分片数据；可 seek 以便重试和计算校验和"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+
+_storages: Dict[Tuple[str, str, str], S3SyncStorage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_s3_storage(*, bucket_name: Optional[str] = None, endpoint_url: Optional[str] = None,
+                   region: str = "cn-beijing") -> S3SyncStorage:
+    """
+    进程内共享的 S3SyncStorage：按 (endpoint, bucket, region) 复用 boto3 客户端与连接池，
+    bucket_name / endpoint_url 为空时取 COZE_BUCKET_NAME / COZE_BUCKET_ENDPOINT_URL；同时预热访问令牌
+    """
+    endpoint_url = endpoint_url or os.getenv("COZE_BUCKET_ENDPOINT_URL") or ""
+    bucket_name = bucket_name or os.getenv("COZE_BUCKET_NAME") or ""
+    key = (endpoint_url, bucket_name, region)
+    storage = _storages.get(key)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(key)
+            if storage is None:
+                storage = S3SyncStorage(endpoint_url=endpoint_url, access_key="", secret_key="",
+                                        bucket_name=bucket_name, region=region)
+                _storages[key] = storage
+    get_workload_token_cache().start()
+    return storage
+
+
+def storage_stats() -> Dict[str, Any]:
+    presign_cache = get_presign_cache()
+    return {
+        "clients": sum(1 for storage in list(_storages.values()) if storage._client is not None),
+        "max_pool_connections": STORAGE_MAX_POOL_CONNECTIONS,
+        "token": get_workload_token_cache().stats(),
+        "presign_cache": presign_cache.stats() if presign_cache is not None else None,
+    }
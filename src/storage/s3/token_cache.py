@@ -0,0 +1,146 @@
+"""
+workload identity 访问令牌的进程级缓存：
+- 复用同一个 coze_workload_identity.Client，不再每次 S3 调用都新建客户端
+- 后台线程定期刷新，请求路径只读内存中的令牌，不等待令牌获取（进程内首次获取除外）
+SDK 在令牌到期前 60 秒即视其过期并重新获取，刷新间隔小于这段缓冲即可保证读到的令牌始终有效。
+"""
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+STORAGE_TOKEN_REFRESH_SECONDS = float(os.getenv("STORAGE_TOKEN_REFRESH_SECONDS", "30"))
+# 进程内还没有令牌时，请求路径最多等待首次获取的时间
+STORAGE_TOKEN_FIRST_WAIT_SECONDS = float(os.getenv("STORAGE_TOKEN_FIRST_WAIT_SECONDS", "10"))
+
+
+def _default_client_factory():
+    from coze_workload_identity import Client as CozeClient
+    return CozeClient()
+
+
+class WorkloadTokenCache:
+    def __init__(self, *, refresh_seconds: float = STORAGE_TOKEN_REFRESH_SECONDS,
+                 first_wait_seconds: float = STORAGE_TOKEN_FIRST_WAIT_SECONDS,
+                 client_factory: Optional[Callable[[], Any]] = None):
+        self._refresh_seconds = refresh_seconds
+        self._first_wait_seconds = first_wait_seconds
+        self._client_factory = client_factory or _default_client_factory
+        self._client = None
+        self._token: Optional[str] = None
+        self._fetched_at = 0.0
+        self._error: Optional[Exception] = None
+        # 客户端无法创建（如缺少环境变量）时不再重试
+        self._unavailable = False
+        self._first_attempt = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._refreshes = 0
+        self._failures = 0
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        return self._error
+
+    def start(self) -> None:
+        """启动后台刷新（幂等），不等待首次获取完成"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="workload-token-refresh", daemon=True)
+                self._thread.start()
+
+    def get(self) -> Optional[str]:
+        """返回当前令牌；无法获取时返回 None"""
+        token = self._token
+        if token is not None:
+            return token
+        self.start()
+        self._first_attempt.wait(self._first_wait_seconds)
+        return self._token
+
+    @property
+    def attempted(self) -> bool:
+        """进程内首次获取是否已完成（无论成功与否）"""
+        return self._first_attempt.is_set()
+
+    def peek(self) -> Optional[str]:
+        """只读当前令牌，不等待首次获取（异步调用方在事件循环中使用）"""
+        return self._token
+
+    def close(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        while not self._unavailable:
+            self._refresh()
+            if self._stop.wait(self._refresh_seconds):
+                return
+
+    def _refresh(self) -> None:
+        try:
+            if self._client is None:
+                try:
+                    self._client = self._client_factory()
+                except Exception as e:
+                    self._unavailable = True
+                    self._error = e
+                    logger.error("Error loading COZE_WORKLOAD_IDENTITY_TOKEN: %s", e)
+                    return
+            token = self._client.get_access_token()
+            if token != self._token:
+                self._refreshes += 1
+                self._fetched_at = time.time()
+            self._token = token
+            self._error = None
+        except Exception as e:
+            # 刷新失败时继续使用旧令牌，下个周期重试
+            self._failures += 1
+            self._error = e
+            logger.error("Error refreshing COZE_WORKLOAD_IDENTITY_TOKEN: %s", e)
+        finally:
+            self._first_attempt.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self._token is not None,
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "token_age_seconds": round(time.time() - self._fetched_at, 1) if self._fetched_at else None,
+            "last_error": str(self._error) if self._error else "",
+        }
+
+
+_token_cache: Optional[WorkloadTokenCache] = None
+_token_cache_lock = threading.Lock()
+
+
+def get_workload_token_cache() -> WorkloadTokenCache:
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = WorkloadTokenCache()
+    return _token_cache
+
+
+def set_workload_token_cache(cache: Optional[WorkloadTokenCache]) -> None:
+    """替换进程级令牌缓存（测试或自定义刷新策略时使用）"""
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is not None and _token_cache is not cache:
+            _token_cache.close()
+        _token_cache = cache
@@ -0,0 +1,672 @@
+"""
+C 声明静态解析：扫描头文件/源文件中的顶层语句，提取函数原型、函数定义、宏、
+struct/enum/union、typedef 及其前置文档注释，生成结构化的符号表。
+不做完整的 C 语法分析，目标是在常见嵌入式组件代码上稳定、可复现。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.code.source_index import KIND_HEADER, KIND_SOURCE, SourceIndex
+
+SYMBOL_FUNCTION = "function"
+SYMBOL_MACRO = "macro"
+SYMBOL_STRUCT = "struct"
+SYMBOL_ENUM = "enum"
+SYMBOL_UNION = "union"
+SYMBOL_TYPEDEF = "typedef"
+SYMBOL_VARIABLE = "variable"
+
+TYPE_SYMBOL_KINDS = (SYMBOL_STRUCT, SYMBOL_ENUM, SYMBOL_UNION, SYMBOL_TYPEDEF)
+
+C_KEYWORDS = {
+    'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default', 'return', 'break', 'continue',
+    'goto', 'sizeof', 'typedef', 'struct', 'enum', 'union', 'static', 'extern', 'const', 'volatile',
+    'inline', 'register', 'auto', 'signed', 'unsigned', 'void', 'char', 'short', 'int', 'long',
+    'float', 'double', '_Bool', 'bool', 'restrict', '__inline', '__inline__', '_Alignof', 'alignof',
+    'defined', '__attribute__', '__typeof__', 'typeof', '_Static_assert', 'static_assert',
+}
+
+# 签名中最多保留的字符数，避免超长结构体定义撑爆提示词
+MAX_SIGNATURE_CHARS = 2000
+
+_IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+_ATTRIBUTE_RE = re.compile(r'__attribute__\s*\(\((?:[^()]|\([^()]*\))*\)\)')
+_TRANSPARENT_BLOCK_RE = re.compile(r'^(extern\s*"C(\+\+)?"|namespace(\s+[A-Za-z_][\w:]*)?)\s*$')
+_DEFINE_RE = re.compile(r'^#\s*define\s+([A-Za-z_]\w*)(\([^)]*\))?\s*(.*)$', re.S)
+_CALL_RE = re.compile(r'\b([A-Za-z_]\w*)\s*\(')
+_INCLUDE_GUARD_RE = re.compile(r'^_*[A-Z0-9_]+_(H|HPP|H_|HPP_|INCLUDED|INCLUDED_)_*$')
+_POINTER_DECLARATOR_RE = re.compile(r'^\*\s*(?:const\s+)?([A-Za-z_][\w:~]*)$')
+_FORWARD_DECLARATION_RE = re.compile(r'^(struct|union|enum)\s+([A-Za-z_]\w*)$')
+
+
+@dataclass(frozen=True)
+class CStatement:
+    """顶层语句：head 为去掉注释后的声明文本，body 为函数体/结构体体（不含外层花括号）"""
+    head: str
+    body: Optional[str]
+    line: int
+    body_line: int = 0
+    doc: str = ""
+    tail: str = ""  # 结构体体之后、分号之前的文本（typedef 名称、变量名）
+
+
+@dataclass(frozen=True)
+class CMacro:
+    name: str
+    params: Optional[str]
+    value: str
+    line: int
+    doc: str = ""
+
+
+@dataclass(frozen=True)
+class CSymbol:
+    """符号表条目"""
+    kind: str
+    name: str
+    signature: str
+    file: str
+    line: int
+    doc: str = ""
+    return_type: str = ""
+    params: Tuple[str, ...] = ()
+    is_definition: bool = False
+    is_static: bool = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "signature": self.signature,
+            "file": self.file,
+            "line": self.line,
+            "doc": self.doc,
+            "return_type": self.return_type,
+            "params": list(self.params),
+        }
+
+
+def _clean_comment(raw: str) -> str:
+    """去掉注释标记，保留注释正文"""
+    if raw.startswith('//'):
+        return raw[2:].lstrip('/!<').strip()
+    text = raw[2:-2] if raw.endswith('*/') else raw[2:]
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line.startswith('*'):
+            line = line[1:].strip()
+        lines.append(line)
+    return '\n'.join(l for l in lines if l and set(l) != {'*'}).lstrip('!<').strip()
+
+
+def normalize_whitespace(text: str) -> str:
+    return ' '.join(text.split())
+
+
+class _Scanner:
+    """逐字符扫描 C 源码，切分顶层语句和预处理指令"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.statements: List[CStatement] = []
+        self.macros: List[CMacro] = []
+
+    def scan(self) -> "_Scanner":
+        text = self.text
+        n = len(text)
+        i = 0
+        line = 1
+        depth = 0
+        block_stack: List[bool] = []  # True 表示 extern "C" / namespace 等透明块
+
+        head_buf: List[str] = []
+        body_buf: List[str] = []
+        tail_buf: List[str] = []
+        stmt_line = 0
+        body_line = 0
+        body_depth = 0  # 进入语句体时的深度
+        in_body = False
+        after_body = False
+
+        doc_parts: List[str] = []
+        doc_end_line = -10
+        stmt_doc = ""
+        last_stmt_end_line = -1
+        at_line_start = True
+
+        def current_buf() -> List[str]:
+            if in_body:
+                return body_buf
+            if after_body:
+                return tail_buf
+            return head_buf
+
+        def emit(body: Optional[str]):
+            nonlocal head_buf, body_buf, tail_buf, stmt_line, body_line, stmt_doc, in_body, after_body
+            nonlocal last_stmt_end_line
+            head = normalize_whitespace(''.join(head_buf))
+            if head or body is not None:
+                self.statements.append(CStatement(
+                    head=head,
+                    body=body,
+                    line=stmt_line,
+                    body_line=body_line,
+                    doc=stmt_doc,
+                    tail=normalize_whitespace(''.join(tail_buf)),
+                ))
+            head_buf, body_buf, tail_buf = [], [], []
+            stmt_line = 0
+            body_line = 0
+            stmt_doc = ""
+            in_body = False
+            after_body = False
+            last_stmt_end_line = line
+
+        while i < n:
+            c = text[i]
+
+            # 注释
+            if c == '/' and i + 1 < n and text[i + 1] in '/*':
+                if text[i + 1] == '/':
+                    end = text.find('\n', i)
+                    end = n if end == -1 else end
+                else:
+                    end = text.find('*/', i + 2)
+                    end = n if end == -1 else end + 2
+                raw = text[i:end]
+                comment_line = line
+                line += raw.count('\n')
+                if depth == 0 and not stmt_line:
+                    cleaned = _clean_comment(raw)
+                    if comment_line == last_stmt_end_line and self.statements and not self.statements[-1].doc:
+                        # 行尾注释：归属到同一行刚结束的声明
+                        last = self.statements[-1]
+                        self.statements[-1] = CStatement(last.head, last.body, last.line, last.body_line,
+                                                         cleaned, last.tail)
+                    else:
+                        if comment_line > doc_end_line + 1:
+                            doc_parts = []
+                        if cleaned:
+                            doc_parts.append(cleaned)
+                        doc_end_line = line
+                else:
+                    current_buf().append(' ')
+                i = end
+                continue
+
+            # 预处理指令（仅在行首）
+            if c == '#' and at_line_start:
+                j = i
+                parts = []
+                while True:
+                    end = text.find('\n', j)
+                    end = n if end == -1 else end
+                    segment = text[j:end]
+                    parts.append(segment.rstrip('\\'))
+                    if segment.endswith('\\') and end < n:
+                        line += 1
+                        j = end + 1
+                        continue
+                    break
+                directive = re.sub(r'/\*.*?\*/|//.*$', '', '\n'.join(parts), flags=re.S | re.M)
+                m = _DEFINE_RE.match(directive.strip())
+                if m and depth == 0:
+                    doc = '\n'.join(doc_parts) if doc_end_line >= line - 1 else ""
+                    self.macros.append(CMacro(
+                        name=m.group(1),
+                        params=m.group(2),
+                        value=normalize_whitespace(m.group(3)),
+                        line=line,
+                        doc=doc,
+                    ))
+                    doc_parts = []
+                i = end
+                continue
+
+            # 字符串和字符常量
+            if c in '"\'':
+                j = i + 1
+                while j < n and text[j] != c:
+                    if text[j] == '\\':
+                        j += 1
+                    elif text[j] == '\n':
+                        break
+                    j += 1
+                literal = text[i:j + 1]
+                line += literal.count('\n')
+                if depth > 0 or stmt_line:
+                    current_buf().append(literal)
+                elif depth == 0:
+                    stmt_line = line
+                    stmt_doc = '\n'.join(doc_parts) if doc_end_line >= line - 1 else ""
+                    doc_parts = []
+                    head_buf.append(literal)
+                at_line_start = False
+                i = j + 1
+                continue
+
+            if c == '\n':
+                line += 1
+                at_line_start = True
+                if depth > 0 or stmt_line:
+                    current_buf().append(c)
+                i += 1
+                continue
+
+            if c.isspace():
+                if depth > 0 or stmt_line:
+                    current_buf().append(c)
+                i += 1
+                continue
+
+            at_line_start = False
+
+            if c == '{':
+                if depth == 0 and not in_body:
+                    head_text = normalize_whitespace(''.join(head_buf))
+                    if not after_body and _TRANSPARENT_BLOCK_RE.match(head_text):
+                        block_stack.append(True)
+                        head_buf = []
+                        stmt_line = 0
+                        stmt_doc = ""
+                        i += 1
+                        continue
+                    if not stmt_line:
+                        stmt_line = line
+                    block_stack.append(False)
+                    depth += 1
+                    in_body = True
+                    after_body = False
+                    body_line = line
+                    body_depth = depth
+                    i += 1
+                    continue
+                block_stack.append(False)
+                depth += 1
+                current_buf().append(c)
+                i += 1
+                continue
+
+            if c == '}':
+                transparent = block_stack.pop() if block_stack else False
+                if transparent:
+                    i += 1
+                    continue
+                depth = max(depth - 1, 0)
+                if in_body and depth == body_depth - 1:
+                    in_body = False
+                    head_text = normalize_whitespace(''.join(head_buf))
+                    if _looks_like_function_head(head_text):
+                        emit(''.join(body_buf))
+                        i += 1
+                        continue
+                    after_body = True
+                    i += 1
+                    continue
+                current_buf().append(c)
+                i += 1
+                continue
+
+            if c == ';' and depth == 0:
+                emit(''.join(body_buf) if (after_body or body_buf) else None)
+                i += 1
+                continue
+
+            if depth == 0 and not stmt_line:
+                stmt_line = line
+                stmt_doc = '\n'.join(doc_parts) if doc_end_line >= line - 1 else ""
+                doc_parts = []
+            current_buf().append(c)
+            i += 1
+
+        return self
+
+
+def _find_param_group(head: str) -> Optional[Tuple[int, int]]:
+    """返回声明末尾参数列表括号的位置 (左括号, 右括号)"""
+    s = re.sub(r'\s*(const|noexcept|override|final|throw\s*\(\s*\))\s*$', '', head).rstrip()
+    if not s.endswith(')'):
+        return None
+    level = 0
+    for pos in range(len(s) - 1, -1, -1):
+        ch = s[pos]
+        if ch == ')':
+            level += 1
+        elif ch == '(':
+            level -= 1
+            if level == 0:
+                return pos, len(s) - 1
+    return None
+
+
+def _split_function_head(head: str) -> Optional[Tuple[str, str, str]]:
+    """
+    拆分函数声明头，返回 (函数名, 返回类型, 参数文本)。
+    返回函数指针的声明 ret (*name(params))(fp_params) 的返回类型写作 ret (*)(fp_params)
+    """
+    head = _ATTRIBUTE_RE.sub('', head).strip()
+    if not head or '=' in head.split('(')[0]:
+        return None
+    group = _find_param_group(head)
+    if group is None:
+        return None
+    before = head[:group[0]].rstrip()
+    m = re.search(r'([A-Za-z_][\w:~]*)$', before)
+    if m:
+        return_type = before[:m.start()].strip()
+        if m.group(1).split('::')[-1] in C_KEYWORDS or not return_type:
+            return None
+        return m.group(1), return_type, head[group[0] + 1:group[1]]
+
+    # 返回函数指针：外层括号内为 *name(params)
+    declarator = _find_param_group(before)
+    if declarator is None:
+        return None
+    inner = before[declarator[0] + 1:declarator[1]].strip()
+    params = _find_param_group(inner)
+    if params is None:
+        return None
+    m = _POINTER_DECLARATOR_RE.match(inner[:params[0]].rstrip())
+    prefix = before[:declarator[0]].strip()
+    if not m or not prefix or m.group(1).split('::')[-1] in C_KEYWORDS:
+        return None
+    return m.group(1), f"{prefix} (*){head[group[0]:group[1] + 1]}", inner[params[0] + 1:params[1]]
+
+
+def _looks_like_function_head(head: str) -> bool:
+    return _split_function_head(head) is not None
+
+
+def split_params(params: str) -> Tuple[str, ...]:
+    """按顶层逗号拆分参数列表"""
+    params = params.strip()
+    if not params or params == 'void':
+        return ()
+    result = []
+    level = 0
+    current = []
+    for ch in params:
+        if ch in '([{':
+            level += 1
+        elif ch in ')]}':
+            level -= 1
+        if ch == ',' and level == 0:
+            result.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        result.append(''.join(current).strip())
+    return tuple(p for p in result if p)
+
+
+def parse_function_head(head: str) -> Optional[Tuple[str, str, Tuple[str, ...], bool]]:
+    """解析函数声明头，返回 (函数名, 返回类型, 参数列表, 是否static)"""
+    parts = _split_function_head(head)
+    if parts is None:
+        return None
+    name, return_type, params = parts
+    qualifiers = return_type.split()
+    is_static = 'static' in qualifiers
+    return_type = ' '.join(q for q in qualifiers if q not in ('extern', 'static', 'inline', '__inline', '__inline__'))
+    return name, return_type, split_params(params), is_static
+
+
+def function_signature(name: str, return_type: str, params: Tuple[str, ...]) -> str:
+    """由 parse_function_head 的结果还原声明；返回函数指针时把函数名和参数放回 (*) 中"""
+    args = ', '.join(params) or 'void'
+    if '(*)' in return_type:
+        return return_type.replace('(*)', f"(*{name}({args}))", 1)
+    return f"{return_type} {name}({args})"
+
+
+def _last_identifier(text: str) -> Optional[str]:
+    idents = [t for t in _IDENT_RE.findall(text) if t not in C_KEYWORDS]
+    return idents[-1] if idents else None
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= MAX_SIGNATURE_CHARS else text[:MAX_SIGNATURE_CHARS] + " ..."
+
+
+def scan_c_source(text: str) -> Tuple[List[CStatement], List[CMacro]]:
+    """扫描源码，返回顶层语句和宏定义"""
+    scanner = _Scanner(text).scan()
+    return scanner.statements, scanner.macros
+
+
+def split_declarations(text: str) -> List[str]:
+    """
+    按顶层声明切分源码原文（保留原始格式）：每段以 ; 或闭合的顶层花括号结束，
+    前置注释与预处理指令归入其后的声明，拼接全部片段可还原原文
+    """
+    segments = []
+    n = len(text)
+    i = 0
+    start = 0
+    depth = 0
+    pending_end = False  # 顶层花括号已闭合，等待可能跟随的名称和分号
+    at_line_start = True
+
+    def cut(end: int):
+        nonlocal start
+        if end > start:
+            segments.append(text[start:end])
+        start = end
+
+    while i < n:
+        c = text[i]
+        if c == '/' and i + 1 < n and text[i + 1] in '/*':
+            end = text.find('\n' if text[i + 1] == '/' else '*/', i + 2)
+            i = n if end == -1 else (end if text[i + 1] == '/' else end + 2)
+            continue
+        if c == '#' and at_line_start:
+            while True:
+                end = text.find('\n', i)
+                if end == -1:
+                    i = n
+                    break
+                i = end + 1
+                if not text[:end].endswith('\\'):
+                    break
+            continue
+        if c in '"\'':
+            j = i + 1
+            while j < n and text[j] != c and text[j] != '\n':
+                j += 2 if text[j] == '\\' else 1
+            i = j + 1
+            at_line_start = False
+            continue
+        if c == '\n':
+            at_line_start = True
+            if pending_end:
+                # 闭合花括号后换行且没有跟随分号：函数定义结束
+                pending_end = False
+                cut(i + 1)
+            i += 1
+            continue
+        if c.isspace():
+            i += 1
+            continue
+        at_line_start = False
+        if c == '{':
+            depth += 1
+            pending_end = False
+        elif c == '}':
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                pending_end = True
+        elif c == ';' and depth == 0:
+            pending_end = False
+            end = text.find('\n', i)
+            cut(n if end == -1 else end + 1)
+            i = n if end == -1 else end + 1
+            at_line_start = True
+            continue
+        i += 1
+    cut(n)
+    return segments
+
+
+def extract_symbols(text: str, file_path: str) -> List[CSymbol]:
+    """从单个文件中提取符号"""
+    statements, macros = scan_c_source(text)
+    symbols: List[CSymbol] = []
+
+    for macro in macros:
+        if not macro.params and not macro.value and _INCLUDE_GUARD_RE.match(macro.name):
+            continue  # 跳过头文件保护宏
+        signature = f"#define {macro.name}{macro.params or ''}" + (f" {macro.value}" if macro.value else "")
+        symbols.append(CSymbol(kind=SYMBOL_MACRO, name=macro.name, signature=_truncate(signature),
+                               file=file_path, line=macro.line, doc=macro.doc))
+
+    for stmt in statements:
+        head = stmt.head
+        if not head:
+            continue
+        first = head.split()[0]
+
+        if first == 'typedef':
+            if stmt.body is not None:
+                name = _last_identifier(stmt.tail) or _last_identifier(head)
+                body = normalize_whitespace(stmt.body)
+                signature = f"{head} {{ {body} }} {stmt.tail};"
+            else:
+                fp = re.search(r'\(\s*\*\s*([A-Za-z_]\w*)\s*\)', head)
+                name = fp.group(1) if fp else _last_identifier(head)
+                signature = f"{head};"
+            if name:
+                symbols.append(CSymbol(kind=SYMBOL_TYPEDEF, name=name, signature=_truncate(signature),
+                                       file=file_path, line=stmt.line, doc=stmt.doc))
+            continue
+
+        if first in (SYMBOL_STRUCT, SYMBOL_ENUM, SYMBOL_UNION) and stmt.body is not None:
+            tag = head.split()[1] if len(head.split()) > 1 else ""
+            name = tag or _last_identifier(stmt.tail)
+            if name:
+                body = normalize_whitespace(stmt.body)
+                signature = f"{head} {{ {body} }}" + (f" {stmt.tail}" if stmt.tail else "") + ";"
+                symbols.append(CSymbol(kind=first, name=name, signature=_truncate(signature),
+                                       file=file_path, line=stmt.line, doc=stmt.doc))
+            continue
+
+        forward = _FORWARD_DECLARATION_RE.match(head) if stmt.body is None else None
+        if forward:
+            # 前置声明 struct X; 是类型声明而不是变量
+            symbols.append(CSymbol(kind=forward.group(1), name=forward.group(2), signature=f"{head};",
+                                   file=file_path, line=stmt.line, doc=stmt.doc))
+            continue
+
+        parsed = parse_function_head(head)
+        if parsed is not None:
+            name, return_type, params, is_static = parsed
+            symbols.append(CSymbol(
+                kind=SYMBOL_FUNCTION,
+                name=name,
+                signature=function_signature(name, return_type, params),
+                file=file_path,
+                line=stmt.line,
+                doc=stmt.doc,
+                return_type=return_type,
+                params=params,
+                is_definition=stmt.body is not None,
+                is_static=is_static,
+            ))
+            continue
+
+        if stmt.body is None and '(' not in head.split('=')[0]:
+            name = _last_identifier(re.split(r'[=\[]', head)[0])
+            if name:
+                symbols.append(CSymbol(kind=SYMBOL_VARIABLE, name=name, signature=_truncate(f"{head};"),
+                                       file=file_path, line=stmt.line, doc=stmt.doc))
+
+    return symbols
+
+
+def is_forward_declaration(symbol: CSymbol) -> bool:
+    return symbol.kind in (SYMBOL_STRUCT, SYMBOL_ENUM, SYMBOL_UNION) and \
+        _FORWARD_DECLARATION_RE.match(symbol.signature.rstrip(';')) is not None
+
+
+@dataclass
+class SymbolTable:
+    """组件符号表：头文件中的声明 + 源文件中的函数定义位置"""
+    symbols: List[CSymbol] = field(default_factory=list)
+    definitions: Dict[str, CSymbol] = field(default_factory=dict)
+    call_examples: Dict[str, Tuple[str, int, str]] = field(default_factory=dict)  # 函数名 -> (文件, 行号, 代码行)
+
+    def functions(self) -> List[CSymbol]:
+        return [s for s in self.symbols if s.kind == SYMBOL_FUNCTION]
+
+    def types(self) -> Dict[str, CSymbol]:
+        # 同名的完整定义优先于前置声明
+        result: Dict[str, CSymbol] = {}
+        for s in self.symbols:
+            if s.kind in TYPE_SYMBOL_KINDS and (s.name not in result or not is_forward_declaration(s)):
+                result[s.name] = s
+        return result
+
+    def by_file(self) -> Dict[str, List[CSymbol]]:
+        result: Dict[str, List[CSymbol]] = {}
+        for s in self.symbols:
+            result.setdefault(s.file, []).append(s)
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            "symbols": [s.to_dict() for s in self.symbols],
+            "definitions": {name: {"file": s.file, "line": s.line} for name, s in self.definitions.items()},
+            "call_examples": {name: list(v) for name, v in self.call_examples.items()},
+        }
+
+
+def build_symbol_table(index: SourceIndex, include_third_party: bool = False) -> SymbolTable:
+    """解析索引中的头文件（按优先级）与源文件，构建符号表"""
+    table = SymbolTable()
+    headers = sorted(index.files(kinds=(KIND_HEADER,), include_third_party=include_third_party),
+                     key=lambda e: (e.priority, e.path))
+    seen_functions = set()
+    for entry in headers:
+        try:
+            text = index.read_text(entry)
+        except Exception:
+            continue
+        for symbol in extract_symbols(text, entry.path):
+            if symbol.kind == SYMBOL_FUNCTION:
+                # 同一函数可能在多个头文件中声明，保留优先级最高的一处
+                if symbol.name in seen_functions:
+                    continue
+                seen_functions.add(symbol.name)
+            table.symbols.append(symbol)
+
+    for entry in index.files(kinds=(KIND_SOURCE,), include_third_party=include_third_party):
+        try:
+            text = index.read_text(entry)
+        except Exception:
+            continue
+        for symbol in extract_symbols(text, entry.path):
+            if symbol.kind == SYMBOL_FUNCTION and symbol.is_definition:
+                table.definitions.setdefault(symbol.name, symbol)
+        _collect_call_examples(text, entry.path, seen_functions, table.call_examples)
+    return table
+
+
+def _collect_call_examples(text: str, file_path: str, names: set, examples: Dict[str, Tuple[str, int, str]]):
+    """在函数体中查找头文件函数的第一处调用，作为调用示例"""
+    statements, _ = scan_c_source(text)
+    for stmt in statements:
+        if not stmt.body or parse_function_head(stmt.head) is None:
+            continue
+        for offset, code_line in enumerate(stmt.body.split('\n')):
+            for m in _CALL_RE.finditer(code_line):
+                name = m.group(1)
+                if name in names and name not in examples:
+                    examples[name] = (file_path, stmt.body_line + offset, code_line.strip())
+
+
+def referenced_types(signature: str, types: Dict[str, CSymbol]) -> List[CSymbol]:
+    """返回签名中引用到的类型符号"""
+    return [types[ident] for ident in dict.fromkeys(_IDENT_RE.findall(signature)) if ident in types]
+
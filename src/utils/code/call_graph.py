@@ -0,0 +1,502 @@
+"""
+C 函数静态调用图：基于 c_parser 的顶层语句扫描，跨文件解析函数定义与调用点，
+识别线程入口（pthread_create 等线程创建函数的目标）、入口函数和跨模块调用，
+输出紧凑的邻接表结构，可序列化为 JSON 在节点间按路径传递。
+"""
+import os
+import re
+import json
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.code.c_parser import (
+    C_KEYWORDS,
+    SYMBOL_VARIABLE,
+    extract_symbols,
+    parse_function_head,
+    scan_c_source,
+    split_params,
+)
+from utils.code.source_index import KIND_HEADER, KIND_SOURCE, SourceIndex
+from utils.file.workspace import workspace_of, workspace_resource
+
+# 线程创建函数 -> 线程入口函数所在参数下标
+THREAD_CREATE_FUNCS = {
+    'pthread_create': 2,
+    'thrd_create': 1,
+    'CreateThread': 2,
+    '_beginthreadex': 2,
+    '_beginthread': 0,
+    'xTaskCreate': 0,
+    'xTaskCreatePinnedToCore': 0,
+    'xTaskCreateStatic': 0,
+    'tal_thread_create_and_start': 3,
+    'tkl_thread_create': 4,
+}
+# 名称中包含这些关键字的调用，若参数中引用了组件内函数，同样视为创建线程
+_THREAD_CREATE_HINT_RE = re.compile(r'(thread|task)', re.I)
+
+# 不计入外部调用的常见 C 库函数
+LIBC_FUNCS = {
+    'printf', 'fprintf', 'sprintf', 'snprintf', 'vsnprintf', 'vprintf', 'puts', 'putchar', 'perror',
+    'malloc', 'calloc', 'realloc', 'free', 'memset', 'memcpy', 'memmove', 'memcmp',
+    'strlen', 'strcpy', 'strncpy', 'strcat', 'strncat', 'strcmp', 'strncmp', 'strchr', 'strrchr', 'strstr',
+    'strdup', 'strtol', 'strtoul', 'atoi', 'atol', 'atof', 'abs', 'assert', 'exit', 'abort',
+    'fopen', 'fclose', 'fread', 'fwrite', 'fseek', 'ftell', 'fflush', 'fgets', 'fputs',
+    'sleep', 'usleep', 'time', 'clock_gettime', 'gettimeofday',
+}
+
+# 模块划分时忽略的通用目录名
+GENERIC_DIRS = {'src', 'source', 'sources', 'include', 'inc', 'lib', 'impl', 'internal', 'private', 'public'}
+
+FLAG_STATIC = "static"
+FLAG_THREAD_ENTRY = "thread"
+FLAG_THREAD_LIKE = "thread_like"  # 签名形如 void* f(void*)，但未找到创建位置
+FLAG_LOOP = "loop"  # 函数体包含循环
+
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'')
+_CALL_RE = re.compile(r'(?<![\w.>])([A-Za-z_]\w*)\s*\(')
+_IDENT_RE = re.compile(r'(?<![\w.>])([A-Za-z_]\w*)\b')
+_LOOP_RE = re.compile(r'\b(while|for)\s*\(')
+_THREAD_LIKE_RE = re.compile(r'^void\s*\*$')
+
+
+@dataclass
+class FunctionInfo:
+    """调用图中的函数节点"""
+    name: str
+    file: str
+    line: int
+    module: str
+    doc: str = ""
+    flags: List[str] = field(default_factory=list)
+
+    def to_list(self) -> list:
+        return [self.name, self.file, self.line, self.module, self.doc, self.flags]
+
+    @classmethod
+    def from_list(cls, data: list) -> "FunctionInfo":
+        return cls(*data)
+
+
+@dataclass
+class CallGraph:
+    """
+    紧凑的调用图：
+    - functions: 函数ID -> 函数信息（同名 static 函数在多个文件中定义时，ID 为 name@file）
+    - edges: 调用者ID -> 按首次调用顺序排列的被调用者ID
+    - loop_calls: 调用者ID -> 在循环体内调用的被调用者ID
+    - threads: 线程入口ID -> 创建线程的函数ID
+    - external: 调用者ID -> 调用的组件外函数名（已排除常见 C 库函数）
+    - globals: 全局变量名 -> 引用它的函数ID
+    """
+    functions: Dict[str, FunctionInfo] = field(default_factory=dict)
+    edges: Dict[str, List[str]] = field(default_factory=dict)
+    loop_calls: Dict[str, List[str]] = field(default_factory=dict)
+    threads: Dict[str, str] = field(default_factory=dict)
+    external: Dict[str, List[str]] = field(default_factory=dict)
+    globals: Dict[str, List[str]] = field(default_factory=dict)
+
+    def callers(self) -> Dict[str, List[str]]:
+        result: Dict[str, List[str]] = {}
+        for caller, callees in self.edges.items():
+            for callee in callees:
+                result.setdefault(callee, []).append(caller)
+        return result
+
+    def has_flag(self, func_id: str, flag: str) -> bool:
+        info = self.functions.get(func_id)
+        return info is not None and flag in info.flags
+
+    def entries(self) -> List[str]:
+        """入口函数：没有被组件内任何函数调用或引用的非 static 函数（线程入口除外），可达函数多的排在前面"""
+        return list(self.entry_reach())
+
+    def entry_reach(self) -> Dict[str, List[str]]:
+        """按 entries() 的顺序返回入口函数 -> 可达函数，每个入口只遍历一次"""
+        called = set(self.callers())
+        reach = {
+            fid: self.reachable(fid) for fid, info in self.functions.items()
+            if fid not in called and fid not in self.threads and FLAG_STATIC not in info.flags
+        }
+        order = sorted(reach, key=lambda fid: (self.functions[fid].name != 'main', -len(reach[fid])))
+        return {fid: reach[fid] for fid in order}
+
+    def orphans(self) -> List[str]:
+        """未被调用的 static 函数（可能通过未识别的方式注册为回调或线程）"""
+        called = set(self.callers())
+        return [
+            fid for fid, info in self.functions.items()
+            if fid not in called and fid not in self.threads and FLAG_STATIC in info.flags
+        ]
+
+    def reachable(self, start: str) -> List[str]:
+        """从 start 出发按调用顺序深度优先可达的函数（包含 start）"""
+        seen = set()
+        order = []
+        stack = [start]
+        while stack:
+            fid = stack.pop()
+            if fid in seen:
+                continue
+            seen.add(fid)
+            order.append(fid)
+            stack.extend(reversed(self.edges.get(fid, [])))
+        return order
+
+    def cross_module_edges(self) -> List[Tuple[str, str]]:
+        result = []
+        for caller, callees in self.edges.items():
+            for callee in callees:
+                if self.functions[caller].module != self.functions[callee].module:
+                    result.append((caller, callee))
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            "functions": {fid: info.to_list() for fid, info in self.functions.items()},
+            "edges": self.edges,
+            "loop_calls": self.loop_calls,
+            "threads": self.threads,
+            "external": self.external,
+            "globals": self.globals,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CallGraph":
+        return cls(
+            functions={fid: FunctionInfo.from_list(v) for fid, v in data.get("functions", {}).items()},
+            edges=data.get("edges", {}),
+            loop_calls=data.get("loop_calls", {}),
+            threads=data.get("threads", {}),
+            external=data.get("external", {}),
+            globals=data.get("globals", {}),
+        )
+
+    def save(self, graph_path: str) -> None:
+        with open(graph_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, graph_path: str) -> "CallGraph":
+        with open(graph_path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def module_of(path: str) -> str:
+    """按目录推断模块名：忽略 src/include 等通用目录，取第一个有意义的目录名，否则取文件名"""
+    parts = path.split('/')
+    for part in parts[:-1]:
+        if part.lower() not in GENERIC_DIRS:
+            return part
+    return os.path.splitext(parts[-1])[0]
+
+
+def _strip_strings(body: str) -> str:
+    return _STRING_RE.sub('""', body)
+
+
+def _loop_ranges(body: str) -> List[Tuple[int, int]]:
+    """返回 while/for 循环体（花括号）在 body 中的区间"""
+    ranges = []
+    for m in _LOOP_RE.finditer(body):
+        depth = 0
+        pos = m.end() - 1
+        # 跳过循环条件
+        while pos < len(body):
+            if body[pos] == '(':
+                depth += 1
+            elif body[pos] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+            pos += 1
+        start = body.find('{', pos)
+        if start == -1 or body[pos + 1:start].strip():
+            continue
+        depth = 0
+        for end in range(start, len(body)):
+            if body[end] == '{':
+                depth += 1
+            elif body[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    ranges.append((start, end))
+                    break
+    return ranges
+
+
+def _call_args(body: str, open_pos: int) -> Tuple[str, ...]:
+    """提取 body[open_pos] 处左括号对应调用的参数列表"""
+    depth = 0
+    for end in range(open_pos, len(body)):
+        if body[end] == '(':
+            depth += 1
+        elif body[end] == ')':
+            depth -= 1
+            if depth == 0:
+                return split_params(body[open_pos + 1:end])
+    return ()
+
+
+def _arg_identifier(arg: str) -> Optional[str]:
+    """从参数表达式（可能带取地址符或类型转换）中取出函数名"""
+    arg = re.sub(r'^\s*\((?:[^()]|\([^()]*\))*\)\s*', '', arg.strip())  # 去掉类型转换
+    arg = arg.lstrip('&* ').strip()
+    return arg if re.fullmatch(r'[A-Za-z_]\w*', arg) else None
+
+
+@dataclass
+class _Definition:
+    name: str
+    file: str
+    line: int
+    doc: str
+    is_static: bool
+    return_type: str
+    params: Tuple[str, ...]
+    body: str
+
+
+def _collect_definitions(index: SourceIndex, include_third_party: bool) -> Tuple[List[_Definition], Dict[str, str]]:
+    """收集所有函数定义与文件级全局变量（变量名 -> 所在文件）"""
+    definitions = []
+    variables: Dict[str, str] = {}
+    for entry in index.files(kinds=(KIND_SOURCE, KIND_HEADER), include_third_party=include_third_party):
+        try:
+            text = index.read_text(entry)
+        except Exception:
+            continue
+        statements, _ = scan_c_source(text)
+        for stmt in statements:
+            if stmt.body is None:
+                continue
+            parsed = parse_function_head(stmt.head)
+            if parsed is None:
+                continue
+            name, return_type, params, is_static = parsed
+            definitions.append(_Definition(
+                name=name.split('::')[-1] if '::' in name else name,
+                file=entry.path,
+                line=stmt.line,
+                doc=stmt.doc.split('\n')[0] if stmt.doc else "",
+                is_static=is_static,
+                return_type=return_type,
+                params=params,
+                body=_strip_strings(stmt.body),
+            ))
+        if entry.kind == KIND_SOURCE:
+            for symbol in extract_symbols(text, entry.path):
+                if symbol.kind == SYMBOL_VARIABLE and 'extern' not in symbol.signature.split():
+                    variables.setdefault(symbol.name, entry.path)
+    return definitions, variables
+
+
+def build_call_graph(index: SourceIndex, include_third_party: bool = False) -> CallGraph:
+    """扫描组件源码构建静态调用图"""
+    definitions, variables = _collect_definitions(index, include_third_party)
+    graph = CallGraph()
+
+    # 分配函数ID：同名定义出现在多个文件时用 name@file 区分
+    name_counts: Dict[str, int] = {}
+    for d in definitions:
+        name_counts[d.name] = name_counts.get(d.name, 0) + 1
+    ids = []
+    by_name: Dict[str, List[int]] = {}
+    for i, d in enumerate(definitions):
+        fid = d.name if name_counts[d.name] == 1 else f"{d.name}@{d.file}"
+        if fid in graph.functions:
+            ids.append(fid)  # 同一文件内重复定义（条件编译分支），合并为一个节点
+            continue
+        ids.append(fid)
+        by_name.setdefault(d.name, []).append(i)
+        flags = []
+        if d.is_static:
+            flags.append(FLAG_STATIC)
+        if _THREAD_LIKE_RE.match(d.return_type) and len(d.params) == 1 and _THREAD_LIKE_RE.match(
+                re.sub(r'\s*\b[A-Za-z_]\w*$', '', d.params[0]) or ''):
+            flags.append(FLAG_THREAD_LIKE)
+        graph.functions[fid] = FunctionInfo(name=d.name, file=d.file, line=d.line, module=module_of(d.file),
+                                            doc=d.doc, flags=flags)
+
+    def resolve(name: str, from_file: str) -> Optional[str]:
+        candidates = by_name.get(name)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return ids[candidates[0]]
+        for i in candidates:
+            if definitions[i].file == from_file:
+                return ids[i]
+        public = [i for i in candidates if not definitions[i].is_static]
+        return ids[public[0]] if public else None
+
+    for i, d in enumerate(definitions):
+        fid = ids[i]
+        body = d.body
+        loops = _loop_ranges(body)
+        if loops and FLAG_LOOP not in graph.functions[fid].flags:
+            graph.functions[fid].flags.append(FLAG_LOOP)
+        callees = graph.edges.setdefault(fid, [])
+        loop_callees = []
+        external = []
+        call_positions = set()
+
+        for m in _CALL_RE.finditer(body):
+            name = m.group(1)
+            if name in C_KEYWORDS:
+                continue
+            call_positions.add(m.start(1))
+            open_pos = m.end() - 1
+            target = resolve(name, d.file)
+
+            # 线程创建：取出线程入口函数
+            arg_pos = THREAD_CREATE_FUNCS.get(name)
+            if arg_pos is not None or (target is None and _THREAD_CREATE_HINT_RE.search(name)):
+                args = _call_args(body, open_pos)
+                candidates = [args[arg_pos]] if arg_pos is not None and arg_pos < len(args) else (
+                    list(args) if arg_pos is None else [])
+                for arg in candidates:
+                    entry_name = _arg_identifier(arg)
+                    entry_id = resolve(entry_name, d.file) if entry_name else None
+                    if entry_id is not None:
+                        graph.threads.setdefault(entry_id, fid)
+                        info = graph.functions[entry_id]
+                        if FLAG_THREAD_ENTRY not in info.flags:
+                            info.flags.append(FLAG_THREAD_ENTRY)
+
+            if target is None:
+                if name not in LIBC_FUNCS and name not in THREAD_CREATE_FUNCS and name not in external \
+                        and not name.isupper():
+                    external.append(name)
+                continue
+            if target == fid:
+                continue
+            if target not in callees:
+                callees.append(target)
+            if any(start <= m.start() <= end for start, end in loops) and target not in loop_callees:
+                loop_callees.append(target)
+
+        # 函数名作为值使用（回调注册等），按引用计入调用边
+        for m in _IDENT_RE.finditer(body):
+            if m.start(1) in call_positions:
+                continue
+            name = m.group(1)
+            if name in variables:
+                users = graph.globals.setdefault(name, [])
+                if fid not in users:
+                    users.append(fid)
+                continue
+            target = resolve(name, d.file)
+            if target is not None and target != fid and target not in callees:
+                callees.append(target)
+
+        if loop_callees:
+            graph.loop_calls[fid] = loop_callees
+        if external:
+            graph.external[fid] = external
+
+    graph.edges = {fid: callees for fid, callees in graph.edges.items() if callees}
+    return graph
+
+
+def _label(graph: CallGraph, fid: str) -> str:
+    info = graph.functions[fid]
+    return f"{info.name}@{info.file}" if '@' in fid else info.name
+
+
+def render_overview(graph: CallGraph) -> str:
+    """渲染调用图概览：入口函数、线程入口、未被调用的 static 函数"""
+    lines = ["# 入口函数"]
+    for fid in graph.entries():
+        info = graph.functions[fid]
+        lines.append(f"- {_label(graph, fid)} ({info.file}:{info.line})" + (f" // {info.doc}" if info.doc else ""))
+
+    lines.append("\n# 线程入口（线程函数 <- 创建者）")
+    if graph.threads:
+        for entry_id, creator in graph.threads.items():
+            lines.append(f"- {_label(graph, entry_id)} <- {_label(graph, creator)}")
+    else:
+        lines.append("- 未找到线程创建调用")
+    thread_like = [fid for fid in graph.orphans() if graph.has_flag(fid, FLAG_THREAD_LIKE)]
+    if thread_like:
+        lines.append("- 疑似线程函数（签名为 void* f(void*)，未找到创建位置）: "
+                     + ", ".join(_label(graph, f) for f in thread_like))
+    others = [fid for fid in graph.orphans() if fid not in thread_like]
+    if others:
+        lines.append("- 未被调用的 static 函数: " + ", ".join(_label(graph, f) for f in others))
+    return '\n'.join(lines)
+
+
+def render_module_sections(graph: CallGraph, max_external: int = 8) -> List[Tuple[str, str]]:
+    """按模块渲染调用邻接表，返回 [(模块名, 文本)]"""
+    modules: Dict[str, List[str]] = {}
+    for fid, info in graph.functions.items():
+        modules.setdefault(info.module, []).append(fid)
+    sections = []
+    for module, fids in modules.items():
+        lines = [f"## 模块 {module}"]
+        for fid in fids:
+            info = graph.functions[fid]
+            tags = [t for t in (FLAG_STATIC, FLAG_THREAD_ENTRY, FLAG_LOOP) if t in info.flags]
+            head = f"- {_label(graph, fid)} ({info.file}:{info.line}{', ' + ', '.join(tags) if tags else ''})"
+            if info.doc:
+                head += f" // {info.doc}"
+            lines.append(head)
+            callees = graph.edges.get(fid, [])
+            loop_callees = graph.loop_calls.get(fid, [])
+            if callees:
+                lines.append("  -> " + ", ".join(
+                    _label(graph, c) + (" [循环]" if c in loop_callees else "") for c in callees))
+            external = graph.external.get(fid, [])
+            if external:
+                extra = f" 等{len(external)}个" if len(external) > max_external else ""
+                lines.append("  外部调用: " + ", ".join(external[:max_external]) + extra)
+        sections.append((module, '\n'.join(lines)))
+    return sections
+
+
+def render_cross_module(graph: CallGraph) -> str:
+    """渲染跨模块调用与全局变量引用"""
+    lines = ["# 跨模块调用"]
+    cross = graph.cross_module_edges()
+    if cross:
+        for caller, callee in cross:
+            lines.append(f"- {graph.functions[caller].module}.{_label(graph, caller)} -> "
+                         f"{graph.functions[callee].module}.{_label(graph, callee)}")
+    else:
+        lines.append("- 无")
+
+    if graph.globals:
+        lines.append("\n# 全局变量（变量 <- 引用它的函数）")
+        for name, users in graph.globals.items():
+            lines.append(f"- {name} <- " + ", ".join(_label(graph, u) for u in users))
+    return '\n'.join(lines)
+
+
+ADJACENCY_TITLE = "# 调用邻接表（按模块分组，调用者 -> 被调用者按调用顺序；[循环] 为循环体内的调用）"
+
+
+def render_call_graph(graph: CallGraph, max_external: int = 8) -> str:
+    """将调用图渲染为紧凑文本，供大模型总结"""
+    if not graph.functions:
+        return "（未解析到函数定义）"
+    parts = [render_overview(graph), ADJACENCY_TITLE]
+    parts += [text for _, text in render_module_sections(graph, max_external)]
+    parts.append(render_cross_module(graph))
+    return '\n\n'.join(parts)
+
+
+def write_call_graph(graph: CallGraph, workspace: str = "") -> str:
+    """将调用图写入运行工作目录（运行结束时随目录删除），返回文件路径（作为句柄在状态中传递）"""
+    fd, graph_path = tempfile.mkstemp(prefix="call_graph_", suffix=".json", dir=workspace or None)
+    os.close(fd)
+    graph.save(graph_path)
+    return graph_path
+
+
+def load_call_graph(graph_path: str) -> CallGraph:
+    """按路径加载调用图；位于运行工作目录时同一次运行内共享同一实例，运行结束时释放"""
+    return workspace_resource(workspace_of(graph_path), ("call_graph", graph_path),
+                              lambda: CallGraph.load(graph_path))
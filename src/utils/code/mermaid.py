@@ -0,0 +1,249 @@
+"""
+根据静态调用图直接生成 Mermaid 流程图：
+- 按入口函数、线程入口拆分为多个子图，单图超过节点预算时再按模块拆分
+- 折叠线性调用链（只有一个调用者且只调用一个函数的中间节点）
+- 对重复边去重
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.code.call_graph import CallGraph
+
+DEFAULT_NODE_BUDGET = 15
+
+_UNSAFE_LABEL_RE = re.compile(r'["\n\r`]')
+
+
+@dataclass
+class Flowchart:
+    """单个流程图：edges 为 (起点, 终点, 边样式) 列表，loop_nodes 为位于线程循环体中的节点"""
+    title: str
+    root: str
+    nodes: List[str] = field(default_factory=list)
+    edges: List[Tuple[str, str, str]] = field(default_factory=list)
+    labels: Dict[str, str] = field(default_factory=dict)
+    loop_nodes: List[str] = field(default_factory=list)
+    direction: str = "TD"
+    pinned: List[str] = field(default_factory=list)  # 不参与链折叠的节点（线程入口等）
+    truncated: int = 0  # 超出预算被省略的节点数
+
+
+def _label(graph: CallGraph, fid: str) -> str:
+    info = graph.functions.get(fid)
+    return info.name if info is not None else fid
+
+
+def _collect(graph: CallGraph, root: str, allowed: Optional[set], budget: int,
+             stop: set) -> Tuple[List[str], List[Tuple[str, str]], int]:
+    """从 root 广度优先收集节点与边（去重），最多 budget 个节点；stop 中的节点只作为叶子出现"""
+    nodes = [root]
+    edges = []
+    seen_edges = set()
+    queue = [root]
+    dropped = set()
+    while queue:
+        fid = queue.pop(0)
+        if fid != root and fid in stop:
+            continue
+        for callee in graph.edges.get(fid, []):
+            if allowed is not None and callee not in allowed:
+                continue
+            if callee not in nodes:
+                if len(nodes) >= budget:
+                    dropped.add(callee)
+                    continue
+                nodes.append(callee)
+                queue.append(callee)
+            if (fid, callee) not in seen_edges:
+                seen_edges.add((fid, callee))
+                edges.append((fid, callee))
+    return nodes, edges, len(dropped)
+
+
+def _collapse_chains(chart: Flowchart) -> None:
+    """折叠线性链：A -> B -> C 中 B 只有一个入边和一个出边时，合并为 A -> "B → C" """
+    while True:
+        incoming: Dict[str, List[Tuple[str, str, str]]] = {}
+        outgoing: Dict[str, List[Tuple[str, str, str]]] = {}
+        for edge in chart.edges:
+            outgoing.setdefault(edge[0], []).append(edge)
+            incoming.setdefault(edge[1], []).append(edge)
+        merged = False
+        for node in chart.nodes:
+            if node == chart.root or node in chart.loop_nodes:
+                continue
+            ins, outs = incoming.get(node, []), outgoing.get(node, [])
+            if len(ins) != 1 or len(outs) != 1 or outs[0][2] != "-->":
+                continue
+            nxt = outs[0][1]
+            if nxt == node or nxt in chart.loop_nodes or nxt in chart.pinned or len(incoming.get(nxt, [])) != 1:
+                continue
+            # 将 nxt 合并进 node
+            chart.labels[node] = f"{chart.labels[node]} → {chart.labels[nxt]}"
+            chart.edges = [e for e in chart.edges if e is not outs[0]]
+            chart.edges = [(node if a == nxt else a, b, style) for a, b, style in chart.edges]
+            chart.nodes.remove(nxt)
+            merged = True
+            break
+        if not merged:
+            return
+
+
+def _dedupe_edges(edges: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+    seen = set()
+    result = []
+    for edge in edges:
+        if (edge[0], edge[1]) in seen or (edge[0] == edge[1] and not edge[2].startswith("-.")):
+            continue
+        seen.add((edge[0], edge[1]))
+        result.append(edge)
+    return result
+
+
+def _build_chart(graph: CallGraph, title: str, root: str, budget: int, allowed: Optional[set] = None,
+                 stop: Optional[set] = None) -> Flowchart:
+    stop = stop or set()
+    nodes, edges, dropped = _collect(graph, root, allowed, budget, stop)
+    chart = Flowchart(title=title, root=root, nodes=nodes, truncated=dropped)
+    chart.labels = {fid: _label(graph, fid) for fid in nodes}
+    chart.pinned = [fid for fid in nodes if fid in stop]
+
+    thread_edges = {(creator, entry_id) for entry_id, creator in graph.threads.items()}
+    edges = [(a, b) for a, b in edges if (a, b) not in thread_edges]
+    loop_callees = [c for c in graph.loop_calls.get(root, []) if c in nodes]
+    if loop_callees or (len(nodes) == 1 and graph.has_flag(root, "loop")):
+        # 循环体内的调用挂在循环节点下，并画出回到循环判断的虚线
+        loop_id = f"{root}#loop"
+        chart.nodes.insert(1, loop_id)
+        chart.labels[loop_id] = "循环处理"
+        chart.loop_nodes.append(loop_id)
+        chart.edges.append((root, loop_id, "-->"))
+        for a, b in edges:
+            if a == root and b in loop_callees:
+                chart.edges.append((loop_id, b, "-->"))
+            else:
+                chart.edges.append((a, b, "-->"))
+        last = loop_callees[-1] if loop_callees else loop_id
+        chart.edges.append((last, loop_id, "-.->"))
+    else:
+        chart.edges = [(a, b, "-->") for a, b in edges]
+
+    # 线程创建关系：创建者指向线程入口
+    for creator, entry_id in thread_edges:
+        if creator in nodes and entry_id in nodes:
+            chart.edges.append((creator, entry_id, "-.->|创建线程|"))
+
+    chart.edges = _dedupe_edges(chart.edges)
+    _collapse_chains(chart)
+    return chart
+
+
+def _build_module_chart(graph: CallGraph, module: str, module_roots: List[str], budget: int,
+                        stop: set) -> Flowchart:
+    """模块子图：虚拟根节点指向模块被外部调用的接口函数，再展开模块内部调用"""
+    root = f"module:{module}"
+    module_nodes = {fid for fid, info in graph.functions.items() if info.module == module}
+    chart = Flowchart(title=f"模块 {module}", root=root, nodes=[root], labels={root: f"{module} 模块接口"})
+    seen_edges = set()
+    dropped = set()
+    for module_root in module_roots:
+        if module_root not in chart.nodes:
+            if len(chart.nodes) >= budget:
+                dropped.add(module_root)
+                continue
+            chart.nodes.append(module_root)
+        chart.edges.append((root, module_root, "-->"))
+        nodes, edges, _ = _collect(graph, module_root, module_nodes, budget, stop)
+        for fid in nodes:
+            if fid not in chart.nodes:
+                if len(chart.nodes) >= budget:
+                    dropped.add(fid)
+                    continue
+                chart.nodes.append(fid)
+        for a, b in edges:
+            if a in chart.nodes and b in chart.nodes and (a, b) not in seen_edges:
+                seen_edges.add((a, b))
+                chart.edges.append((a, b, "-->"))
+    chart.truncated = len(dropped)
+    chart.labels.update({fid: _label(graph, fid) for fid in chart.nodes if fid != root})
+    chart.pinned = list(module_roots)
+    chart.edges = _dedupe_edges(chart.edges)
+    _collapse_chains(chart)
+    return chart
+
+
+def partition_flowcharts(graph: CallGraph, node_budget: int = DEFAULT_NODE_BUDGET) -> List[Flowchart]:
+    """按入口函数和线程入口拆分流程图，超过预算的流程图再按模块拆分"""
+    charts: List[Flowchart] = []
+    threads = set(graph.threads)
+    covered_modules = set()
+
+    entry_reach = graph.entry_reach()
+    roots: List[Tuple[str, str]] = [(fid, "主流程") for fid in entry_reach]
+    roots += [(fid, "线程") for fid in graph.threads]
+    roots += [(fid, "线程") for fid in graph.orphans() if graph.has_flag(fid, "thread_like")]
+
+    for root, kind in roots:
+        reach = entry_reach.get(root) or graph.reachable(root)
+        # 独立入口且不调用任何函数的单节点图没有信息量
+        if len(reach) <= 1 and kind == "主流程":
+            continue
+        # 主流程中遇到线程入口时只画到线程入口为止，线程内部逻辑单独成图
+        stop = threads - {root}
+        root_module = graph.functions[root].module
+        reach_modules = {graph.functions[f].module for f in reach}
+        if len(reach) <= node_budget or len(reach_modules) == 1:
+            charts.append(_build_chart(graph, f"{kind}：{_label(graph, root)}", root, node_budget, stop=stop))
+            continue
+
+        # 超出预算：入口所在模块（及跨模块调用的第一个函数）单独成图，其余每个模块一张图
+        allowed = {f for f in reach if graph.functions[f].module == root_module}
+        allowed |= {c for f in allowed for c in graph.edges.get(f, [])}
+        charts.append(_build_chart(graph, f"{kind}：{_label(graph, root)}", root, node_budget,
+                                   allowed=allowed, stop=stop))
+        # 被其他模块调用的函数作为各模块的入口
+        entered = {c for f in reach for c in graph.edges.get(f, [])
+                   if graph.functions[c].module != graph.functions[f].module}
+        for module in sorted(reach_modules - {root_module}):
+            if module in covered_modules:
+                continue
+            module_roots = [f for f in reach if graph.functions[f].module == module and f in entered]
+            module_roots = [f for f in module_roots if f not in stop]
+            if not module_roots or all(not graph.edges.get(f) for f in module_roots):
+                continue  # 模块接口不再调用其他函数，主流程图中已经体现
+            covered_modules.add(module)
+            charts.append(_build_module_chart(graph, module, module_roots, node_budget, stop))
+    return charts
+
+
+def _escape(label: str) -> str:
+    return _UNSAFE_LABEL_RE.sub("'", label)
+
+
+def render_flowchart(chart: Flowchart) -> str:
+    ids = {fid: f"N{i}" for i, fid in enumerate(chart.nodes)}
+    lines = [f"flowchart {chart.direction}"]
+    for fid in chart.nodes:
+        text = _escape(chart.labels.get(fid, fid))
+        if fid in chart.loop_nodes:
+            lines.append(f'    {ids[fid]}{{"{text}"}}')
+        elif fid == chart.root:
+            lines.append(f'    {ids[fid]}(["{text}"])')
+        else:
+            lines.append(f'    {ids[fid]}["{text}"]')
+    for a, b, style in chart.edges:
+        if a in ids and b in ids:
+            lines.append(f"    {ids[a]} {style} {ids[b]}")
+    if chart.truncated:
+        lines.append(f'    MORE["... 另有 {chart.truncated} 个函数未展开"]')
+        lines.append(f"    {ids[chart.root]} -.-> MORE")
+    return "\n".join(lines)
+
+
+def render_flowcharts(graph: CallGraph, node_budget: int = DEFAULT_NODE_BUDGET) -> str:
+    """生成全部流程图的 Markdown（每个流程图一个 mermaid 代码块，前面附一行加粗说明）"""
+    blocks = []
+    for chart in partition_flowcharts(graph, node_budget):
+        blocks.append(f"**{chart.title}**\n\n```mermaid\n{render_flowchart(chart)}\n```")
+    return "\n\n".join(blocks)
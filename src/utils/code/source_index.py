@@ -0,0 +1,322 @@
+"""
+源码索引：对组件源码（本地目录、zip 压缩包或对象存储前缀，见 utils.file.vfs）做一次 scandir 遍历，
+生成紧凑、不可变的文件索引，供结构分析、函数提取、调用关系分析等节点查询，避免各节点重复遍历/读取文件系统。
+"""
+import os
+import json
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from utils.file.vfs import VFS, LocalVFS, is_s3_uri, open_vfs
+from utils.file.workspace import workspace_of, workspace_resource
+
+# 索引文件格式版本，字段变化时递增
+INDEX_VERSION = 2
+
+KIND_DIR = "dir"
+KIND_HEADER = "header"
+KIND_SOURCE = "source"
+KIND_OTHER = "other"
+
+HEADER_SUFFIXES = ('.h', '.hpp')
+SOURCE_SUFFIXES = ('.c', '.cpp', '.cc')
+
+# 第三方库目录关键字（相对路径中包含即视为第三方代码）
+THIRD_PARTY_DIRS = ['opencv', 'ffmpeg', 'protobuf', 'json', 'gtest', 'boost']
+
+# 不深入遍历的目录（仅记录目录本身，用于识别开源库）
+SKIP_DESCEND_DIRS = {'.git'}
+
+# 文件优先级：1=公共API，2=子模块API，3=实现文件，4=内部头文件，0=非代码文件
+PRIORITY_PUBLIC_API = 1
+PRIORITY_SUB_MODULE_API = 2
+PRIORITY_IMPLEMENTATION = 3
+PRIORITY_INTERNAL_HEADER = 4
+PRIORITY_NONE = 0
+
+_FIELDS = ("path", "kind", "size", "mtime", "digest", "third_party", "priority")
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SourceEntry:
+    """索引条目，path 为相对组件根目录的 posix 路径"""
+    path: str
+    kind: str
+    size: int
+    mtime: float
+    digest: str
+    third_party: bool
+    priority: int
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> str:
+        return self.path.rsplit('/', 1)[0] if '/' in self.path else ''
+
+    @property
+    def is_dir(self) -> bool:
+        return self.kind == KIND_DIR
+
+    @property
+    def is_code(self) -> bool:
+        return self.kind in (KIND_HEADER, KIND_SOURCE)
+
+
+def classify_kind(name: str) -> str:
+    """根据文件名后缀判断文件类型"""
+    if name.endswith(HEADER_SUFFIXES):
+        return KIND_HEADER
+    if name.endswith(SOURCE_SUFFIXES):
+        return KIND_SOURCE
+    return KIND_OTHER
+
+
+def is_source_path(relative_path: str) -> bool:
+    """是否为分析需要读取内容的文件（头文件/源文件）"""
+    return classify_kind(relative_path.rsplit('/', 1)[-1]) != KIND_OTHER
+
+
+def is_third_party_path(relative_dir: str) -> bool:
+    """检查相对目录是否位于第三方库目录下"""
+    return any(tp_dir in relative_dir for tp_dir in THIRD_PARTY_DIRS)
+
+
+def get_file_priority(relative_path: str) -> int:
+    """返回代码文件的优先级：1=公共API，2=子模块API，3=实现文件，4=内部头文件"""
+    if relative_path.startswith('include/'):
+        return PRIORITY_PUBLIC_API
+    elif '/include/' in relative_path and not is_third_party_path(relative_path):
+        return PRIORITY_SUB_MODULE_API
+    elif relative_path.endswith('.c') or relative_path.endswith('.cpp'):
+        return PRIORITY_IMPLEMENTATION
+    else:
+        return PRIORITY_INTERNAL_HEADER
+
+
+def in_folders(relative_path: str, folders: Iterable[str]) -> bool:
+    """检查相对路径是否位于任一指定名称的文件夹中（任意层级）"""
+    for folder in folders:
+        if f'/{folder}/' in f'/{relative_path}' or relative_path.startswith(f'{folder}/'):
+            return True
+    return False
+
+
+def _hash_file(vfs: VFS, path: str) -> str:
+    h = hashlib.sha1()
+    with vfs.open(path) as f:
+        while True:
+            block = f.read(_HASH_CHUNK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class SourceIndex:
+    """
+    不可变的源码索引，提供类似 os.walk / listdir 的查询接口。
+    vfs_uri 非空时文件内容通过该 VFS（zip 压缩包、对象存储前缀）读取，root 下不需要有文件；
+    workspace 为运行工作目录时与同一运行的其他节点共享 VFS 实例，否则首次读取时打开自己的实例
+    """
+
+    def __init__(self, root: str, entries: Sequence[SourceEntry], vfs_uri: str = "", workspace: str = "",
+                 vfs: Optional[VFS] = None):
+        self._root = root
+        self._vfs_uri = vfs_uri
+        self._workspace = workspace
+        self._vfs = vfs
+        self._entries: Tuple[SourceEntry, ...] = tuple(sorted(entries, key=lambda e: e.path))
+        self._by_path: Dict[str, SourceEntry] = {e.path: e for e in self._entries}
+        children: Dict[str, List[SourceEntry]] = {}
+        for e in self._entries:
+            children.setdefault(e.parent, []).append(e)
+        self._children = children
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    @property
+    def vfs_uri(self) -> str:
+        return self._vfs_uri
+
+    @property
+    def entries(self) -> Tuple[SourceEntry, ...]:
+        return self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str) -> Optional[SourceEntry]:
+        return self._by_path.get(path)
+
+    def is_dir(self, path: str) -> bool:
+        if path == '':
+            return True
+        entry = self._by_path.get(path)
+        return entry is not None and entry.is_dir
+
+    def children(self, path: str = '') -> List[SourceEntry]:
+        """返回目录的直接子项（按名称排序）"""
+        return list(self._children.get(path, []))
+
+    def listdir(self, path: str = '') -> List[str]:
+        return [e.name for e in self._children.get(path, [])]
+
+    def walk(self, path: str = '') -> Iterator[Tuple[str, List[str], List[SourceEntry]]]:
+        """按 os.walk 的自顶向下顺序遍历：yield (相对目录, 子目录名列表, 文件条目列表)"""
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            dirs = []
+            files = []
+            for e in self._children.get(current, []):
+                (dirs if e.is_dir else files).append(e)
+            yield current, [d.name for d in dirs], files
+            stack.extend(reversed([d.path for d in dirs]))
+
+    def files(self, kinds: Optional[Iterable[str]] = None, include_third_party: bool = True) -> List[SourceEntry]:
+        """按路径顺序返回文件条目，可按类型和第三方标记过滤"""
+        kind_set = set(kinds) if kinds is not None else None
+        result = []
+        for e in self._entries:
+            if e.is_dir:
+                continue
+            if kind_set is not None and e.kind not in kind_set:
+                continue
+            if not include_third_party and e.third_party:
+                continue
+            result.append(e)
+        return result
+
+    def abspath(self, entry: SourceEntry) -> str:
+        return os.path.join(self._root, *entry.path.split('/'))
+
+    def read_text(self, entry: SourceEntry) -> str:
+        if self._vfs_uri:
+            if self._vfs is None:
+                self._vfs = open_vfs(self._vfs_uri, self._workspace)
+            return self._vfs.read_text(entry.path)
+        with open(self.abspath(entry), 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+    def save(self, index_path: str) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "root": self._root,
+            "vfs": self._vfs_uri,
+            "workspace": self._workspace,
+            "fields": list(_FIELDS),
+            "entries": [[getattr(e, name) for name in _FIELDS] for e in self._entries],
+        }
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, index_path: str) -> "SourceIndex":
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"源码索引版本不匹配: {data.get('version')} != {INDEX_VERSION}")
+        fields = data["fields"]
+        entries = [SourceEntry(**dict(zip(fields, row))) for row in data["entries"]]
+        return cls(data["root"], entries, vfs_uri=data.get("vfs", ""), workspace=data.get("workspace", ""))
+
+
+def build_source_index(root: str, vfs: Optional[VFS] = None, in_place: bool = False,
+                       workspace: str = "") -> SourceIndex:
+    """
+    单次 scandir 遍历构建索引，vfs 为空时遍历本地 root 目录。
+    代码文件的内容哈希优先取后端提供的校验值（如 zip 的 CRC32），否则仅在读取廉价时计算 sha1；
+    in_place 为真时索引通过 vfs 读取文件内容，加载后的索引从 workspace 中取同一运行共享的 VFS
+    """
+    vfs = vfs or LocalVFS(root)
+    entries: List[SourceEntry] = []
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        # 与原实现一致：根目录的相对路径记为 '.'
+        dir_third_party = is_third_party_path(rel_dir or '.')
+        try:
+            items = list(vfs.scandir(rel_dir))
+        except OSError:
+            # 只跳过无法读取的子目录；根目录不可读（路径不存在、压缩包已删除）时直接报错，不返回空索引
+            if not rel_dir:
+                raise
+            continue
+        for item in items:
+            rel_path = item.path
+            if item.is_dir:
+                entries.append(SourceEntry(
+                    path=rel_path,
+                    kind=KIND_DIR,
+                    size=0,
+                    mtime=item.stat.mtime,
+                    digest="",
+                    third_party=is_third_party_path(rel_path),
+                    priority=PRIORITY_NONE,
+                ))
+                if item.name not in SKIP_DESCEND_DIRS and not item.is_symlink:
+                    stack.append(rel_path)
+                continue
+
+            kind = classify_kind(item.name)
+            digest = ""
+            priority = PRIORITY_NONE
+            if kind != KIND_OTHER:
+                priority = get_file_priority(rel_path)
+                digest = item.stat.digest
+                if not digest and vfs.cheap_reads:
+                    try:
+                        digest = _hash_file(vfs, rel_path)
+                    except OSError:
+                        digest = ""
+            entries.append(SourceEntry(
+                path=rel_path,
+                kind=kind,
+                size=item.stat.size,
+                mtime=item.stat.mtime,
+                digest=digest,
+                third_party=dir_third_party,
+                priority=priority,
+            ))
+    if not in_place:
+        return SourceIndex(root, entries)
+    return SourceIndex(root, entries, vfs_uri=vfs.uri, workspace=workspace, vfs=vfs)
+
+
+def write_source_index(index: SourceIndex, workspace: str = "") -> str:
+    """将索引写入运行工作目录（运行结束时随目录删除），返回索引文件路径（作为句柄在状态中传递）"""
+    fd, index_path = tempfile.mkstemp(prefix="source_index_", suffix=".json", dir=workspace or None)
+    os.close(fd)
+    index.save(index_path)
+    return index_path
+
+
+def load_source_index(index_path: str) -> SourceIndex:
+    """按路径加载索引；索引位于运行工作目录时同一次运行的多个节点共享同一实例，运行结束时释放"""
+    return workspace_resource(workspace_of(index_path), ("source_index", index_path),
+                              lambda: SourceIndex.load(index_path))
+
+
+def source_exists(root: str) -> bool:
+    """组件源码是否存在（本地目录、zip 压缩包或对象存储前缀）"""
+    return is_s3_uri(root) or os.path.exists(root)
+
+
+def get_source_index(index_path: str, root: str) -> SourceIndex:
+    """
+    优先使用状态中的索引句柄；单节点调试等没有索引时按 root 现场构建，
+    root 为 zip 压缩包或对象存储前缀时不解压，直接通过 VFS 读取
+    """
+    if index_path and os.path.exists(index_path):
+        return load_source_index(index_path)
+    if is_s3_uri(root) or os.path.isfile(root):
+        return build_source_index(root, open_vfs(root), in_place=True)
+    return build_source_index(root)
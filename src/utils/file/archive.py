@@ -0,0 +1,103 @@
+"""
+zip 压缩包的选择性读取：
+- 只读中央目录即可得到完整目录树，不需要解压
+- 只把分析需要的文件解压到磁盘（不落盘直接读取见 utils.file.vfs.ZipVFS）
+"""
+import os
+import time
+import shutil
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+# full: 解压全部内容；sources: 只解压源码文件；in_place: 不解压，分析时直接从压缩包读取
+UNZIP_MODE_FULL = "full"
+UNZIP_MODE_SOURCES = "sources"
+UNZIP_MODE_IN_PLACE = "in_place"
+UNZIP_MODE = os.getenv("UNZIP_MODE", UNZIP_MODE_SOURCES)
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def member_path(name: str) -> str:
+    """
+    压缩包成员名转为相对 posix 路径，规则与 ZipFile.extract 一致（去掉盘符、空段、. 和 ..），
+    保证索引中的路径与解压后的路径相同；无效名称返回空串
+    """
+    name = os.path.splitdrive(name)[1]
+    return '/'.join(part for part in name.split('/') if part not in ('', '.', '..'))
+
+
+@dataclass
+class ArchiveMember:
+    path: str
+    info: zipfile.ZipInfo
+
+    @property
+    def is_dir(self) -> bool:
+        return self.info.is_dir()
+
+    @property
+    def mtime(self) -> float:
+        try:
+            return time.mktime(self.info.date_time + (0, 0, -1))
+        except (OverflowError, ValueError):
+            return 0.0
+
+
+def iter_members(zf: zipfile.ZipFile) -> Iterator[ArchiveMember]:
+    """按中央目录顺序返回成员（跳过无效路径）"""
+    for info in zf.infolist():
+        path = member_path(info.filename)
+        if path:
+            yield ArchiveMember(path=path, info=info)
+
+
+@dataclass
+class ExtractStats:
+    files: int = 0
+    bytes: int = 0
+    skipped_files: int = 0
+    skipped_bytes: int = 0
+    seconds: float = 0.0
+
+    def report(self) -> str:
+        return (f"extracted {self.files} files ({self.bytes / 1024:.1f} KB), "
+                f"skipped {self.skipped_files} files ({self.skipped_bytes / 1024:.1f} KB), {self.seconds:.2f}s")
+
+
+def extract_selected(zip_path: str, dest: str, include: Callable[[str], bool]) -> ExtractStats:
+    """按中央目录重建全部目录，只解压 include(相对路径) 为真的文件（流式写入，不整体读入内存）"""
+    stats = ExtractStats()
+    start = time.time()
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        for member in iter_members(zf):
+            target = os.path.join(dest, *member.path.split('/'))
+            if member.is_dir:
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not include(member.path):
+                stats.skipped_files += 1
+                stats.skipped_bytes += member.info.file_size
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zf.open(member.info) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+            stats.files += 1
+            stats.bytes += member.info.file_size
+    stats.seconds = time.time() - start
+    return stats
+
+
+def top_level_dir(zip_path: str) -> Optional[str]:
+    """压缩包中第一个顶层目录名（作为组件名称），没有时返回 None"""
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        for member in iter_members(zf):
+            first, sep, _ = member.path.partition('/')
+            if sep or member.is_dir:
+                return first
+    return None
+
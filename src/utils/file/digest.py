@@ -0,0 +1,65 @@
+import os
+import hashlib
+from typing import Iterable, Optional
+
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamingDigest:
+    """流式计算内容哈希，可在下载/读取数据的同时逐块更新"""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = DIGEST_CHUNK_SIZE) -> str:
+    """按块读取文件计算 sha256，内存占用与文件大小无关"""
+    digest = StreamingDigest()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _iter_tree_files(root: str) -> Iterable[str]:
+    """按相对路径排序遍历目录树中的文件，保证同一内容得到同一哈希"""
+    stack = ['']
+    files = []
+    while stack:
+        rel_dir = stack.pop()
+        abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+        with os.scandir(abs_dir) as it:
+            for item in it:
+                rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                if item.is_dir(follow_symlinks=False):
+                    stack.append(rel_path)
+                elif item.is_file():
+                    files.append(rel_path)
+    return sorted(files)
+
+
+def tree_digest(root: str) -> str:
+    """目录树内容哈希：对 (相对路径, 文件内容哈希) 序列再求哈希，与目录名和修改时间无关"""
+    digest = StreamingDigest()
+    for rel_path in _iter_tree_files(root):
+        digest.update(rel_path.encode('utf-8') + b'\0')
+        digest.update(file_digest(os.path.join(root, rel_path)).encode('ascii') + b'\n')
+    return digest.hexdigest()
+
+
+def content_digest(path: str) -> Optional[str]:
+    """计算本地 zip 文件或目录的内容哈希；路径不存在时返回 None"""
+    if os.path.isdir(path):
+        return tree_digest(path)
+    if os.path.isfile(path):
+        return file_digest(path)
+    return None
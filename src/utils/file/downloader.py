@@ -0,0 +1,278 @@
+"""
+远程文件流式下载：
+- 按块写入磁盘，内存占用与文件大小无关
+- 服务端支持 Range 时按分片并发下载，每个分片独立续传
+- 传输中断（连接错误、超时、5xx）后从已写入的位置续传，不支持 Range 时从头重下
+- 边下载边计算内容哈希（与 utils.file.digest.file_digest 结果一致）
+"""
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.file.digest import DIGEST_CHUNK_SIZE, StreamingDigest
+
+import logging
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+# 小于 2 个分片大小的文件不分片
+DOWNLOAD_MIN_PART_SIZE = int(os.getenv("DOWNLOAD_MIN_PART_SIZE", str(8 * 1024 * 1024)))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "5"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "120"))
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+_RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class _RetryableStatus(Exception):
+    """5xx / 429 等可重试的响应状态"""
+
+
+@dataclass
+class DownloadResult:
+    path: str
+    size: int
+    digest: str
+    seconds: float
+    parts: int
+    retries: int
+
+    def report(self) -> str:
+        mb = self.size / 1024 / 1024
+        speed = mb / self.seconds if self.seconds > 0 else 0.0
+        return f"{mb:.1f} MB in {self.seconds:.2f}s ({speed:.1f} MB/s), {self.parts} parts, {self.retries} retries"
+
+
+def _check_status(response: requests.Response) -> None:
+    if response.status_code == 429 or response.status_code >= 500:
+        response.close()
+        raise _RetryableStatus(f"HTTP {response.status_code}")
+    response.raise_for_status()
+
+
+def _parse_content_range(response: requests.Response) -> Optional[Tuple[int, int, Optional[int]]]:
+    """解析 206 响应的 Content-Range，返回 (start, end, total)"""
+    match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+    if not match:
+        return None
+    total = match.group(3)
+    return int(match.group(1)), int(match.group(2)), None if total == '*' else int(total)
+
+
+def _backoff(attempt: int) -> None:
+    time.sleep(min(0.5 * (2 ** attempt), 8.0))
+
+
+class _Downloader:
+    def __init__(self, url: str, dest_path: str, session: requests.Session, chunk_size: int, concurrency: int,
+                 min_part_size: int, max_retries: int, timeout: float):
+        self.url = url
+        self.dest_path = dest_path
+        self.session = session
+        self.chunk_size = chunk_size
+        self.concurrency = max(1, concurrency)
+        self.min_part_size = max(1, min_part_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def _get(self, start: Optional[int] = None, end: Optional[int] = None) -> requests.Response:
+        """start 为空时请求完整内容，否则请求 bytes=start-end（end 为空表示到结尾）"""
+        # 禁止传输压缩，保证写入的字节数与 Content-Length / Content-Range 一致
+        headers = {"Accept-Encoding": "identity"}
+        if start is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout)
+        if response.status_code == 416 and start == 0 and end is None:
+            # 空文件无法满足 bytes=0-
+            response.close()
+            return self._get()
+        _check_status(response)
+        return response
+
+    def _count_retry(self, attempt: int, error: Exception, what: str) -> None:
+        if attempt >= self.max_retries:
+            raise DownloadError(f"下载失败（已重试 {self.max_retries} 次）: {what}: {error}") from error
+        with self._lock:
+            self.retries += 1
+        logger.warning("download %s interrupted (%s), retry %d/%d", what, error, attempt + 1, self.max_retries)
+        _backoff(attempt)
+
+    def run(self) -> DownloadResult:
+        start_time = time.time()
+        # 用 Range: bytes=0- 探测：206 表示支持 Range 且得到总大小；200 时直接沿用该响应做单流下载
+        attempt = 0
+        while True:
+            try:
+                response = self._get(0)
+                break
+            except (_RetryableStatus,) + _RETRY_EXCEPTIONS as e:
+                self._count_retry(attempt, e, "probe")
+                attempt += 1
+
+        content_range = _parse_content_range(response) if response.status_code == 206 else None
+        total = content_range[2] if content_range else None
+        if total is None and response.headers.get("Content-Length") and response.status_code == 200:
+            total = int(response.headers["Content-Length"])
+        ranges_supported = content_range is not None
+
+        if ranges_supported and total is not None and self.concurrency > 1 and total >= 2 * self.min_part_size:
+            response.close()
+            digest, parts = self._download_parts(total)
+        else:
+            digest = self._download_single(response, total, ranges_supported)
+            parts = 1
+
+        size = os.path.getsize(self.dest_path)
+        if total is not None and size != total:
+            raise DownloadError(f"下载不完整: {size} / {total} 字节")
+        return DownloadResult(path=self.dest_path, size=size, digest=digest, seconds=time.time() - start_time,
+                              parts=parts, retries=self.retries)
+
+    def _download_single(self, response: requests.Response, total: Optional[int], ranges_supported: bool) -> str:
+        """单流下载；中断后支持 Range 时从已写入位置续传，否则从头重下"""
+        digest = StreamingDigest()
+        written = 0
+        attempt = 0
+        with open(self.dest_path, 'wb') as f:
+            while True:
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            digest.update(chunk)
+                            written += len(chunk)
+                    response.close()
+                    if total is not None and written < total:
+                        raise requests.exceptions.ChunkedEncodingError(f"连接提前关闭: {written} / {total} 字节")
+                    return digest.hexdigest()
+                except _RETRY_EXCEPTIONS as e:
+                    response.close()
+                    self._count_retry(attempt, e, "stream")
+                    attempt += 1
+                while True:
+                    try:
+                        if ranges_supported and written:
+                            response = self._get(written)
+                            if response.status_code == 206:
+                                break
+                            # 服务端这次忽略了 Range，只能从头开始
+                            response.close()
+                        response = self._get()
+                        f.seek(0)
+                        f.truncate()
+                        digest = StreamingDigest()
+                        written = 0
+                        break
+                    except (_RetryableStatus,) + _RETRY_EXCEPTIONS as e:
+                        self._count_retry(attempt, e, "stream")
+                        attempt += 1
+
+    def _download_parts(self, total: int) -> Tuple[str, int]:
+        """按分片并发下载到预分配的文件中，已连续完成的前缀随即计算哈希"""
+        part_size = max(self.min_part_size, -(-total // (self.concurrency * 4)))
+        parts = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+        with open(self.dest_path, 'wb') as f:
+            f.truncate(total)
+
+        hasher = _PrefixDigest(self.dest_path, parts)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(parts))) as executor:
+            futures = [executor.submit(self._download_part, index, start, end, hasher)
+                       for index, (start, end) in enumerate(parts)]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return hasher.hexdigest(), len(parts)
+
+    def _download_part(self, index: int, start: int, end: int, hasher: "_PrefixDigest") -> None:
+        position = start
+        attempt = 0
+        with open(self.dest_path, 'r+b') as f:
+            while position <= end:
+                try:
+                    response = self._get(position, end)
+                    if response.status_code != 206:
+                        response.close()
+                        raise DownloadError(f"服务端未按 Range 返回分片: HTTP {response.status_code}")
+                    with response:
+                        f.seek(position)
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            if chunk:
+                                chunk = chunk[:end + 1 - position]
+                                f.write(chunk)
+                                position += len(chunk)
+                    if position <= end:
+                        raise requests.exceptions.ChunkedEncodingError(f"分片 {index} 提前结束: {position - start} / {end + 1 - start} 字节")
+                except (_RetryableStatus,) + _RETRY_EXCEPTIONS as e:
+                    self._count_retry(attempt, e, f"part {index}")
+                    attempt += 1
+        hasher.part_done(index)
+
+
+class _PrefixDigest:
+    """分片乱序完成时按文件顺序计算哈希：每当前缀连续完成，就从磁盘（通常命中页缓存）读回并更新哈希"""
+
+    def __init__(self, path: str, parts: List[Tuple[int, int]]):
+        self._path = path
+        self._parts = parts
+        self._done = [False] * len(parts)
+        self._next = 0
+        self._digest = StreamingDigest()
+        self._lock = threading.Lock()
+
+    def part_done(self, index: int) -> None:
+        with self._lock:
+            self._done[index] = True
+            with open(self._path, 'rb') as f:
+                while self._next < len(self._parts) and self._done[self._next]:
+                    start, end = self._parts[self._next]
+                    f.seek(start)
+                    remaining = end + 1 - start
+                    while remaining > 0:
+                        block = f.read(min(DIGEST_CHUNK_SIZE, remaining))
+                        if not block:
+                            break
+                        self._digest.update(block)
+                        remaining -= len(block)
+                    self._next += 1
+
+    def hexdigest(self) -> str:
+        if self._next != len(self._parts):
+            raise DownloadError("分片未全部完成")
+        return self._digest.hexdigest()
+
+
+def download_file(url: str, dest_path: str, *, session: Optional[requests.Session] = None,
+                  chunk_size: int = DOWNLOAD_CHUNK_SIZE, concurrency: int = DOWNLOAD_CONCURRENCY,
+                  min_part_size: int = DOWNLOAD_MIN_PART_SIZE, max_retries: int = DOWNLOAD_MAX_RETRIES,
+                  timeout: float = DOWNLOAD_TIMEOUT) -> DownloadResult:
+    """下载 url 到 dest_path，返回大小、sha256 内容哈希与耗时；失败时抛出 DownloadError 或 requests 异常"""
+    own_session = session is None
+    if own_session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    try:
+        downloader = _Downloader(url, dest_path, session, chunk_size, concurrency, min_part_size, max_retries, timeout)
+        return downloader.run()
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,66 @@
+"""
+本地文件上传到对象存储：
+- 按内容哈希命名对象，同一内容已存在时跳过上传
+- 并发分片上传，分片上传时才从磁盘读取，内存占用与文件大小无关
+"""
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from utils.file.digest import file_digest
+
+import logging
+logger = logging.getLogger(__name__)
+
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+UPLOAD_KEY_PREFIX = os.getenv("UPLOAD_KEY_PREFIX", "components")
+
+
+@dataclass
+class UploadResult:
+    key: str
+    size: int
+    seconds: float
+    # 同一内容的对象已存在，未实际上传
+    skipped: bool = False
+
+    def report(self) -> str:
+        mb = self.size / 1024 / 1024
+        if self.skipped:
+            return f"{mb:.1f} MB already uploaded, skipped"
+        speed = mb / self.seconds if self.seconds > 0 else 0.0
+        return f"{mb:.1f} MB in {self.seconds:.2f}s ({speed:.1f} MB/s)"
+
+
+def content_key(digest: str, file_name: str) -> str:
+    """按内容哈希生成对象 key，保留原扩展名"""
+    suffix = Path(file_name).suffix.lower()
+    return f"{UPLOAD_KEY_PREFIX}/{digest}{suffix}" if UPLOAD_KEY_PREFIX else f"{digest}{suffix}"
+
+
+def upload_local_file(storage, path: str, *, digest: str = "", content_type: str = "application/octet-stream",
+                      part_size: int = UPLOAD_PART_SIZE, concurrency: int = UPLOAD_CONCURRENCY) -> UploadResult:
+    """
+    上传本地文件到 storage（S3SyncStorage），对象 key 为内容哈希；digest 为空时流式计算 sha256。
+    同一 key 已存在时直接返回，不重复上传
+    """
+    file_name = os.path.basename(path)
+    size = os.path.getsize(path)
+    key = content_key(digest or file_digest(path), file_name)
+
+    if storage.file_exists(file_key=key):
+        logger.info("object %s already exists, skip upload", key)
+        return UploadResult(key=key, size=size, seconds=0.0, skipped=True)
+
+    start = time.time()
+    storage.stream_upload_path(
+        file_path=path,
+        key=key,
+        content_type=content_type,
+        multipart_chunksize=part_size,
+        multipart_threshold=part_size,
+        max_concurrency=concurrency,
+    )
+    return UploadResult(key=key, size=size, seconds=time.time() - start)
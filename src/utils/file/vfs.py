@@ -0,0 +1,296 @@
+"""
+只读虚拟文件系统：分析相关代码通过统一的 scandir / walk / stat / open 接口访问组件源码，
+不关心源码位于本地目录、zip 压缩包（不解压）还是对象存储前缀下。
+URI 约定：本地目录和 .zip 文件直接使用路径；对象存储前缀使用 s3://bucket/prefix
+"""
+import io
+import os
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from utils.file.archive import iter_members
+from utils.file.workspace import workspace_resource
+
+import logging
+logger = logging.getLogger(__name__)
+
+S3_SCHEME = "s3://"
+
+
+@dataclass(frozen=True)
+class VfsStat:
+    size: int
+    mtime: float
+    is_dir: bool
+    # 后端直接提供的内容校验值（如 zip 中央目录中的 CRC32），没有时为空
+    digest: str = ""
+
+
+@dataclass(frozen=True)
+class VfsEntry:
+    """scandir 返回的条目，path 为相对 VFS 根目录的 posix 路径"""
+    name: str
+    path: str
+    stat: VfsStat
+    is_symlink: bool = False
+
+    @property
+    def is_dir(self) -> bool:
+        return self.stat.is_dir
+
+
+def join_path(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+class VFS:
+    """只读文件系统接口；路径均为相对根目录的 posix 路径，'' 表示根目录"""
+
+    # 读取内容是否廉价（本地磁盘），建索引时据此决定是否对代码文件计算内容哈希
+    cheap_reads = False
+
+    @property
+    def uri(self) -> str:
+        raise NotImplementedError
+
+    def scandir(self, path: str = '') -> Iterator[VfsEntry]:
+        raise NotImplementedError
+
+    def stat(self, path: str) -> VfsStat:
+        raise NotImplementedError
+
+    def open(self, path: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return self.stat(path).is_dir
+        except FileNotFoundError:
+            return False
+
+    def walk(self, path: str = '') -> Iterator[Tuple[str, List[str], List[str]]]:
+        """与 os.walk 一致的自顶向下遍历：yield (相对目录, 子目录名列表, 文件名列表)，可原地修改子目录列表来剪枝"""
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            dirs: List[str] = []
+            files: List[str] = []
+            try:
+                for entry in self.scandir(current):
+                    (dirs if entry.is_dir else files).append(entry.name)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            yield current, dirs, files
+            stack.extend(join_path(current, name) for name in reversed(dirs))
+
+    def read_bytes(self, path: str) -> bytes:
+        with self.open(path) as f:
+            return f.read()
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode('utf-8', errors='ignore')
+
+    def close(self) -> None:
+        """释放后端持有的资源（文件句柄等）"""
+
+
+class LocalVFS(VFS):
+    """本地目录"""
+
+    cheap_reads = True
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @property
+    def uri(self) -> str:
+        return self.root
+
+    def _abs(self, path: str) -> str:
+        return os.path.join(self.root, *path.split('/')) if path else self.root
+
+    def scandir(self, path: str = '') -> Iterator[VfsEntry]:
+        with os.scandir(self._abs(path)) as it:
+            for item in it:
+                try:
+                    st = item.stat()
+                    is_dir = item.is_dir()
+                except OSError:
+                    continue
+                yield VfsEntry(
+                    name=item.name,
+                    path=join_path(path, item.name),
+                    stat=VfsStat(size=0 if is_dir else st.st_size, mtime=st.st_mtime, is_dir=is_dir),
+                    is_symlink=item.is_symlink(),
+                )
+
+    def stat(self, path: str) -> VfsStat:
+        st = os.stat(self._abs(path))
+        is_dir = os.path.isdir(self._abs(path))
+        return VfsStat(size=0 if is_dir else st.st_size, mtime=st.st_mtime, is_dir=is_dir)
+
+    def open(self, path: str) -> BinaryIO:
+        return open(self._abs(path), 'rb')
+
+
+class _TreeVFS(VFS):
+    """一次性列出全部对象、在内存中维护目录树的后端（zip、对象存储）"""
+
+    def __init__(self):
+        self._stats: Dict[str, VfsStat] = {'': VfsStat(size=0, mtime=0.0, is_dir=True)}
+        self._children: Dict[str, List[str]] = {'': []}
+
+    def _add(self, path: str, stat: VfsStat) -> None:
+        """登记一个条目，补齐列表中没有单独记录的上级目录"""
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            self._add_dir('/'.join(parts[:depth]))
+        if stat.is_dir:
+            self._add_dir(path, stat.mtime)
+            return
+        if path not in self._stats:
+            self._children[path.rsplit('/', 1)[0] if '/' in path else ''].append(path)
+        self._stats[path] = stat
+
+    def _add_dir(self, path: str, mtime: float = 0.0) -> None:
+        existing = self._stats.get(path)
+        if existing is None:
+            self._children[path.rsplit('/', 1)[0] if '/' in path else ''].append(path)
+            self._children[path] = []
+        elif existing.mtime or not mtime:
+            return
+        self._stats[path] = VfsStat(size=0, mtime=mtime, is_dir=True)
+
+    def scandir(self, path: str = '') -> Iterator[VfsEntry]:
+        children = self._children.get(path)
+        if children is None:
+            if path in self._stats:
+                raise NotADirectoryError(path)
+            raise FileNotFoundError(path)
+        for child in children:
+            yield VfsEntry(name=child.rsplit('/', 1)[-1], path=child, stat=self._stats[child])
+
+    def stat(self, path: str) -> VfsStat:
+        stat = self._stats.get(path)
+        if stat is None:
+            raise FileNotFoundError(path)
+        return stat
+
+    def _file_stat(self, path: str) -> VfsStat:
+        stat = self.stat(path)
+        if stat.is_dir:
+            raise IsADirectoryError(path)
+        return stat
+
+
+class ZipVFS(_TreeVFS):
+    """zip 压缩包，只读中央目录构建目录树，按需解压单个成员（不落盘）；多线程共享同一句柄，读取时加锁"""
+
+    def __init__(self, zip_path: str):
+        super().__init__()
+        self.zip_path = zip_path
+        self._lock = threading.Lock()
+        self._zf = zipfile.ZipFile(zip_path, 'r')
+        self._infos: Dict[str, zipfile.ZipInfo] = {}
+        for member in iter_members(self._zf):
+            if member.is_dir:
+                self._add(member.path, VfsStat(size=0, mtime=member.mtime, is_dir=True))
+                continue
+            self._infos[member.path] = member.info
+            self._add(member.path, VfsStat(size=member.info.file_size, mtime=member.mtime, is_dir=False,
+                                           digest=f"crc32:{member.info.CRC:08x}"))
+
+    @property
+    def uri(self) -> str:
+        return self.zip_path
+
+    def open(self, path: str) -> BinaryIO:
+        self._file_stat(path)
+        with self._lock:
+            return io.BytesIO(self._zf.read(self._infos[path]))
+
+    def close(self) -> None:
+        self._zf.close()
+
+
+def _default_s3_storage():
+    from storage.s3.s3_storage import get_s3_storage
+    return get_s3_storage()
+
+
+class S3PrefixVFS(_TreeVFS):
+    """
+    对象存储前缀，通过 S3SyncStorage.list_files 分页列出全部 key 构建目录树，read_file 按需读取对象。
+    list_files 只返回 key，文件大小和修改时间记为 0
+    """
+
+    def __init__(self, bucket: str, prefix: str, storage=None):
+        super().__init__()
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self._storage = storage or _default_s3_storage()
+        key_prefix = f"{self.prefix}/" if self.prefix else ""
+        token: Optional[str] = None
+        count = 0
+        while True:
+            result = self._storage.list_files(prefix=key_prefix or None, bucket=bucket, continuation_token=token)
+            for key in result["keys"]:
+                path = '/'.join(part for part in key[len(key_prefix):].split('/') if part)
+                if not path:
+                    continue
+                self._add(path, VfsStat(size=0, mtime=0.0, is_dir=key.endswith('/')))
+                count += 1
+            token = result["next_continuation_token"]
+            if not result["is_truncated"] or not token:
+                break
+        logger.info("listed %d objects under %s", count, self.uri)
+
+    @property
+    def uri(self) -> str:
+        return f"{S3_SCHEME}{self.bucket}/{self.prefix}" if self.prefix else f"{S3_SCHEME}{self.bucket}"
+
+    @classmethod
+    def from_uri(cls, uri: str, storage=None) -> "S3PrefixVFS":
+        bucket, _, prefix = uri[len(S3_SCHEME):].partition('/')
+        if not bucket:
+            raise ValueError(f"对象存储路径缺少 bucket: {uri}")
+        return cls(bucket, prefix, storage=storage)
+
+    def open(self, path: str) -> BinaryIO:
+        self._file_stat(path)
+        key = f"{self.prefix}/{path}" if self.prefix else path
+        return io.BytesIO(self._storage.read_file(file_key=key, bucket=self.bucket))
+
+
+def is_s3_uri(uri: str) -> bool:
+    return uri.startswith(S3_SCHEME)
+
+
+def open_vfs(uri: str, workspace: str = "") -> VFS:
+    """
+    按 URI 打开 VFS；本地路径不存在时抛出 FileNotFoundError。
+    workspace 为运行工作目录时同一次运行的多个节点共享同一实例，运行结束删除工作目录时关闭；
+    为空时返回新实例，由调用方负责关闭
+    """
+    return workspace_resource(workspace, ("vfs", uri), lambda: _open_vfs(uri))
+
+
+def _open_vfs(uri: str) -> VFS:
+    if is_s3_uri(uri):
+        return S3PrefixVFS.from_uri(uri)
+    if os.path.isfile(uri):
+        if not zipfile.is_zipfile(uri):
+            raise ValueError(f"不是目录或 zip 压缩包: {uri}")
+        return ZipVFS(uri)
+    if os.path.isdir(uri):
+        return LocalVFS(uri)
+    raise FileNotFoundError(f"路径不存在: {uri}")
@@ -0,0 +1,109 @@
+"""
+运行工作目录：一次运行产生的临时文件（下载的压缩包、解压的源码等）都放在同一个目录下，
+运行结束时整体删除（保存README后删除；运行失败、取消或超时时由服务端在结束运行时兜底删除）。
+目录按 run_id 命名，服务端只凭 run_id 即可找到并清理。
+运行期间多个节点共享的资源（VFS 实例等）按工作目录登记，删除工作目录时一并关闭，不跨运行复用
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 所有运行工作目录的上级目录
+RUN_WORKSPACE_ROOT = os.getenv("RUN_WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "component_runs"))
+
+_SAFE_RUN_ID = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+T = TypeVar("T")
+
+
+class _Resources:
+    def __init__(self):
+        # 同一运行内串行创建，避免并行分支重复打开同一资源
+        self.lock = threading.Lock()
+        self.items: Dict[Hashable, Any] = {}
+
+
+_resources: Dict[str, _Resources] = {}
+_resources_lock = threading.Lock()
+
+
+def _run_dir(run_id: str) -> str:
+    if not run_id or not _SAFE_RUN_ID.match(run_id) or run_id in (".", ".."):
+        return ""
+    return os.path.join(RUN_WORKSPACE_ROOT, run_id)
+
+
+def create_workspace(run_id: str = "") -> str:
+    """创建（或复用）运行工作目录；没有可用的 run_id（单节点调试等）时创建随机命名的目录"""
+    os.makedirs(RUN_WORKSPACE_ROOT, exist_ok=True)
+    path = _run_dir(run_id)
+    if not path:
+        return tempfile.mkdtemp(prefix="run_", dir=RUN_WORKSPACE_ROOT)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def workspace_of(path: str) -> str:
+    """返回 path 所在的运行工作目录，不在任何工作目录下时返回空字符串"""
+    if not path:
+        return ""
+    root = os.path.abspath(RUN_WORKSPACE_ROOT)
+    rel = os.path.relpath(os.path.abspath(path), root)
+    if rel == "." or rel.startswith(".."):
+        return ""
+    return os.path.join(root, rel.split(os.sep, 1)[0])
+
+
+def workspace_resource(workspace: str, key: Hashable, factory: Callable[[], T]) -> T:
+    """
+    返回运行内共享的资源，首次使用时由 factory 创建，删除工作目录时关闭（有 close 方法时）。
+    workspace 为空或已删除时不登记，每次返回新创建的实例
+    """
+    if not workspace or not os.path.isdir(workspace):
+        return factory()
+    workspace = os.path.abspath(workspace)
+    with _resources_lock:
+        resources = _resources.setdefault(workspace, _Resources())
+    with resources.lock:
+        if key not in resources.items:
+            resources.items[key] = factory()
+        return resources.items[key]
+
+
+def _close_resources(workspace: str) -> None:
+    with _resources_lock:
+        resources = _resources.pop(os.path.abspath(workspace), None)
+    if resources is None:
+        return
+    with resources.lock:
+        for key, item in resources.items.items():
+            close = getattr(item, "close", None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Error closing {key} of workspace {workspace}: {e}")
+        resources.items.clear()
+
+
+def remove_workspace(workspace: str) -> None:
+    """关闭运行内共享的资源并删除运行工作目录；只处理 RUN_WORKSPACE_ROOT 下的目录，可重复调用"""
+    if not workspace or workspace_of(workspace) != os.path.abspath(workspace):
+        return
+    _close_resources(workspace)
+    shutil.rmtree(workspace, ignore_errors=True)
+
+
+def remove_run_workspace(run_id: str) -> None:
+    """按 run_id 删除运行工作目录（服务端在运行结束时调用）"""
+    path = _run_dir(run_id)
+    if path and (os.path.exists(path) or os.path.abspath(path) in _resources):
+        remove_workspace(path)
+        logger.info(f"Removed workspace of run {run_id}")
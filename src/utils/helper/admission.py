@@ -0,0 +1,190 @@
+"""
+HTTP 运行的准入控制（每个 worker 进程一个实例，配置的总额度按 worker 数均分，见 utils.helper.workers）：
+- 同时执行的 /run、/stream_run 不超过 max_in_flight，超出的请求按到达顺序在有界队列中等待
+- 队列已满或等待超时的请求直接拒绝，由路由返回 429 与 Retry-After，不再让所有运行一起变慢
+- Retry-After 按最近运行的平均耗时与排在前面的请求数估算
+"""
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from utils.helper.workers import per_worker_count
+
+import logging
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() not in ("0", "false", "no")
+# 整个服务同时执行的运行数（按 worker 数均分）
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+# 整个服务的等待队列长度上限（按 worker 数均分），超出时立即拒绝
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# 单个请求在队列中的最长等待时间，超时后拒绝
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+# Retry-After 的上下限（秒）
+ADMISSION_RETRY_AFTER_MIN = int(os.getenv("ADMISSION_RETRY_AFTER_MIN", "1"))
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "120"))
+
+# 排队时间、运行时间统计保留的最近样本数
+SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入；retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server is busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Permit:
+    """已取得的执行名额；release 可重复调用，只生效一次"""
+
+    def __init__(self, controller: "AdmissionController", kind: str, waited_seconds: float):
+        self._controller = controller
+        self.kind = kind
+        self.waited_seconds = waited_seconds
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+    async def __aenter__(self) -> "Permit":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    values = sorted(samples)
+    if not values:
+        return {"samples": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "samples": len(values),
+        "avg": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "p99": round(values[min(len(values) - 1, int(len(values) * 0.99))], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+class AdmissionController:
+    """固定执行名额加有界 FIFO 等待队列；只在 worker 的事件循环中使用"""
+
+    def __init__(self, *, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_wait_seconds: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_seconds = max_wait_seconds
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._waits: Deque[float] = deque(maxlen=SAMPLES)
+        self._runs: Deque[float] = deque(maxlen=SAMPLES)
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_wait_timeout": 0,
+                       "cancelled": 0}
+
+    def retry_after(self) -> int:
+        """按排在前面的请求数与最近运行的平均耗时估算多久后可能有空闲名额"""
+        avg_run = sum(self._runs) / len(self._runs) if self._runs else 1.0
+        ahead = len(self._waiters) + 1
+        estimate = math.ceil(avg_run * ahead / self.max_in_flight)
+        return max(ADMISSION_RETRY_AFTER_MIN, min(ADMISSION_RETRY_AFTER_MAX, estimate))
+
+    async def acquire(self, kind: str = "run") -> Permit:
+        """取得执行名额；队列已满或等待超时时抛出 AdmissionRejected，等待中被取消时退出队列"""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            return self._admit(kind, 0.0)
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise AdmissionRejected("queue full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经转交给本请求，交还给下一个等待者
+                self._in_flight -= 1
+                self._wake_next()
+            else:
+                waiter.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                self._stats["cancelled"] += 1
+                raise
+            self._stats["rejected_wait_timeout"] += 1
+            raise AdmissionRejected("wait timeout", self.retry_after())
+        # 名额在 _wake_next 中已计入 in_flight
+        self._in_flight -= 1
+        return self._admit(kind, time.monotonic() - start)
+
+    def _admit(self, kind: str, waited: float) -> Permit:
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        self._waits.append(waited)
+        return Permit(self, kind, waited)
+
+    def _remove(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake_next(self) -> None:
+        while self._waiters and self._in_flight < self.max_in_flight:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # 先占住名额，避免新到达的请求插队
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def _release(self, permit: Permit) -> None:
+        self._in_flight -= 1
+        self._runs.append(time.monotonic() - permit.admitted_at)
+        self._wake_next()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            **self._stats,
+            "queue_seconds": _percentiles(self._waits),
+            "run_seconds": _percentiles(self._runs),
+            "retry_after": self.retry_after(),
+        }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """获取进程级准入控制器；ADMISSION_ENABLED=false 且未通过 set_admission_controller 指定时返回 None"""
+    global _controller
+    if _controller is None and ADMISSION_ENABLED:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(max_in_flight=per_worker_count(ADMISSION_MAX_IN_FLIGHT),
+                                                  max_queue=per_worker_count(ADMISSION_MAX_QUEUE, minimum=0))
+    return _controller
+
+
+def set_admission_controller(controller: Optional[AdmissionController]) -> None:
+    """替换进程级准入控制器（基准测试或自定义容量时使用）"""
+    global _controller
+    with _controller_lock:
+        _controller = controller
@@ -1,7 +1,7 @@
 import uuid
 import json
 import os
-from typing import Any, Dict, List, Tuple, Iterator
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Iterator
 import time
 from utils.file.file import File, FileOps, infer_file_category
 from utils.error import classify_error
@@ -202,6 +202,8 @@ def _item_to_server_messages(
         )
 
     seq = sequence_id_start
+    # 工作流节点中的大模型流式输出：按产生消息的节点打标签，调用方可以区分并行节点交错到达的消息块
+    node_name = (meta or {}).get("langgraph_node") or ""
 
     # Answer chunks (AIMessageChunk)
     if chunk.__class__.__name__ == "AIMessageChunk":
@@ -226,9 +228,9 @@ def _item_to_server_messages(
         # Only emit answer if there is text content OR if it's a finish signal
         if text or (is_finished and not has_tool_calls):
             content = ServerMessageContent(answer=str(text) if text is not None else "")
-            messages.append(
-                _make_message(MESSAGE_TYPE_ANSWER, content, bool(is_finished), seq)
-            )
+            message = _make_message(MESSAGE_TYPE_ANSWER, content, bool(is_finished), seq)
+            message.node_name = node_name
+            messages.append(message)
             seq += 1
 
     # Final answer (AIMessage)
@@ -278,15 +280,15 @@ def _item_to_server_messages(
     return messages
 
 
-def _iter_body_to_server_messages(
-        items: Iterator[Dict[Any, Dict[str, Any]]],
+def _body_converter(
         *,
         session_id: str,
         query_msg_id: str,
         reply_id: str,
         sequence_id_start: int = 1,
         log_id: str = "",
-) -> Iterator[ServerMessage]:
+) -> Callable[[Any], List[ServerMessage]]:
+    """返回把单个 (chunk, meta) 转换为服务端消息的函数；同步与异步迭代共用，序号与未完成的工具调用等状态保存在闭包中"""
     seq = sequence_id_start
     # Stable msg_id mapping per logical message stream
     # Keys are derived from meta to keep same msg_id across chunks
@@ -340,7 +342,8 @@ def _iter_body_to_server_messages(
             seq_num += 1
         return msgs, seq_num
 
-    for item in items:
+    def convert(item) -> List[ServerMessage]:
+        nonlocal seq
         chunk, meta = item
         chunk_type = chunk.__class__.__name__
         is_last = (meta or {}).get("chunk_position") == "last"
@@ -455,7 +458,7 @@ def _iter_body_to_server_messages(
             final_msgs = flushed_msgs + msgs_to_yield
             msgs_to_yield = final_msgs
 
-
+        converted: List[ServerMessage] = []
         for m in msgs_to_yield:
             # Derive a stable grouping base for this item
             group_base = (
@@ -485,30 +488,52 @@ def _iter_body_to_server_messages(
                 stable_ids[key] = str(uuid.uuid4())
             m.msg_id = stable_ids[key]
 
-            yield m
+            converted.append(m)
+        return converted
 
+    return convert
 
-def iter_server_messages(
+
+def _iter_body_to_server_messages(
         items: Iterator[Dict[Any, Dict[str, Any]]],
         *,
         session_id: str,
         query_msg_id: str,
-        local_msg_id: str,
-        run_id: str,
+        reply_id: str,
         sequence_id_start: int = 1,
-        log_id: str,
+        log_id: str = "",
 ) -> Iterator[ServerMessage]:
-    t0 = time.time()
-    reply_id = str(uuid.uuid4())
-    start_msg_id = str(uuid.uuid4())
-    # message_start
-    start_sm = ServerMessage(
+    convert = _body_converter(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                              sequence_id_start=sequence_id_start, log_id=log_id)
+    for item in items:
+        yield from convert(item)
+
+
+async def _aiter_body_to_server_messages(
+        items: AsyncIterator[Any],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id_start: int = 1,
+        log_id: str = "",
+) -> AsyncIterator[ServerMessage]:
+    convert = _body_converter(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                              sequence_id_start=sequence_id_start, log_id=log_id)
+    async for item in items:
+        for m in convert(item):
+            yield m
+
+
+def _message_start(*, session_id: str, query_msg_id: str, local_msg_id: str, run_id: str, reply_id: str,
+                   sequence_id: int, log_id: str) -> ServerMessage:
+    return ServerMessage(
         type=MESSAGE_TYPE_MESSAGE_START,
         session_id=session_id,
         query_msg_id=query_msg_id,
         reply_id=reply_id,
-        msg_id=start_msg_id,
-        sequence_id=sequence_id_start,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
         finish=True,
         content=ServerMessageContent(
             message_start=MessageStartDetail(
@@ -517,8 +542,46 @@ def iter_server_messages(
         ),
         log_id=log_id,
     )
-    yield start_sm
-    next_seq = sequence_id_start + 1
+
+
+def _message_end(*, session_id: str, query_msg_id: str, reply_id: str, sequence_id: int, log_id: str, t0: float,
+                 code: str = MESSAGE_END_CODE_SUCCESS, message: str = "") -> ServerMessage:
+    t_ms = int((time.time() - t0) * 1000)
+    return ServerMessage(
+        type=MESSAGE_TYPE_MESSAGE_END,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
+        finish=True,
+        content=ServerMessageContent(
+            message_end=MessageEndDetail(
+                code=code,
+                message=message,
+                token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
+                time_cost_ms=t_ms,
+            )
+        ),
+        log_id=log_id,
+    )
+
+
+def iter_server_messages(
+        items: Iterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        sequence_id_start: int = 1,
+        log_id: str,
+) -> Iterator[ServerMessage]:
+    t0 = time.time()
+    reply_id = str(uuid.uuid4())
+    # message_start
+    yield _message_start(session_id=session_id, query_msg_id=query_msg_id, local_msg_id=local_msg_id,
+                         run_id=run_id, reply_id=reply_id, sequence_id=sequence_id_start, log_id=log_id)
     last_seq = sequence_id_start
     try:
         # body stream
@@ -527,57 +590,62 @@ def iter_server_messages(
                 session_id=session_id,
                 query_msg_id=query_msg_id,
                 reply_id=reply_id,
-                sequence_id_start=next_seq,
+                sequence_id_start=sequence_id_start + 1,
                 log_id=log_id,
         ):
             yield sm
             last_seq = sm.sequence_id
 
         # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code=MESSAGE_END_CODE_SUCCESS,
-                    message="",
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                    time_cost_ms=t_ms,
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+        yield _message_end(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                           sequence_id=last_seq + 1, log_id=log_id, t0=t0)
     except Exception as ex:
         # 使用错误分类器获取错误码
         err = classify_error(ex, {"node_name": "stream"})
-        # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code=str(err.code),
-                    message=err.message,
-                    time_cost_ms=t_ms,
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+        yield _message_end(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                           sequence_id=last_seq + 1, log_id=log_id, t0=t0, code=str(err.code), message=err.message)
+
+
+async def aiter_server_messages(
+        items: AsyncIterator[Any],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        sequence_id_start: int = 1,
+        log_id: str,
+) -> AsyncIterator[ServerMessage]:
+    """iter_server_messages 的异步版本：消费 graph.astream(stream_mode="messages") 的输出，消息格式与序号规则相同"""
+    t0 = time.time()
+    reply_id = str(uuid.uuid4())
+    yield _message_start(session_id=session_id, query_msg_id=query_msg_id, local_msg_id=local_msg_id,
+                         run_id=run_id, reply_id=reply_id, sequence_id=sequence_id_start, log_id=log_id)
+    last_seq = sequence_id_start
+    body = _aiter_body_to_server_messages(
+        items,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start + 1,
+        log_id=log_id,
+    )
+    try:
+        async for sm in body:
+            yield sm
+            last_seq = sm.sequence_id
+        yield _message_end(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                           sequence_id=last_seq + 1, log_id=log_id, t0=t0)
+    except Exception as ex:
+        # 使用错误分类器获取错误码
+        err = classify_error(ex, {"node_name": "stream"})
+        yield _message_end(session_id=session_id, query_msg_id=query_msg_id, reply_id=reply_id,
+                           sequence_id=last_seq + 1, log_id=log_id, t0=t0, code=str(err.code), message=err.message)
+    finally:
+        # 提前结束（取消、超时、客户端断开）时关闭图的异步迭代器，停止后续执行
+        await body.aclose()
+        if hasattr(items, "aclose"):
+            await items.aclose()
 
 
 def agent_iter_server_messages(
@@ -598,3 +666,24 @@ def agent_iter_server_messages(
         sequence_id_start=1,
         log_id=log_id,
     )
+
+
+def agent_aiter_server_messages(
+        items: AsyncIterator[Any],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        log_id: str,
+) -> AsyncIterator[ServerMessage]:
+    """agent_iter_server_messages 的异步版本"""
+    return aiter_server_messages(
+        items,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        sequence_id_start=1,
+        log_id=log_id,
+    )
@@ -45,6 +45,15 @@ def get_graph_node_func_with_inout(graph, node_name):
 
     return None, None, None
 
+def get_graph_node_afunc(graph, node_name):
+    """返回节点注册的异步实现（与同步实现一起注册时），没有时返回 None"""
+    for node_id, node in graph.nodes.items():
+        if node_id == START or node_id == END:
+            continue
+        if node.data and getattr(node.data, "func", None) is not None and node.data.func.__name__ == node_name:
+            return getattr(node.data, "afunc", None)
+    return None
+
 def is_agent_proj() -> bool:
     return os.getenv("COZE_PROJECT_TYPE", "workflow") == "agent"
 
@@ -0,0 +1,31 @@
+"""
+HTTP 服务的 worker 进程数。
+大模型调用调度（rpm、tpm、max_in_flight）与准入控制都是进程级的，多个 worker 时各自持有一份额度。
+配置值表示整个服务的总额度：启动服务时记录 worker 数（子进程通过环境变量继承），
+各进程按 worker 数均分，服务整体的上限不随 worker 数增长
+"""
+import os
+
+HTTP_WORKER_COUNT_ENV = "HTTP_WORKER_COUNT"
+
+
+def set_worker_count(workers: int) -> None:
+    """在启动 worker 进程之前调用"""
+    os.environ[HTTP_WORKER_COUNT_ENV] = str(max(1, int(workers)))
+
+
+def worker_count() -> int:
+    try:
+        return max(1, int(os.getenv(HTTP_WORKER_COUNT_ENV, "1")))
+    except ValueError:
+        return 1
+
+
+def per_worker(total: float) -> float:
+    """速率类额度（rpm、tpm）的本进程份额"""
+    return total / worker_count()
+
+
+def per_worker_count(total: int, minimum: int = 1) -> int:
+    """计数类额度（并发数、队列长度）的本进程份额，向下取整，不低于 minimum"""
+    return max(minimum, int(total) // worker_count())
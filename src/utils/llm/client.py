@@ -0,0 +1,207 @@
+import os
+import json
+import asyncio
+import importlib.metadata
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List
+from langchain_core.runnables import RunnableConfig
+from cozeloop.decorator import observe
+from storage.cache.llm_cache import get_llm_cache, make_cache_key
+from utils.llm.governor import get_llm_governor
+from utils.llm.prompt_packer import count_tokens
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "doubao-seed-1-6-251015"
+
+
+def load_llm_cfg(config: RunnableConfig) -> Dict[str, Any]:
+    """读取节点 metadata 中 llm_cfg 指向的配置文件"""
+    cfg_file = os.path.join(os.getenv("COZE_WORKSPACE_PATH"), config['metadata']['llm_cfg'])
+    with open(cfg_file, 'r') as fd:
+        return json.load(fd)
+
+
+def build_llm_params(llm_config: Dict[str, Any], default_max_tokens: int) -> Dict[str, Any]:
+    """从配置中提取模型与采样参数"""
+    return {
+        "model": llm_config.get("model", DEFAULT_MODEL),
+        "temperature": llm_config.get("temperature", 0.3),
+        "top_p": llm_config.get("top_p", 0.7),
+        "max_tokens": llm_config.get("max_tokens", default_max_tokens),
+        "frequency_penalty": llm_config.get("frequency_penalty", 0),
+    }
+
+
+def _lookup_cache(node_name: str, params: Dict[str, Any], system_prompt: str, user_prompt: str):
+    """返回 (cache, cache_key, 缓存内容)；未启用缓存时均为 None"""
+    cache = get_llm_cache()
+    if cache is None:
+        return None, None, None
+    sampling = {k: v for k, v in params.items() if k != "model"}
+    cache_key = make_cache_key(model=params["model"], params=sampling, system_prompt=system_prompt,
+                               user_prompt=user_prompt)
+    cached = cache.get(cache_key, node_name=node_name)
+    if cached is not None:
+        logger.info(f"LLM cache hit for node {node_name}")
+    return cache, cache_key, cached
+
+
+def _build_messages(system_prompt: str, user_prompt: str) -> List[Any]:
+    from langchain_core.messages import SystemMessage, HumanMessage
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+
+
+def _llm_slot(ctx, node_name: str, params: Dict[str, Any], system_prompt: str, user_prompt: str,
+              asynchronous: bool = False):
+    """
+    调用额度上下文：启用调度器时按运行公平排队，预留 提示词 + max_tokens 的 tpm 额度；
+    未启用时为空上下文（lease 为 None）
+    """
+    governor = get_llm_governor()
+    if governor is None:
+        return nullcontext()
+    request = {
+        "run_id": getattr(ctx, "run_id", "") or "",
+        "model": params["model"],
+        "tokens": count_tokens(system_prompt) + count_tokens(user_prompt) + int(params.get("max_tokens") or 0),
+        "progress": governor.progress_of(node_name),
+    }
+    return governor.aslot(**request) if asynchronous else governor.slot(**request)
+
+
+def _settle(lease, params: Dict[str, Any], content: Any) -> None:
+    """按实际输出长度结算，退回多预留的 tpm 额度"""
+    if lease is not None:
+        lease.used_tokens = lease.reserved_tokens - int(params.get("max_tokens") or 0) + count_tokens(str(content))
+
+
+def invoke_llm(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, user_prompt: str,
+               default_max_tokens: int = 2000) -> str:
+    """调用大模型并返回文本内容；渲染后的提示词完全相同时直接复用缓存结果"""
+    from coze_coding_dev_sdk import LLMClient
+
+    params = build_llm_params(llm_config, default_max_tokens)
+    cache, cache_key, cached = _lookup_cache(node_name, params, system_prompt, user_prompt)
+    if cached is not None:
+        return cached
+
+    client = LLMClient(ctx=ctx)
+    # 流式调用：在工作流以 stream_mode="messages" 运行时，每个 token 都会作为消息块实时推送给调用方
+    parts = []
+    with _llm_slot(ctx, node_name, params, system_prompt, user_prompt) as lease:
+        for chunk in client.stream(messages=_build_messages(system_prompt, user_prompt), **params):
+            if isinstance(chunk.content, str) and chunk.content:
+                parts.append(chunk.content)
+        content = "".join(parts)
+        _settle(lease, params, content)
+
+    if cache is not None and content:
+        cache.put(cache_key, content, model=params["model"])
+    return content
+
+
+# 已核对过 LLMClient.stream 与 _create_llm 实现的 SDK 版本（主版本.次版本）。
+# SDK 没有公开的异步接口，这些版本下复用 _create_llm 构建同样的模型异步流式调用；其他版本回退到线程中执行 client.stream
+SDK_ASYNC_COMPATIBLE_VERSIONS = ("0.5",)
+
+
+@lru_cache(maxsize=1)
+def _sdk_version() -> str:
+    try:
+        return importlib.metadata.version("coze-coding-dev-sdk")
+    except importlib.metadata.PackageNotFoundError:
+        return ""
+
+
+def _sdk_supports_async(client) -> bool:
+    version = '.'.join(_sdk_version().split('.')[:2])
+    return version in SDK_ASYNC_COMPATIBLE_VERSIONS and callable(getattr(client, "_create_llm", None))
+
+
+@lru_cache(maxsize=1)
+def _log_thread_fallback() -> None:
+    logger.warning(f"coze-coding-dev-sdk {_sdk_version() or 'unknown'} is not verified for async streaming, "
+                   f"streaming LLM calls in threads")
+
+
+def _trace_stream_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """追踪输入与 LLMClient.stream 一致：args 为消息列表，kwargs 为模型参数"""
+    _, messages, params = inputs["args"]
+    return {"args": (messages,), "kwargs": params}
+
+
+@observe(name="llm_stream", process_inputs=_trace_stream_inputs)
+async def _astream_sdk_model(client, messages: List[Any], params: Dict[str, Any]) -> AsyncIterator[Any]:
+    """按 LLMClient.stream 的方式构建模型（thinking、caching 默认值与请求头），在同名追踪 span 中异步流式调用"""
+    from coze_coding_dev_sdk.llm import LLMConfig
+
+    llm_config = LLMConfig(**params, streaming=True)
+    llm = client._create_llm(llm_config, use_caching=llm_config.caching == "enabled")
+    async for chunk in llm.astream(messages):
+        yield chunk
+
+
+async def _astream_in_thread(client, messages: List[Any], params: Dict[str, Any]) -> AsyncIterator[Any]:
+    """回退方式：在线程中逐块读取同步的 client.stream（SDK 自身的追踪与参数处理不变），等待期间不阻塞事件循环"""
+    chunks = client.stream(messages=messages, **params)
+    done = object()
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        try:
+            chunks.close()
+        except ValueError:
+            # 被取消时线程仍在读取当前块，读取完成后由垃圾回收关闭
+            pass
+
+
+async def astream_llm(ctx, messages: List[Any], params: Dict[str, Any]) -> AsyncIterator[Any]:
+    """
+    异步流式调用大模型，逐块返回消息。
+    SDK 提供 astream 时直接使用；否则在已核对的 SDK 版本上复用其模型构建逻辑异步调用，其他版本回退到线程中执行同步流式调用
+    """
+    from coze_coding_dev_sdk import LLMClient
+
+    client = LLMClient(ctx=ctx)
+    if hasattr(client, "astream"):
+        stream = client.astream(messages=messages, **params)
+    elif _sdk_supports_async(client):
+        stream = _astream_sdk_model(client, messages, params)
+    else:
+        _log_thread_fallback()
+        stream = _astream_in_thread(client, messages, params)
+    async for chunk in stream:
+        yield chunk
+
+
+async def ainvoke_llm(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, user_prompt: str,
+                      default_max_tokens: int = 2000) -> str:
+    """
+    invoke_llm 的异步版本：等待模型响应期间不占用线程；
+    所在任务被取消（如 /cancel）时，进行中的请求随 CancelledError 一起中断
+    """
+    params = build_llm_params(llm_config, default_max_tokens)
+    cache, cache_key, cached = _lookup_cache(node_name, params, system_prompt, user_prompt)
+    if cached is not None:
+        return cached
+
+    parts = []
+    async with _llm_slot(ctx, node_name, params, system_prompt, user_prompt, asynchronous=True) as lease:
+        async for chunk in astream_llm(ctx, _build_messages(system_prompt, user_prompt), params):
+            if isinstance(chunk.content, str) and chunk.content:
+                parts.append(chunk.content)
+        content = "".join(parts)
+        _settle(lease, params, content)
+
+    if cache is not None and content:
+        cache.put(cache_key, content, model=params["model"])
+    return content
@@ -0,0 +1,421 @@
+"""
+进程级大模型调用调度：
+- 按模型的令牌桶限制每分钟请求数（rpm）和每分钟 token 数（tpm）
+- 限制全局同时进行中的调用数
+- 多个运行之间加权公平排队，越接近完成的运行权重越高，优先结束
+- 同步（线程）与异步（协程）调用方共用同一个调度器
+"""
+import os
+import json
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+from utils.error import ErrorCode, VibeCodingError
+from utils.helper.workers import per_worker, per_worker_count, worker_count
+import logging
+logger = logging.getLogger(__name__)
+
+LLM_GOVERNOR_ENABLED = os.getenv("LLM_GOVERNOR_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_GOVERNOR_CFG = os.getenv("LLM_GOVERNOR_CFG", "config/llm_governor_cfg.json")
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_MAX_WAIT_SECONDS = 600
+# 进度为 1.0 的运行获得 1 + PRIORITY_BOOST 倍的调度份额
+DEFAULT_PRIORITY_BOOST = 3.0
+# 等待时间统计保留的最近样本数
+WAIT_SAMPLES = 1000
+# 按 worker 数均分的速率额度
+_RATE_KEYS = ("rpm", "tpm", "rpm_burst", "tpm_burst")
+
+
+class TokenBucket:
+    """令牌桶：容量默认为一分钟的额度，按时间匀速补充；per_minute <= 0 表示不限制"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = float(per_minute or 0)
+        self.capacity = float(capacity or self.per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.per_minute > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """取得 amount 个令牌还需等待的秒数；单次需求超过桶容量时按桶满放行，避免永远等待"""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.per_minute
+
+    def take(self, amount: float, now: float) -> None:
+        if self.per_minute <= 0:
+            return
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        if self.per_minute > 0 and amount > 0:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class _ModelLimit:
+    requests: TokenBucket
+    tokens: TokenBucket
+    granted: int = 0
+    throttled: int = 0  # 因 rpm/tpm 额度不足而延后放行的次数
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+@dataclass(eq=False)
+class _Ticket:
+    run_id: str
+    model: str
+    tokens: int
+    progress: float
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+    throttled: bool = False
+    event: Optional[threading.Event] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    future: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+@dataclass(eq=False)
+class _RunQueue:
+    run_id: str
+    vtime: float
+    seq: int
+    progress: float = 0.0
+    in_flight: int = 0
+    tickets: Deque[_Ticket] = field(default_factory=deque)
+
+
+@dataclass
+class Lease:
+    """已取得的调用额度；调用结束后把 used_tokens 设为实际消耗，多预留的 tpm 额度会退回"""
+    run_id: str
+    model: str
+    reserved_tokens: int
+    waited_seconds: float
+    used_tokens: Optional[int] = None
+
+
+class LLMGovernor:
+    """
+    大模型调用调度器。
+    每个运行一个队列，按虚拟时间（已获调度次数 / 权重）从小到大放行，权重 = 1 + priority_boost * 进度；
+    队首请求所属模型的 rpm/tpm 额度不足时跳过该运行，先放行其他模型的请求
+    """
+
+    def __init__(self, *, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, models: Dict[str, Dict[str, float]] = None,
+                 default_limits: Dict[str, float] = None, max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+                 priority_boost: float = DEFAULT_PRIORITY_BOOST, node_progress: Dict[str, float] = None):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_wait_seconds = max_wait_seconds
+        self.priority_boost = priority_boost
+        self.node_progress = node_progress or {}
+        self._model_cfg = models or {}
+        self._default_limits = default_limits or {}
+        self._lock = threading.Lock()
+        self._limits: Dict[str, _ModelLimit] = {}
+        self._runs: Dict[str, _RunQueue] = {}
+        self._seq = itertools.count()
+        self._vclock = 0.0
+        self._in_flight = 0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._stats = {"granted": 0, "timeouts": 0, "cancelled": 0}
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "LLMGovernor":
+        return cls(
+            max_in_flight=cfg.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT),
+            models=cfg.get("models"),
+            default_limits=cfg.get("default"),
+            max_wait_seconds=cfg.get("max_wait_seconds", DEFAULT_MAX_WAIT_SECONDS),
+            priority_boost=cfg.get("priority_boost", DEFAULT_PRIORITY_BOOST),
+            node_progress=cfg.get("node_progress"),
+        )
+
+    def progress_of(self, node_name: str) -> float:
+        """节点在工作流中的大致进度（0~1），用于调度优先级；未配置的节点按 0 处理"""
+        return float(self.node_progress.get(node_name, 0.0))
+
+    # ---- 调度核心（均在持锁状态下调用）----
+
+    def _limit(self, model: str) -> _ModelLimit:
+        limit = self._limits.get(model)
+        if limit is None:
+            cfg = {**self._default_limits, **self._model_cfg.get(model, {})}
+            limit = _ModelLimit(requests=TokenBucket(cfg.get("rpm", 0), cfg.get("rpm_burst")),
+                                tokens=TokenBucket(cfg.get("tpm", 0), cfg.get("tpm_burst")))
+            self._limits[model] = limit
+        return limit
+
+    def _weight(self, run: _RunQueue) -> float:
+        return 1.0 + self.priority_boost * min(max(run.progress, 0.0), 1.0)
+
+    def _drop_if_idle(self, run: _RunQueue) -> None:
+        if not run.tickets and run.in_flight == 0:
+            self._runs.pop(run.run_id, None)
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        retry_in = None
+        while self._in_flight < self.max_in_flight:
+            candidates = sorted((r for r in self._runs.values() if r.tickets),
+                                key=lambda r: (r.vtime, -r.progress, r.seq))
+            chosen = None
+            for run in candidates:
+                ticket = run.tickets[0]
+                limit = self._limit(ticket.model)
+                wait = limit.wait_time(ticket.tokens, now)
+                if wait > 0:
+                    if not ticket.throttled:
+                        ticket.throttled = True
+                        limit.throttled += 1
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                    continue
+                chosen = run
+                break
+            if chosen is None:
+                break
+            ticket = chosen.tickets.popleft()
+            limit = self._limit(ticket.model)
+            limit.requests.take(1, now)
+            limit.tokens.take(ticket.tokens, now)
+            limit.granted += 1
+            self._vclock = chosen.vtime
+            chosen.vtime += 1.0 / self._weight(chosen)
+            chosen.in_flight += 1
+            self._in_flight += 1
+            self._stats["granted"] += 1
+            self._waits.append(now - ticket.enqueued_at)
+            ticket.granted = True
+            ticket.wake()
+        if retry_in is not None:
+            self._schedule_retry(retry_in)
+
+    def _schedule_retry(self, delay: float) -> None:
+        """额度不足时定时重新调度（只保留最早的一个定时器）"""
+        at = time.monotonic() + delay
+        if self._timer is not None and self._timer.is_alive() and self._timer_at <= at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay + 0.001, self._on_timer)
+        self._timer.daemon = True
+        self._timer_at = at
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        with self._lock:
+            run = self._runs.get(ticket.run_id)
+            if run is None:
+                # 新运行从当前虚拟时间开始排队，不会因为之前空闲而占用过多份额
+                run = _RunQueue(run_id=ticket.run_id, vtime=self._vclock, seq=next(self._seq))
+                self._runs[ticket.run_id] = run
+            run.progress = max(run.progress, ticket.progress)
+            run.tickets.append(ticket)
+            self._dispatch()
+
+    def _withdraw(self, ticket: _Ticket) -> bool:
+        """撤回仍在排队的请求；已被放行时返回 False（调用方持有额度，需要自行释放）"""
+        with self._lock:
+            if ticket.granted:
+                return False
+            run = self._runs.get(ticket.run_id)
+            if run is not None:
+                try:
+                    run.tickets.remove(ticket)
+                except ValueError:
+                    pass
+                self._drop_if_idle(run)
+            return True
+
+    def _release(self, ticket: _Ticket, used_tokens: Optional[int], refund_request: bool = False) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            run = self._runs.get(ticket.run_id)
+            if run is not None:
+                run.in_flight -= 1
+                self._drop_if_idle(run)
+            limit = self._limit(ticket.model)
+            if used_tokens is not None:
+                limit.tokens.give_back(ticket.tokens - used_tokens)
+            if refund_request:
+                limit.requests.give_back(1)
+            self._dispatch()
+
+    def _timeout_error(self, ticket: _Ticket) -> VibeCodingError:
+        self._stats["timeouts"] += 1
+        return VibeCodingError(
+            ErrorCode.API_LLM_RATE_LIMIT,
+            f"等待大模型调用额度超时（{self.max_wait_seconds}s）",
+            context={"run_id": ticket.run_id, "model": ticket.model, "tokens": ticket.tokens},
+        )
+
+    # ---- 调用方接口 ----
+
+    @contextmanager
+    def slot(self, *, run_id: str, model: str, tokens: int, progress: float = 0.0):
+        """同步获取调用额度（阻塞当前线程直到放行），退出时释放"""
+        ticket = _Ticket(run_id=run_id or "", model=model, tokens=tokens, progress=progress,
+                         event=threading.Event())
+        self._enqueue(ticket)
+        if not ticket.event.wait(self.max_wait_seconds) and self._withdraw(ticket):
+            raise self._timeout_error(ticket)
+        lease = Lease(run_id=ticket.run_id, model=model, reserved_tokens=tokens,
+                      waited_seconds=time.monotonic() - ticket.enqueued_at)
+        try:
+            yield lease
+        finally:
+            self._release(ticket, lease.used_tokens)
+
+    @asynccontextmanager
+    async def aslot(self, *, run_id: str, model: str, tokens: int, progress: float = 0.0):
+        """异步获取调用额度；排队期间任务被取消时撤回请求，已放行的额度原样退回"""
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(run_id=run_id or "", model=model, tokens=tokens, progress=progress,
+                         loop=loop, future=loop.create_future())
+        self._enqueue(ticket)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if self._withdraw(ticket):
+                raise self._timeout_error(ticket)
+        except asyncio.CancelledError:
+            if self._withdraw(ticket):
+                self._stats["cancelled"] += 1
+            else:
+                self._release(ticket, used_tokens=0, refund_request=True)
+            raise
+        lease = Lease(run_id=ticket.run_id, model=model, reserved_tokens=tokens,
+                      waited_seconds=time.monotonic() - ticket.enqueued_at)
+        try:
+            yield lease
+        finally:
+            self._release(ticket, lease.used_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            now = time.monotonic()
+            queued = [t for r in self._runs.values() for t in r.tickets]
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": len(queued),
+                "queued_runs": sum(1 for r in self._runs.values() if r.tickets),
+                "oldest_wait_seconds": round(max((now - t.enqueued_at for t in queued), default=0.0), 3),
+                **self._stats,
+                "wait_seconds": {
+                    "samples": len(waits),
+                    "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                    "max": round(waits[-1], 3) if waits else 0.0,
+                },
+                "models": {
+                    model: {
+                        "granted": limit.granted,
+                        "throttled": limit.throttled,
+                        "queued": sum(1 for t in queued if t.model == model),
+                        "rpm_available": round(limit.requests.tokens, 1) if limit.requests.per_minute > 0 else None,
+                        "tpm_available": round(limit.tokens.tokens) if limit.tokens.per_minute > 0 else None,
+                    }
+                    for model, limit in self._limits.items()
+                },
+            }
+
+
+_governor: Optional[LLMGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def load_governor_config(path: str = LLM_GOVERNOR_CFG) -> Dict[str, Any]:
+    """读取调度配置；相对路径相对于工作区目录，文件不存在时使用默认值"""
+    if not os.path.isabs(path):
+        path = os.path.join(os.getenv("COZE_WORKSPACE_PATH", ""), path)
+    try:
+        with open(path, 'r') as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        logger.warning(f"LLM governor config not found at {path}, using defaults")
+        return {}
+
+
+def split_for_workers(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    配置中的 rpm、tpm、max_in_flight 是整个服务（所有 worker 进程）的总额度，
+    多个 worker 时按 worker 数均分给每个进程，保证服务整体不超过模型服务商的限额
+    """
+    workers = worker_count()
+    if workers == 1:
+        return cfg
+
+    def split(limits: Dict[str, float]) -> Dict[str, float]:
+        return {k: per_worker(v) if k in _RATE_KEYS and v else v for k, v in (limits or {}).items()}
+
+    max_in_flight = cfg.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)
+    if max_in_flight < workers:
+        logger.warning(f"LLM governor max_in_flight {max_in_flight} is lower than {workers} workers, "
+                       f"each worker still allows 1 call")
+    logger.info(f"LLM governor limits split across {workers} workers")
+    return {
+        **cfg,
+        "max_in_flight": per_worker_count(max_in_flight),
+        "default": split(cfg.get("default")),
+        "models": {model: split(limits) for model, limits in (cfg.get("models") or {}).items()},
+    }
+
+
+def get_llm_governor() -> Optional[LLMGovernor]:
+    """获取进程级调度器实例；LLM_GOVERNOR_ENABLED=false 或配置中 enabled 为 false 时返回 None"""
+    global _governor
+    if not LLM_GOVERNOR_ENABLED:
+        return None
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                cfg = load_governor_config()
+                _governor = LLMGovernor.from_config(split_for_workers(cfg)) if cfg.get("enabled", True) else False
+    return _governor or None
+
+
+def set_llm_governor(governor: Optional[LLMGovernor]) -> None:
+    """替换进程级调度器（基准测试、本地调试时使用；传入 None 后按配置重新创建）"""
+    global _governor
+    with _governor_lock:
+        _governor = governor
@@ -0,0 +1,318 @@
+"""
+超出单次上下文的分析采用 map-reduce：
+- 按 token 预算把内容切分为多个分片，每个分片一次大模型调用（有并发上限）
+- reduce 阶段把各分片结果合并：直接拼接，或再调用一次大模型合并
+- 记录每个分片的 token 数与耗时，便于按吞吐调整分片大小
+- 同时提供同步（线程池）与异步（协程）两种执行方式，节点的提示词构建只写一份（LLMJob）
+"""
+import time
+import asyncio
+import threading
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from jinja2 import Template
+
+from utils.code.c_parser import split_declarations
+from utils.llm.client import ainvoke_llm, invoke_llm
+from utils.llm.prompt_packer import PackItem, count_tokens, pack_items
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+REDUCE_CONCAT = "concat"
+REDUCE_LLM = "llm"
+
+
+@dataclass
+class ShardResult:
+    index: int
+    prompt_tokens: int
+    latency: float
+    output: str
+
+
+class _ShardStats:
+    """进程内分片调用统计，按节点汇总，供 /metrics 查看"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"shards": 0, "prompt_tokens": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0})
+
+    def record(self, node_name: str, result: ShardResult) -> None:
+        with self._lock:
+            stats = self._stats[node_name]
+            stats["shards"] += 1
+            stats["prompt_tokens"] += result.prompt_tokens
+            stats["latency_seconds"] += result.latency
+            stats["max_latency_seconds"] = max(stats["max_latency_seconds"], result.latency)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for node, stats in self._stats.items():
+                shards = stats["shards"] or 1
+                result[node] = {
+                    **stats,
+                    "avg_latency_seconds": round(stats["latency_seconds"] / shards, 3),
+                    "avg_prompt_tokens": int(stats["prompt_tokens"] / shards),
+                }
+            return result
+
+
+_shard_stats = _ShardStats()
+
+
+def get_shard_stats() -> Dict[str, Dict[str, float]]:
+    return _shard_stats.snapshot()
+
+
+def shard_items(items: Sequence[PackItem], budget: int) -> List[List[PackItem]]:
+    """
+    按优先级顺序把内容切分为若干分片，每个分片不超过 budget。
+    单个文件超过预算时按顶层声明拆成多段，拆分后的各段依次放入新分片。
+    """
+    shards: List[List[PackItem]] = []
+    current: List[PackItem] = []
+    used = 0
+    ordered = sorted(enumerate(items), key=lambda pair: (pair[1].priority, pair[0]))
+
+    def flush():
+        nonlocal current, used
+        if current:
+            shards.append(current)
+        current, used = [], 0
+
+    for _, item in ordered:
+        header = f"{item.header}\n" if item.header else ""
+        tokens = count_tokens(header + item.text) + 1
+        if tokens > budget and item.splittable:
+            # 超大文件：按声明拆分为多个片段
+            flush()
+            part: List[str] = []
+            part_tokens = count_tokens(header)
+            for decl in split_declarations(item.text):
+                decl_tokens = count_tokens(decl)
+                if part and part_tokens + decl_tokens > budget:
+                    shards.append([PackItem(key=item.key, text=''.join(part), priority=item.priority,
+                                            header=header.rstrip('\n'), splittable=False)])
+                    part, part_tokens = [], count_tokens(header)
+                part.append(decl)
+                part_tokens += decl_tokens
+            if part:
+                current = [PackItem(key=item.key, text=''.join(part), priority=item.priority,
+                                    header=header.rstrip('\n'), splittable=False)]
+                used = part_tokens
+            continue
+        if current and used + tokens > budget:
+            flush()
+        current.append(item)
+        used += tokens
+    flush()
+    return shards
+
+
+def render_shard(shard: Sequence[PackItem], budget: int) -> str:
+    """渲染单个分片（分片已按预算切分，这里只负责拼接并兜底截断超大声明）"""
+    return pack_items(shard, budget, dropped_note="\n// 以下内容超出单个分片长度未包含: {files}\n").text
+
+
+def _finish_shard(node_name: str, total: int, index: int, prompt_tokens: int, start: float,
+                  output: str) -> ShardResult:
+    result = ShardResult(index=index, prompt_tokens=prompt_tokens, latency=time.time() - start, output=output)
+    _shard_stats.record(node_name, result)
+    logger.info(f"{node_name} shard {index + 1}/{total}: {prompt_tokens} prompt tokens, "
+                f"{result.latency:.2f}s, {prompt_tokens / max(result.latency, 1e-6):.0f} tokens/s")
+    return result
+
+
+def _log_map_finished(node_name: str, results: List[ShardResult], start: float, max_concurrency: int) -> None:
+    logger.info(f"{node_name} map finished: {len(results)} shards in {time.time() - start:.2f}s "
+                f"(sum of shard latency {sum(r.latency for r in results):.2f}s, concurrency {max_concurrency})")
+
+
+def run_map(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, prompts: Sequence[str],
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY, default_max_tokens: int = 2000) -> List[ShardResult]:
+    """并发执行各分片的大模型调用（并发数不超过 max_concurrency），结果按分片顺序返回"""
+
+    def run_one(index: int, prompt: str) -> ShardResult:
+        prompt_tokens = count_tokens(prompt)
+        start = time.time()
+        output = invoke_llm(
+            ctx,
+            node_name=node_name,
+            llm_config=llm_config,
+            system_prompt=system_prompt,
+            user_prompt=prompt,
+            default_max_tokens=default_max_tokens,
+        )
+        return _finish_shard(node_name, len(prompts), index, prompt_tokens, start, output)
+
+    if len(prompts) == 1:
+        return [run_one(0, prompts[0])]
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts))),
+                            thread_name_prefix=f"{node_name}_map") as executor:
+        # 复制上下文，分片线程中的大模型调用同样挂在节点的运行配置下（流式输出、追踪）
+        futures = [executor.submit(contextvars.copy_context().run, run_one, i, prompt)
+                   for i, prompt in enumerate(prompts)]
+        results = [f.result() for f in futures]
+    _log_map_finished(node_name, results, start, max_concurrency)
+    return results
+
+
+async def arun_map(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, prompts: Sequence[str],
+                   max_concurrency: int = DEFAULT_MAX_CONCURRENCY, default_max_tokens: int = 2000) -> List[ShardResult]:
+    """run_map 的异步版本：用信号量限制并发；任一分片失败或任务被取消时，其余分片一并取消"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(index: int, prompt: str) -> ShardResult:
+        async with semaphore:
+            prompt_tokens = count_tokens(prompt)
+            start = time.time()
+            output = await ainvoke_llm(
+                ctx,
+                node_name=node_name,
+                llm_config=llm_config,
+                system_prompt=system_prompt,
+                user_prompt=prompt,
+                default_max_tokens=default_max_tokens,
+            )
+            return _finish_shard(node_name, len(prompts), index, prompt_tokens, start, output)
+
+    if len(prompts) == 1:
+        return [await run_one(0, prompts[0])]
+
+    start = time.time()
+    tasks = [asyncio.ensure_future(run_one(i, prompt)) for i, prompt in enumerate(prompts)]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    _log_map_finished(node_name, results, start, max_concurrency)
+    return list(results)
+
+
+def _reduce_prompt(node_name: str, reduce_template: str, partial_results: Sequence[str], budget: int,
+                   extra: Optional[Dict[str, Any]], separator: str) -> Optional[str]:
+    """渲染合并提示词；合并输入超出预算时返回 None（由调用方退化为直接拼接）"""
+    joined = separator.join(f"<!-- 分片 {i + 1} -->\n{r.strip()}" for i, r in enumerate(partial_results))
+    if count_tokens(joined) > budget:
+        logger.warning(f"{node_name} reduce input exceeds budget ({count_tokens(joined)} > {budget}), "
+                       f"concatenating shard results instead")
+        return None
+    return Template(reduce_template).render({"partial_results": joined, **(extra or {})})
+
+
+def run_reduce(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, reduce_template: str,
+               partial_results: Sequence[str], budget: int, extra: Dict[str, Any] = None,
+               default_max_tokens: int = 2000, separator: str = "\n\n---\n\n") -> str:
+    """调用大模型合并分片结果；合并输入超出预算时退化为直接拼接"""
+    prompt = _reduce_prompt(node_name, reduce_template, partial_results, budget, extra, separator)
+    if prompt is None:
+        return "\n\n".join(r.strip() for r in partial_results)
+    start = time.time()
+    output = invoke_llm(
+        ctx,
+        node_name=f"{node_name}_reduce",
+        llm_config=llm_config,
+        system_prompt=system_prompt,
+        user_prompt=prompt,
+        default_max_tokens=default_max_tokens,
+    )
+    logger.info(f"{node_name} reduce: {len(partial_results)} partial results, {time.time() - start:.2f}s")
+    return output
+
+
+async def arun_reduce(ctx, *, node_name: str, llm_config: Dict[str, Any], system_prompt: str, reduce_template: str,
+                      partial_results: Sequence[str], budget: int, extra: Dict[str, Any] = None,
+                      default_max_tokens: int = 2000, separator: str = "\n\n---\n\n") -> str:
+    """run_reduce 的异步版本"""
+    prompt = _reduce_prompt(node_name, reduce_template, partial_results, budget, extra, separator)
+    if prompt is None:
+        return "\n\n".join(r.strip() for r in partial_results)
+    start = time.time()
+    output = await ainvoke_llm(
+        ctx,
+        node_name=f"{node_name}_reduce",
+        llm_config=llm_config,
+        system_prompt=system_prompt,
+        user_prompt=prompt,
+        default_max_tokens=default_max_tokens,
+    )
+    logger.info(f"{node_name} reduce: {len(partial_results)} partial results, {time.time() - start:.2f}s")
+    return output
+
+
+@dataclass
+class LLMJob:
+    """
+    一个节点的全部大模型调用：prompts 为各分片提示词（sharded=False 时只有一条，直接单次调用）；
+    postprocess 在合并前处理各分片输出；配置了 reduce_template 时调用大模型合并，否则直接拼接
+    """
+    node_name: str
+    llm_config: Dict[str, Any]
+    system_prompt: str
+    prompts: List[str]
+    default_max_tokens: int = 2000
+    sharded: bool = True
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    postprocess: Optional[Callable[[List[str]], List[str]]] = None
+    reduce_template: str = ""
+    reduce_budget: int = 0
+    reduce_extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _job_map_kwargs(job: LLMJob) -> Dict[str, Any]:
+    return dict(node_name=job.node_name, llm_config=job.llm_config, system_prompt=job.system_prompt,
+                prompts=job.prompts, max_concurrency=job.max_concurrency,
+                default_max_tokens=job.default_max_tokens)
+
+
+def _job_reduce_kwargs(job: LLMJob, outputs: List[str]) -> Dict[str, Any]:
+    return dict(node_name=job.node_name, llm_config=job.llm_config, system_prompt=job.system_prompt,
+                reduce_template=job.reduce_template, partial_results=outputs, budget=job.reduce_budget,
+                extra=job.reduce_extra, default_max_tokens=job.default_max_tokens)
+
+
+def _single_call_kwargs(job: LLMJob) -> Dict[str, Any]:
+    return dict(node_name=job.node_name, llm_config=job.llm_config, system_prompt=job.system_prompt,
+                user_prompt=job.prompts[0], default_max_tokens=job.default_max_tokens)
+
+
+def _postprocess(job: LLMJob, results: List[ShardResult]) -> List[str]:
+    outputs = [r.output for r in results]
+    return job.postprocess(outputs) if job.postprocess else outputs
+
+
+def run_job(ctx, job: LLMJob) -> str:
+    """同步执行 LLMJob（分片在线程池中并发）"""
+    if not job.sharded:
+        return invoke_llm(ctx, **_single_call_kwargs(job))
+    outputs = _postprocess(job, run_map(ctx, **_job_map_kwargs(job)))
+    if len(outputs) == 1:
+        return outputs[0]
+    if job.reduce_template:
+        return run_reduce(ctx, **_job_reduce_kwargs(job, outputs))
+    return "\n\n".join(o.strip() for o in outputs)
+
+
+async def arun_job(ctx, job: LLMJob) -> str:
+    """异步执行 LLMJob（分片以协程并发）"""
+    if not job.sharded:
+        return await ainvoke_llm(ctx, **_single_call_kwargs(job))
+    outputs = _postprocess(job, await arun_map(ctx, **_job_map_kwargs(job)))
+    if len(outputs) == 1:
+        return outputs[0]
+    if job.reduce_template:
+        return await arun_reduce(ctx, **_job_reduce_kwargs(job, outputs))
+    return "\n\n".join(o.strip() for o in outputs)
@@ -0,0 +1,139 @@
+"""
+按 token 预算组装提示词：
+- 用 tiktoken 计数（编码文件不可用时退化为按字符估算）
+- 按优先级装入文件，整文件放不下时按顶层声明装入，尽量不截断声明
+- 记录被部分装入和被丢弃的文件，便于排查分析结果缺失
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.code.c_parser import split_declarations
+import logging
+logger = logging.getLogger(__name__)
+
+# 模型上下文窗口（token），可在 llm_cfg 的 config.context_window 中覆盖
+DEFAULT_CONTEXT_WINDOW = 128000
+# 未配置 config.max_input_tokens 时，单次调用代码内容的默认 token 预算
+DEFAULT_MAX_INPUT_TOKENS = 24000
+# 预留给消息格式开销和计数误差的 token
+SAFETY_MARGIN_TOKENS = 512
+
+TOKENIZER_ENCODING = "cl100k_base"
+
+_CJK_RE = re.compile(r'[⺀-鿿가-힯＀-￯]')
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """加载 tiktoken 编码；离线环境下编码文件无法下载时返回 None（只尝试一次）"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, falling back to heuristic token count: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """统计文本 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 估算：中日韩字符约 1 token/字，其余（代码、英文）约 3 字符/token
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 2) // 3
+
+
+def input_token_budget(llm_config: Dict[str, Any], *fixed_texts: str, default_max_tokens: int = 2000) -> int:
+    """
+    计算可用于填充内容的 token 预算：
+    min(config.max_input_tokens, 上下文窗口 - 输出 max_tokens - 固定文本（系统提示词、模板）- 安全余量)
+    """
+    context_window = int(llm_config.get("context_window", DEFAULT_CONTEXT_WINDOW))
+    max_output = int(llm_config.get("max_tokens", default_max_tokens))
+    fixed = sum(count_tokens(t) for t in fixed_texts)
+    available = context_window - max_output - fixed - SAFETY_MARGIN_TOKENS
+    return max(min(int(llm_config.get("max_input_tokens", DEFAULT_MAX_INPUT_TOKENS)), available), 0)
+
+
+@dataclass
+class PackItem:
+    """待装入的一段内容：key 为文件路径，priority 越小越优先"""
+    key: str
+    text: str
+    priority: int = 0
+    header: str = ""  # 装入时放在内容前的标注行（如 // File: path）
+    splittable: bool = True  # 放不下时是否允许按声明部分装入
+
+
+@dataclass
+class PackResult:
+    text: str
+    budget: int
+    used_tokens: int
+    included: List[str] = field(default_factory=list)
+    partial: Dict[str, str] = field(default_factory=dict)  # key -> "装入声明数/总声明数"
+    dropped: List[str] = field(default_factory=list)
+
+    def report(self) -> str:
+        parts = [f"{self.used_tokens}/{self.budget} tokens, {len(self.included)} whole"]
+        if self.partial:
+            parts.append("partial: " + ", ".join(f"{k} ({v})" for k, v in self.partial.items()))
+        if self.dropped:
+            parts.append(f"dropped {len(self.dropped)}: " + ", ".join(self.dropped))
+        return "; ".join(parts)
+
+
+def pack_items(items: Sequence[PackItem], budget: int, separator: str = "\n",
+               dropped_note: Optional[str] = "\n// 以下文件因上下文长度限制未包含: {files}\n") -> PackResult:
+    """
+    按优先级（同优先级保持原顺序）装入内容直至用完预算。
+    整段放不下时，若允许拆分则按顶层声明依次装入放得下的声明（跳过放不下的大声明，继续尝试后面较小的声明）。
+    dropped_note 非空时，在结果末尾附上被完全丢弃的文件列表，让模型知道分析范围。
+    """
+    ordered = sorted(enumerate(items), key=lambda pair: (pair[1].priority, pair[0]))
+    sep_tokens = count_tokens(separator)
+    pieces: List[str] = []
+    used = 0
+    result = PackResult(text="", budget=budget, used_tokens=0)
+
+    for _, item in ordered:
+        header = f"{item.header}\n" if item.header else ""
+        whole = header + item.text
+        tokens = count_tokens(whole) + sep_tokens
+        if used + tokens <= budget:
+            pieces.append(whole)
+            used += tokens
+            result.included.append(item.key)
+            continue
+
+        header_tokens = count_tokens(header) + sep_tokens
+        if not item.splittable or used + header_tokens >= budget:
+            result.dropped.append(item.key)
+            continue
+
+        declarations = split_declarations(item.text)
+        kept = []
+        used_item = header_tokens
+        for decl in declarations:
+            decl_tokens = count_tokens(decl)
+            if used + used_item + decl_tokens <= budget:
+                kept.append(decl)
+                used_item += decl_tokens
+        if not kept or not ''.join(kept).strip():
+            result.dropped.append(item.key)
+            continue
+        pieces.append(header + ''.join(kept).rstrip('\n') + "\n// ...（部分声明因长度限制省略）")
+        used += used_item
+        result.partial[item.key] = f"{len(kept)}/{len(declarations)}"
+
+    text = separator.join(pieces)
+    if result.dropped and dropped_note:
+        text += dropped_note.format(files=", ".join(result.dropped))
+    result.text = text
+    result.used_tokens = used
+    return result
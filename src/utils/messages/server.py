@@ -108,6 +108,7 @@ class ServerMessage:
         default_factory=ServerMessageContent
     )  # 消息内容
     log_id: str = field(default_factory=str)  # 日志id, 用于关联日志
+    node_name: str = field(default_factory=str)  # 产生该消息的工作流节点（工作流节点流式输出时填写）
 
     def dict(self):
         return asdict(self)